@@ -0,0 +1,189 @@
+# bench_codecs.py
+"""
+Micro-benchmark of the compiled column extractors and encoders against the
+per-cell if/elif chains they replaced, on synthetic Notion pages.
+
+Usage (from the repository root):
+    python benchmarks/bench_codecs.py [--pages 100000] [--repeat 3]
+"""
+import gc
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from notion_schema import NotionSchema
+from notion_codecs import extract_rows
+
+PROPERTIES = {
+    'Name': {'id': 'a', 'type': 'title'},
+    'Notes': {'id': 'b', 'type': 'rich_text'},
+    'Amount': {'id': 'c', 'type': 'number', 'number': {'format': 'dollar'}},
+    'Share': {'id': 'd', 'type': 'number', 'number': {'format': 'percent'}},
+    'Done': {'id': 'e', 'type': 'checkbox'},
+    'Status': {'id': 'f', 'type': 'select', 'select': {'options': [{'name': f'S{i}'} for i in range(20)]}},
+    'Tags': {'id': 'g', 'type': 'multi_select', 'multi_select': {'options': [{'name': f'T{i}'} for i in range(10)]}},
+    'Total': {'id': 'h', 'type': 'formula'},
+    'Sum': {'id': 'i', 'type': 'rollup'},
+}
+HEADERS = ['Name', 'Notes', 'Amount', 'Share', 'Done', 'Status', 'Tags', 'Total', 'Sum']
+
+def make_page(i):
+    text = lambda t: [{'text': {'content': t}, 'plain_text': t}]
+    return {'id': f'page-{i}', 'properties': {
+        'Name': {'type': 'title', 'title': text(f'Row {i}')},
+        'Notes': {'type': 'rich_text', 'rich_text': text(f'Note {i}')},
+        'Amount': {'type': 'number', 'number': i * 1.5},
+        'Share': {'type': 'number', 'number': (i % 100) / 100},
+        'Done': {'type': 'checkbox', 'checkbox': i % 2 == 0},
+        'Status': {'type': 'select', 'select': {'name': f'S{i % 20}'}},
+        'Tags': {'type': 'multi_select', 'multi_select': [{'name': f'T{i % 10}'}, {'name': f'T{(i + 3) % 10}'}]},
+        'Total': {'type': 'formula', 'formula': {'type': 'number', 'number': i * 2}},
+        'Sum': {'type': 'rollup', 'rollup': {'type': 'number', 'number': None}},
+    }}
+
+def make_row(i):
+    return [f'Row {i}', f'Note {i}', f'${i * 1.5:,.2f}', f'{i % 100}%', 'TRUE' if i % 2 == 0 else 'FALSE',
+            f'S{i % 25}', f'T{i % 10}, T{(i + 3) % 10}', str(i * 2), '']
+
+# --- The per-cell code the compiled codecs replaced --------------------------
+
+def legacy_extract(results, expected_headers):
+    rows = []
+    for page in results:
+        row = []
+        for prop_name in expected_headers:
+            prop_data = page['properties'].get(prop_name, {})
+            prop_type = prop_data.get('type')
+            content = ""
+            if prop_type and prop_data.get(prop_type):
+                prop_value = prop_data[prop_type]
+                if prop_type == 'title' and prop_value: content = prop_value[0]['text']['content']
+                elif prop_type == 'rich_text' and prop_value: content = prop_value[0]['text']['content']
+                elif prop_type == 'number': content = prop_value
+                elif prop_type == 'checkbox': content = prop_value
+                elif prop_type == 'select' and prop_value: content = prop_value['name']
+                elif prop_type == 'multi_select': content = ', '.join([opt['name'] for opt in prop_value])
+                elif prop_type == 'formula':
+                    formula_result = prop_data.get('formula')
+                    if formula_result:
+                        result_type = formula_result.get('type')
+                        if result_type == 'number':
+                            content = formula_result.get('number') if formula_result.get('number') is not None else '[Null Number]'
+                        elif result_type == 'string' and formula_result.get('string') is not None:
+                            content = formula_result['string']
+                        else:
+                            content = "[Unsupported Formula Result]"
+                elif prop_type == 'rollup':
+                    rollup_obj = prop_data.get('rollup')
+                    if rollup_obj:
+                        result_type = rollup_obj.get('type')
+                        if result_type == 'number':
+                            content = rollup_obj.get('number') if rollup_obj.get('number') is not None else '[Null Number]'
+                        else:
+                            content = "[Unsupported Rollup Result]"
+            row.append(content)
+        rows.append(row)
+    return rows
+
+def legacy_encode(data_rows, headers, notion_properties, select_options):
+    encoded = []
+    for row_data in data_rows:
+        new_properties = {}
+        for i, header in enumerate(headers):
+            target_header = header.removesuffix(" [replace]") if header.endswith(" [replace]") else header
+            if target_header not in notion_properties or target_header == 'ID': continue
+            value = row_data[i] if i < len(row_data) else ""
+            prop_type = notion_properties[target_header]['type']
+            prop_value = None
+            if prop_type == 'title':
+                prop_value = {'title': [{'text': {'content': str(value)}}]}
+            elif prop_type == 'number':
+                try:
+                    num_format = notion_properties[target_header]['number']['format']
+                    cleaned_value = str(value).strip()
+                    if num_format in ['dollar', 'euro']:
+                        cleaned_value = cleaned_value.replace('$', '').replace('€', '').replace(',', '')
+                    elif num_format == 'percent':
+                        cleaned_value = cleaned_value.replace('%', '')
+                    else:
+                        cleaned_value = cleaned_value.replace(',', '')
+                    num = float(cleaned_value)
+                    if num_format == 'percent':
+                        num /= 100.0
+                    prop_value = {'number': num}
+                except (ValueError, TypeError, KeyError):
+                    pass
+            elif prop_type == 'rich_text':
+                prop_value = {'rich_text': [{'text': {'content': str(value)}}]}
+            elif prop_type == 'select':
+                if value in select_options[target_header]:
+                    prop_value = {'select': {'name': str(value)}}
+            elif prop_type == 'multi_select':
+                values = [v.strip() for v in str(value).split(',') if v.strip()]
+                prop_value = {'multi_select': [{'name': v} for v in values]} if values else {'multi_select': []}
+            elif prop_type == 'checkbox':
+                if str(value).upper() == 'TRUE': prop_value = {'checkbox': True}
+                elif str(value).upper() == 'FALSE': prop_value = {'checkbox': False}
+            if prop_value is not None:
+                new_properties[target_header] = prop_value
+        encoded.append(new_properties)
+    return encoded
+
+# --- The compiled versions, as used by NotionClientWrapper -------------------
+
+def compiled_extract(results, expected_headers, schema):
+    return extract_rows(schema.extractors(expected_headers), results, lambda page_id: None)
+
+def compiled_encode(data_rows, headers, schema):
+    columns = schema.encoders(headers)
+    encoded = []
+    for row_data in data_rows:
+        new_properties = {}
+        for i, target_header, encode in columns:
+            prop_value = encode(row_data[i] if i < len(row_data) else "")
+            if prop_value is not None:
+                new_properties[target_header] = prop_value
+        encoded.append(new_properties)
+    return encoded
+
+def best_of(repeat, fn):
+    # Like timeit, keep the garbage collector from adding noise to the timings.
+    gc.collect()
+    gc.disable()
+    try:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    pages = [make_page(i) for i in range(args.pages)]
+    rows = [make_row(i) for i in range(args.pages)]
+    # A fresh schema, so the compile step is part of the first timed run.
+    schema = NotionSchema(PROPERTIES)
+
+    print(f"{args.pages} pages x {len(HEADERS)} columns, best of {args.repeat}")
+    for name, legacy, compiled in [
+        ('extract (Notion -> Sheet)', lambda: legacy_extract(pages, HEADERS), lambda: compiled_extract(pages, HEADERS, schema)),
+        ('encode (Sheet -> Notion)', lambda: legacy_encode(rows, HEADERS, PROPERTIES, schema.select_options), lambda: compiled_encode(rows, HEADERS, schema)),
+    ]:
+        legacy_time, legacy_result = best_of(args.repeat, legacy)
+        compiled_time, compiled_result = best_of(args.repeat, compiled)
+        if legacy_result != compiled_result:
+            sys.exit(f"{name}: compiled output differs from the legacy output")
+        print(f"  {name:<26} legacy {legacy_time:7.3f}s   compiled {compiled_time:7.3f}s   {legacy_time / compiled_time:5.2f}x")
+
+if __name__ == '__main__':
+    main()
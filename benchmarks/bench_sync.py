@@ -0,0 +1,194 @@
+# bench_sync.py
+"""
+End-to-end benchmark of DataSyncer.run_sync_for_pair against local stand-ins
+for the Notion and Google Sheets APIs, on synthetic data. Each priority mode
+runs in a fresh subprocess, and the results (wall time, API calls, bytes sent
+each way and peak RSS) are written as JSON so runs can be compared across
+commits.
+
+Usage (from the repository root):
+    python benchmarks/bench_sync.py [--rows 2000] [--modes notion,sheet,calculator] [--output bench_sync.json]
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from synthetic import SPREADSHEET_ID, make_databases, make_sheets, make_pairs
+from fake_servers import FakeNotionServer, FakeSheetsServer
+
+MODES = ['notion', 'sheet', 'calculator']
+
+def run_worker(spec):
+    """Runs one sync pair against the fake servers and prints its timings as JSON."""
+    import httpx
+    from googleapiclient.discovery import build
+    from google.oauth2.credentials import Credentials
+    from notion_client import Client, AsyncClient
+    from google_sheets_client import GoogleSheetsClient
+    from notion_client_wrapper import NotionClientWrapper
+    from relation_cache import RelationTitleCache
+    from notion_snapshot import NotionSnapshotStore
+    from notion_write_executor import NotionWriteExecutor
+    from notion_schema import SchemaCache
+    from data_syncer import DataSyncer
+    from async_io import AsyncEngine
+    from metrics import instrument_http_client
+    from retry import RetryLayer, RetryTransport, AsyncRetryTransport
+    from quota import QuotaGovernor
+
+    config = spec['config']
+    engine = AsyncEngine(max_connections=config.get('HTTP_MAX_CONNECTIONS', 20))
+    governor = QuotaGovernor.from_config(config)
+    credentials = Credentials(token='bench')
+    google_sheets_client = GoogleSheetsClient(
+        credentials=credentials, engine=engine, retry_layer=RetryLayer('sheets', governor=governor),
+        write_chunk_rows=config.get('SHEETS_WRITE_CHUNK_ROWS', 1000), write_concurrency=config.get('SHEETS_WRITE_CONCURRENCY', 4)
+    )
+    google_sheets_client.service = build(
+        'sheets', 'v4', credentials=credentials,
+        client_options={'api_endpoint': spec['sheets_url']}, cache_discovery=False
+    )
+    notion_client_wrapper = NotionClientWrapper(
+        auth_token='bench',
+        relation_cache=RelationTitleCache(),
+        snapshot_store=NotionSnapshotStore(snapshot_dir=spec['snapshot_dir']),
+        write_executor=NotionWriteExecutor(max_workers=config.get('NOTION_WRITE_WORKERS', 3)),
+        schema_cache=SchemaCache(),
+        engine=engine,
+        read_concurrency=config.get('NOTION_READ_CONCURRENCY', 3),
+        retry_layer=RetryLayer('notion', governor=governor)
+    )
+    # The replaced clients get the same retry layer and metrics hooks as the ones they replace.
+    layer = notion_client_wrapper.retry_layer
+    notion_client_wrapper.client = Client(
+        auth='bench', base_url=spec['notion_url'], client=httpx.Client(transport=RetryTransport(layer))
+    )
+    notion_client_wrapper.async_client = AsyncClient(
+        auth='bench', base_url=spec['notion_url'], client=httpx.AsyncClient(transport=AsyncRetryTransport(layer))
+    )
+    instrument_http_client(notion_client_wrapper.client.client, 'notion')
+    instrument_http_client(notion_client_wrapper.async_client.client, 'notion')
+
+    syncer = DataSyncer(config, google_sheets_client, notion_client_wrapper)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        syncer.run_sync_for_pair(spec['pair'])
+        wall_time = time.perf_counter() - start
+
+    log_lines = output.getvalue().splitlines()
+    print(json.dumps({
+        'wall_time': wall_time,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'errors': [line for line in log_lines if 'error occurred' in line.lower()],
+    }))
+
+def run_mode(mode, args, notion, sheets, snapshot_dir):
+    """Loads fresh data into the fake servers and runs one mode in a subprocess."""
+    databases = make_databases(args.rows, args.related_rows, args.relations, args.formulas, args.selects, args.select_options)
+    notion.load(databases)
+    sheets.load(make_sheets(databases, args.changed_fraction, args.new_rows))
+    notion.reset_stats()
+    sheets.reset_stats()
+
+    spec = {
+        'pair': make_pairs(databases)[mode],
+        'notion_url': notion.url,
+        'sheets_url': sheets.url,
+        'snapshot_dir': os.path.join(snapshot_dir, mode),
+        'config': {
+            'SAMPLE_SPREADSHEET_ID': SPREADSHEET_ID,
+            'NOTION_REQUESTS_PER_SECOND': args.notion_rps,
+            'NOTION_BURST': args.notion_rps,
+            'SHEETS_READS_PER_MINUTE': args.sheets_rpm,
+            'SHEETS_WRITES_PER_MINUTE': args.sheets_rpm,
+            'SHEETS_WRITE_CHUNK_ROWS': args.write_chunk_rows,
+            'METRICS_SUMMARY_FILE': '',
+            'SYNC_STATE_FILE': os.path.join(snapshot_dir, f'{mode}-state.sqlite3'),
+        },
+    }
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(spec)],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Mode '{mode}' failed:\n{completed.stderr}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['notion'] = notion.stats()
+    result['sheets'] = sheets.stats()
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, default=2000, help="Pages in the main database")
+    parser.add_argument('--related-rows', type=int, default=200, help="Pages in each related database")
+    parser.add_argument('--relations', type=int, default=1, help="Relation properties")
+    parser.add_argument('--formulas', type=int, default=2, help="Formula properties")
+    parser.add_argument('--selects', type=int, default=2, help="Select properties")
+    parser.add_argument('--select-options', type=int, default=10, help="Options per select property")
+    parser.add_argument('--changed-fraction', type=float, default=0.1, help="Share of rows edited in the 'sheet' mode's sheet")
+    parser.add_argument('--new-rows', type=int, default=10, help="Rows only in the 'sheet' mode's sheet")
+    parser.add_argument('--notion-rps', type=float, default=1000, help="Notion request rate limit")
+    parser.add_argument('--sheets-rpm', type=float, default=60000, help="Sheets read and write limit per minute")
+    parser.add_argument('--write-chunk-rows', type=int, default=1000, help="Rows per Sheets values write")
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--output', default='bench_sync.json')
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        return
+
+    notion = FakeNotionServer().start()
+    sheets = FakeSheetsServer().start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as snapshot_dir:
+            for mode in args.modes.split(','):
+                results[mode] = run_mode(mode, args, notion, sheets, snapshot_dir)
+    finally:
+        notion.stop()
+        sheets.stop()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'params': {k: v for k, v in vars(args).items() if k not in ('worker', 'output')},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{args.rows} rows, {args.relations} relations, {args.formulas} formulas, {args.selects} selects")
+    print(f"  {'mode':<12}{'wall':>9}{'notion calls':>14}{'sheets calls':>14}{'bytes in':>12}{'bytes out':>12}{'peak RSS':>11}")
+    for mode, result in results.items():
+        bytes_in = result['notion']['bytes_received'] + result['sheets']['bytes_received']
+        bytes_out = result['notion']['bytes_sent'] + result['sheets']['bytes_sent']
+        print(f"  {mode:<12}{result['wall_time']:8.2f}s{result['notion']['total_calls']:>14}{result['sheets']['total_calls']:>14}"
+              f"{bytes_in:>12}{bytes_out:>12}{result['peak_rss_kb'] // 1024:>8} MB")
+        for error in result['errors']:
+            print(f"    {error}")
+    print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,340 @@
+# fake_servers.py
+"""
+Local stand-ins for the Notion and Google Sheets REST APIs, for benchmarking
+a sync run offline. They implement only the endpoints the sync uses, keep
+their data in memory and count every call and the bytes sent each way.
+"""
+import re
+import json
+import copy
+import uuid
+import threading
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from a1_notation import split_range, sheet_title
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw_body = self.rfile.read(length) if length else b''
+        body = json.loads(raw_body) if raw_body else {}
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            endpoint, status, payload = self.server.fake.route(self.command, unquote(url.path), query, body)
+        except KeyError as e:
+            endpoint, status, payload = 'not_found', 404, self.server.fake.error(404, f"Not found: {e}")
+        data = json.dumps(payload).encode('utf-8')
+        self.server.fake.record(endpoint, len(raw_body) + len(self.path), len(data))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PATCH = do_PUT = _handle
+
+class FakeServer:
+    """Runs a fake API on a local port in a background thread and counts its traffic."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._httpd = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls = {}
+            self.bytes_received = 0
+            self.bytes_sent = 0
+
+    def record(self, endpoint, received, sent):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            self.bytes_received += received
+            self.bytes_sent += sent
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'total_calls': sum(self.calls.values()),
+                'bytes_received': self.bytes_received,
+                'bytes_sent': self.bytes_sent
+            }
+
+# --- Notion ------------------------------------------------------------------
+
+class FakeNotionServer(FakeServer):
+    """
+    The Notion endpoints used by the sync: databases.retrieve/query and
+    pages.retrieve/update/create. Formula and rollup values are returned as
+    stored; they are not recalculated.
+    """
+    def __init__(self, databases=None):
+        super().__init__()
+        # database_id -> {'schema': {...}, 'pages': [page, ...]}
+        self.databases = databases or {}
+        self._pages = {}
+        self._index_pages()
+
+    def load(self, databases):
+        with self._lock:
+            self.databases = copy.deepcopy(databases)
+            self._index_pages()
+
+    def _index_pages(self):
+        self._pages = {}
+        for database_id, database in self.databases.items():
+            for page in database['pages']:
+                page.setdefault('parent', {'type': 'database_id', 'database_id': database_id})
+                self._pages[page['id']] = page
+
+    def error(self, status, message):
+        return {'object': 'error', 'status': status, 'code': 'object_not_found', 'message': message}
+
+    def route(self, method, path, query, body):
+        parts = path.strip('/').split('/')[1:] # Drop the 'v1' prefix.
+        with self._lock:
+            if parts[0] == 'databases' and len(parts) == 3 and method == 'POST':
+                return 'databases.query', 200, self._query(parts[1], query, body)
+            if parts[0] == 'databases' and len(parts) == 2 and method == 'GET':
+                return 'databases.retrieve', 200, self._retrieve_database(parts[1])
+            if parts[0] == 'pages' and len(parts) == 2 and method == 'GET':
+                return 'pages.retrieve', 200, copy.deepcopy(self._pages[parts[1]])
+            if parts[0] == 'pages' and len(parts) == 2 and method == 'PATCH':
+                return 'pages.update', 200, self._update_page(parts[1], body)
+            if parts[0] == 'pages' and len(parts) == 1 and method == 'POST':
+                return 'pages.create', 200, self._create_page(body)
+        return 'unsupported', 400, self.error(400, f"Unsupported request {method} {path}")
+
+    def _retrieve_database(self, database_id):
+        database = self.databases[database_id]
+        return {
+            'object': 'database', 'id': database_id,
+            'last_edited_time': database.get('last_edited_time', '2024-01-01T00:00:00.000Z'),
+            'properties': copy.deepcopy(database['schema'])
+        }
+
+    def _query(self, database_id, query, body):
+        pages = self.databases[database_id]['pages']
+        cutoff = (body.get('filter') or {}).get('last_edited_time', {}).get('on_or_after')
+        if cutoff:
+            pages = [p for p in pages if p['last_edited_time'][:19] >= cutoff[:19]]
+        # An 'or' of title equality filters, as used to look up pages by title.
+        conditions = (body.get('filter') or {}).get('or')
+        if conditions:
+            wanted = {(c['property'], c['title']['equals']) for c in conditions if 'title' in c}
+            pages = [
+                p for p in pages
+                if any(''.join(t.get('plain_text', t.get('text', {}).get('content', '')) for t in p['properties'].get(name, {}).get('title', [])) == title for name, title in wanted)
+            ]
+        for sort in reversed(body.get('sorts') or []):
+            key = sort.get('timestamp')
+            if key:
+                pages = sorted(pages, key=lambda p: p[key], reverse=sort.get('direction') == 'descending')
+        if not body.get('sorts'):
+            # Like Notion, newest pages come first by default.
+            pages = list(reversed(pages))
+
+        start = int(body.get('start_cursor') or 0)
+        page_size = min(int(body.get('page_size') or 100), 100)
+        results = copy.deepcopy(pages[start:start + page_size])
+        property_ids = query.get('filter_properties')
+        if property_ids is not None:
+            for page in results:
+                page['properties'] = {k: v for k, v in page['properties'].items() if v.get('id') in property_ids}
+        has_more = start + page_size < len(pages)
+        return {
+            'object': 'list', 'results': results, 'has_more': has_more,
+            'next_cursor': str(start + page_size) if has_more else None
+        }
+
+    def _set_properties(self, page, schema, properties):
+        for name, value in properties.items():
+            prop = schema[name]
+            page['properties'][name] = dict(value, id=prop['id'], type=prop['type'])
+        page['last_edited_time'] = _now()
+
+    def _update_page(self, page_id, body):
+        page = self._pages[page_id]
+        schema = self.databases[page['parent']['database_id']]['schema']
+        self._set_properties(page, schema, body.get('properties', {}))
+        return copy.deepcopy(page)
+
+    def _create_page(self, body):
+        database_id = body['parent']['database_id']
+        database = self.databases[database_id]
+        page = {
+            'object': 'page', 'id': str(uuid.uuid4()), 'created_time': _now(), 'last_edited_time': _now(),
+            'parent': {'type': 'database_id', 'database_id': database_id}, 'properties': {}
+        }
+        self._set_properties(page, database['schema'], body.get('properties', {}))
+        database['pages'].append(page)
+        self._pages[page['id']] = page
+        return copy.deepcopy(page)
+
+# --- Google Sheets -----------------------------------------------------------
+
+_NUMBER = re.compile(r'^-?[\d,]*\.?\d+(e-?\d+)?$')
+
+def _user_entered(value):
+    """Parses a value written with USER_ENTERED input, roughly like Sheets does."""
+    if not isinstance(value, str):
+        return value
+    if value.upper() in ('TRUE', 'FALSE'):
+        return value.upper() == 'TRUE'
+    text = value.strip().replace('$', '').replace('€', '')
+    percent = text.endswith('%')
+    text = text.rstrip('%')
+    if text and _NUMBER.match(text):
+        number = float(text.replace(',', ''))
+        return number / 100 if percent else number
+    return value
+
+def _formatted(value):
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float):
+        return f"{value:,.4f}"
+    return str(value)
+
+class FakeSheetsServer(FakeServer):
+    """
+    The Sheets endpoints used by the sync: spreadsheets.get (with grid data),
+    spreadsheets.batchUpdate, and values get/update/batchUpdate. Formulas are
+    kept as entered and display the number of characters in the formula, so
+    they look calculated without being evaluated.
+    """
+    def __init__(self, sheets=None):
+        super().__init__()
+        # sheet title -> {'id': sheetId, 'cells': {(row, col): value}}
+        self.sheets = sheets or {}
+
+    def load(self, sheets):
+        with self._lock:
+            self.sheets = copy.deepcopy(sheets)
+
+    def error(self, status, message):
+        return {'error': {'code': status, 'message': message, 'status': 'NOT_FOUND'}}
+
+    def route(self, method, path, query, body):
+        # /v4/spreadsheets/{id}[:batchUpdate | /values/{range} | /values:batchUpdate]
+        rest = path.split('/v4/spreadsheets/', 1)[1]
+        with self._lock:
+            if rest.endswith('/values:batchUpdate'):
+                for value_range in body['data']:
+                    self._write(value_range['range'], value_range['values'])
+                return 'values.batchUpdate', 200, {'totalUpdatedRanges': len(body['data'])}
+            if rest.endswith(':batchUpdate'):
+                return 'spreadsheets.batchUpdate', 200, {'replies': [{} for _ in body.get('requests', [])]}
+            if '/values/' in rest:
+                range_name = rest.split('/values/', 1)[1]
+                if method == 'PUT':
+                    self._write(range_name, body['values'])
+                    return 'values.update', 200, {'updatedRange': range_name}
+                render = query.get('valueRenderOption', ['FORMATTED_VALUE'])[0]
+                return 'values.get', 200, self._values(range_name, render)
+            return 'spreadsheets.get', 200, self._get(query)
+
+    def _bounds(self, range_name):
+        sheet_name, start_col, start_row, end_col, end_row = split_range(range_name)
+        sheet = self.sheets[sheet_title(sheet_name)]
+        max_row = max([r for r, _ in sheet['cells']], default=-1)
+        max_col = max([c for _, c in sheet['cells']], default=-1)
+        end_row = max_row if end_row is None else min(end_row, max_row)
+        end_col = max_col if end_col is None else min(end_col, max_col)
+        return sheet, start_row, start_col, end_row, end_col
+
+    def _write(self, range_name, values):
+        sheet_name, start_col, start_row, _, _ = split_range(range_name)
+        cells = self.sheets[sheet_title(sheet_name)]['cells']
+        for r, row in enumerate(values):
+            for c, value in enumerate(row):
+                if value is None:
+                    continue
+                if value == '':
+                    cells.pop((start_row + r, start_col + c), None)
+                else:
+                    cells[(start_row + r, start_col + c)] = _user_entered(value)
+
+    def _display(self, value):
+        if isinstance(value, str) and value.startswith('='):
+            return len(value)
+        return value
+
+    def _values(self, range_name, render):
+        sheet, start_row, start_col, end_row, end_col = self._bounds(range_name)
+        rows = []
+        for r in range(start_row, end_row + 1):
+            row = []
+            for c in range(start_col, end_col + 1):
+                value = sheet['cells'].get((r, c), '')
+                if render == 'FORMATTED_VALUE' and value != '':
+                    value = _formatted(self._display(value))
+                row.append(value)
+            while row and row[-1] == '':
+                row.pop()
+            rows.append(row)
+        while rows and not rows[-1]:
+            rows.pop()
+        return {'range': range_name, 'values': rows} if rows else {'range': range_name}
+
+    def _cell_data(self, value):
+        if isinstance(value, str) and value.startswith('='):
+            shown = self._display(value)
+            return {'userEnteredValue': {'formulaValue': value}, 'effectiveValue': {'numberValue': shown}, 'formattedValue': _formatted(shown)}
+        if isinstance(value, bool):
+            entered = {'boolValue': value}
+        elif isinstance(value, (int, float)):
+            entered = {'numberValue': value}
+        else:
+            entered = {'stringValue': value}
+        return {'userEnteredValue': entered, 'effectiveValue': entered, 'formattedValue': _formatted(value)}
+
+    def _get(self, query):
+        ranges = query.get('ranges', [])
+        include_grid_data = query.get('includeGridData', ['false'])[0] == 'true'
+        sheets = []
+        for title, sheet in self.sheets.items():
+            entry = {'properties': {'sheetId': sheet['id'], 'title': title}}
+            sheet_ranges = [r for r in ranges if sheet_title(split_range(r)[0]) == title]
+            if ranges and not sheet_ranges:
+                continue
+            if include_grid_data:
+                entry['data'] = []
+                for range_name in sheet_ranges:
+                    _, start_row, start_col, end_row, end_col = self._bounds(range_name)
+                    row_data = [
+                        {'values': [self._cell_data(sheet['cells'][(r, c)]) if (r, c) in sheet['cells'] else {}
+                                    for c in range(start_col, end_col + 1)]}
+                        for r in range(start_row, end_row + 1)
+                    ]
+                    entry['data'].append({'startRow': start_row, 'startColumn': start_col, 'rowData': row_data})
+            sheets.append(entry)
+        return {'sheets': sheets}
@@ -0,0 +1,147 @@
+# synthetic.py
+"""
+Generators for synthetic Notion databases and Google Sheets, sized and shaped
+by a few parameters, for the offline sync benchmark.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from a1_notation import column_letter
+
+DATABASE_ID = 'bench-db'
+SPREADSHEET_ID = 'bench-spreadsheet'
+
+def _timestamp(seconds):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return (start + timedelta(seconds=seconds)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+def _text(content):
+    return [{'type': 'text', 'text': {'content': content}, 'plain_text': content}]
+
+def _page(page_id, created, properties):
+    return {
+        'object': 'page', 'id': page_id,
+        'created_time': _timestamp(created), 'last_edited_time': _timestamp(created),
+        'properties': properties
+    }
+
+def make_schema(relations=1, formulas=2, selects=2, select_options=10):
+    """
+    Returns the main database's properties. 'Name' is the title and comes
+    last, because 'notion' pairs use the properties in reverse order and
+    match pages on the first column.
+    """
+    schema = {
+        'Result': {'id': 'result', 'type': 'number', 'number': {'format': 'number'}},
+        'Notes': {'id': 'notes', 'type': 'rich_text', 'rich_text': {}},
+        'Amount': {'id': 'amount', 'type': 'number', 'number': {'format': 'dollar'}},
+        'Done': {'id': 'done', 'type': 'checkbox', 'checkbox': {}},
+    }
+    for i in range(selects):
+        schema[f'Select {i}'] = {
+            'id': f'select{i}', 'type': 'select',
+            'select': {'options': [{'name': f'Option {j}'} for j in range(select_options)]}
+        }
+    for i in range(relations):
+        schema[f'Related {i}'] = {
+            'id': f'relation{i}', 'type': 'relation',
+            'relation': {'database_id': f'{DATABASE_ID}-related-{i}'}
+        }
+    for i in range(formulas):
+        schema[f'Formula {i}'] = {'id': f'formula{i}', 'type': 'formula', 'formula': {'expression': 'prop("Amount") * 2'}}
+    schema['Name'] = {'id': 'title', 'type': 'title', 'title': {}}
+    return schema
+
+def make_databases(rows=1000, related_rows=200, relations=1, formulas=2, selects=2, select_options=10, seed=0):
+    """Returns {database_id: {'schema': ..., 'pages': [...]}} for the main and related databases."""
+    rng = random.Random(seed)
+    schema = make_schema(relations, formulas, selects, select_options)
+    databases = {}
+
+    for i in range(relations):
+        related_id = f'{DATABASE_ID}-related-{i}'
+        databases[related_id] = {
+            'schema': {'Name': {'id': 'title', 'type': 'title', 'title': {}}},
+            'pages': [
+                _page(f'{related_id}-{j}', j, {'Name': {'id': 'title', 'type': 'title', 'title': _text(f'Related {i}.{j}')}})
+                for j in range(related_rows)
+            ]
+        }
+
+    pages = []
+    for r in range(rows):
+        amount = round(rng.uniform(1, 1000), 2)
+        properties = {
+            'Name': {'id': 'title', 'type': 'title', 'title': _text(f'Row {r}')},
+            'Notes': {'id': 'notes', 'type': 'rich_text', 'rich_text': _text(f'Note for row {r}')},
+            'Amount': {'id': 'amount', 'type': 'number', 'number': amount},
+            'Done': {'id': 'done', 'type': 'checkbox', 'checkbox': rng.random() < 0.5},
+            'Result': {'id': 'result', 'type': 'number', 'number': None},
+        }
+        for i in range(selects):
+            properties[f'Select {i}'] = {'id': f'select{i}', 'type': 'select', 'select': {'name': f'Option {rng.randrange(select_options)}'}}
+        for i in range(relations):
+            linked = rng.sample(range(related_rows), min(2, related_rows))
+            properties[f'Related {i}'] = {
+                'id': f'relation{i}', 'type': 'relation',
+                'relation': [{'id': f'{DATABASE_ID}-related-{i}-{j}'} for j in linked], 'has_more': False
+            }
+        for i in range(formulas):
+            properties[f'Formula {i}'] = {'id': f'formula{i}', 'type': 'formula', 'formula': {'type': 'number', 'number': amount * (i + 2)}}
+        pages.append(_page(f'{DATABASE_ID}-{r}', r, properties))
+
+    databases[DATABASE_ID] = {'schema': schema, 'pages': pages}
+    return databases
+
+def _cells(grid):
+    return {(r, c): value for r, row in enumerate(grid) for c, value in enumerate(row) if value != ''}
+
+def make_sheets(databases, changed_fraction=0.1, new_rows=10, seed=0):
+    """
+    Returns the sheets for each benchmark mode, keyed by sheet title:
+
+    - 'Notion' is empty, for the Notion -> Sheet direction to fill.
+    - 'Sheet' holds every page's writable values, with `changed_fraction` of
+      the amounts edited and `new_rows` extra rows, for Sheet -> Notion.
+    - 'Calc' holds headers, a formula column that feeds 'Result [replace]',
+      and no data, for calculator mode.
+    """
+    rng = random.Random(seed)
+    database = databases[DATABASE_ID]
+    selects = [name for name, prop in database['schema'].items() if prop['type'] == 'select']
+
+    headers = ['Name', 'Notes', 'Amount', 'Done'] + selects
+    sheet_grid = [headers]
+    for page in database['pages']:
+        props = page['properties']
+        amount = props['Amount']['number']
+        if rng.random() < changed_fraction:
+            amount = round(amount + 1, 2)
+        row = [props['Name']['title'][0]['text']['content'], props['Notes']['rich_text'][0]['text']['content'],
+               amount, 'TRUE' if props['Done']['checkbox'] else 'FALSE']
+        row += [props[name]['select']['name'] for name in selects]
+        sheet_grid.append(row)
+    for r in range(new_rows):
+        sheet_grid.append([f'New row {r}', 'Added in the sheet', r, 'FALSE'] + ['Option 0' for _ in selects])
+
+    calc_headers = ['Name', 'Amount', 'Formula 0' if 'Formula 0' in database['schema'] else 'Notes', 'Result [replace]']
+    calc_grid = [calc_headers]
+    for r in range(len(database['pages'])):
+        calc_grid.append(['', '', '', f'=B{r + 2}*2'])
+
+    return {
+        'Notion': {'id': 1, 'cells': {}},
+        'Sheet': {'id': 2, 'cells': _cells(sheet_grid)},
+        'Calc': {'id': 3, 'cells': _cells(calc_grid)},
+    }
+
+def make_pairs(databases):
+    """Returns the sync pair for each priority mode."""
+    database = databases[DATABASE_ID]
+    rows = len(database['pages']) + 1
+    width = len(database['schema'])
+    return {
+        'notion': {'NAME': 'bench-notion', 'RANGE': f'Notion!A1:{column_letter(width - 1)}{rows}', 'DATABASE_ID': DATABASE_ID, 'PRIORITY': 'notion'},
+        'sheet': {'NAME': 'bench-sheet', 'RANGE': f'Sheet!A1:{column_letter(width - 1)}{rows + 1000}', 'DATABASE_ID': DATABASE_ID, 'PRIORITY': 'sheet'},
+        'calculator': {'NAME': 'bench-calculator', 'RANGE': f'Calc!A1:D{rows}', 'DATABASE_ID': DATABASE_ID, 'PRIORITY': 'calculator'},
+    }
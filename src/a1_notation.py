@@ -0,0 +1,94 @@
+# a1_notation.py
+import re
+
+# Sheets has at most 18278 columns (ZZZ), so a column is one to three letters.
+_CELL_PATTERN = re.compile(r'^\$?([A-Za-z]{0,3})\$?(\d*)$')
+
+def column_letter(index):
+    """Converts a zero-based column index to its A1 letters (0 -> 'A', 26 -> 'AA')."""
+    letters = ''
+    index += 1
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def column_index(letters):
+    """Converts A1 column letters to a zero-based column index ('A' -> 0)."""
+    index = 0
+    for char in letters.upper():
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+def sheet_title(sheet):
+    """
+    Returns the title of a sheet as named in A1 notation, without the quotes
+    around it and with doubled quotes undone ("'Bob''s data'" -> "Bob's data").
+    """
+    if len(sheet) >= 2 and sheet[0] == sheet[-1] == "'":
+        return sheet[1:-1].replace("''", "'")
+    return sheet
+
+def split_range(range_name):
+    """
+    Splits an A1 range such as "Sheet1!B2:E" into its parts.
+
+    Returns:
+        tuple: (sheet, start_col, start_row, end_col, end_row) with zero-based,
+               inclusive indices. Unbounded ends are None, and a missing start
+               defaults to the first row or column.
+
+    Raises:
+        ValueError: If the part after the '!' is not a cell range, e.g. a named range.
+    """
+    sheet, _, cells = range_name.rpartition('!')
+    if not sheet:
+        # A bare sheet name refers to the whole sheet.
+        return cells, 0, 0, None, None
+
+    start, _, end = cells.partition(':')
+    start_match = _CELL_PATTERN.match(start)
+    end_match = _CELL_PATTERN.match(end or start)
+    if not start_match or not end_match or '0' in (start_match.group(2)[:1], end_match.group(2)[:1]):
+        raise ValueError(f"Unsupported A1 range: {range_name}")
+
+    start_col = column_index(start_match.group(1)) if start_match.group(1) else 0
+    start_row = int(start_match.group(2)) - 1 if start_match.group(2) else 0
+    end_col = column_index(end_match.group(1)) if end_match.group(1) else None
+    end_row = int(end_match.group(2)) - 1 if end_match.group(2) else None
+    return sheet, start_col, start_row, end_col, end_row
+
+def sub_range(range_name, row_offset, col_offset, num_rows, num_cols):
+    """
+    Returns the A1 notation of a block inside `range_name`, given its offset
+    from the range's top-left cell and its size.
+    """
+    sheet, start_col, start_row, _, _ = split_range(range_name)
+    first_col = start_col + col_offset
+    first_row = start_row + row_offset + 1
+    last_col = first_col + num_cols - 1
+    last_row = first_row + num_rows - 1
+    return f"{sheet}!{column_letter(first_col)}{first_row}:{column_letter(last_col)}{last_row}"
+
+def column_range(range_name, col_offset):
+    """
+    Returns the A1 notation of one column of `range_name`, given its offset
+    from the range's first column. The rows are those of the range, so an
+    open-ended range gives an open-ended column.
+    """
+    sheet, start_col, start_row, _, end_row = split_range(range_name)
+    letter = column_letter(start_col + col_offset)
+    end = f"{letter}{end_row + 1}" if end_row is not None else letter
+    return f"{sheet}!{letter}{start_row + 1}:{end}"
+
+def ranges_overlap(range_a, range_b):
+    """Returns True if two A1 ranges share at least one cell."""
+    sheet_a, col_a, row_a, end_col_a, end_row_a = split_range(range_a)
+    sheet_b, col_b, row_b, end_col_b, end_row_b = split_range(range_b)
+    if sheet_title(sheet_a) != sheet_title(sheet_b):
+        return False
+
+    def spans_overlap(start_1, end_1, start_2, end_2):
+        return (end_1 is None or start_2 <= end_1) and (end_2 is None or start_1 <= end_2)
+
+    return spans_overlap(col_a, end_col_a, col_b, end_col_b) and spans_overlap(row_a, end_row_a, row_b, end_row_b)
@@ -0,0 +1,73 @@
+# async_io.py
+import asyncio
+import threading
+import httpx
+
+class AsyncEngine:
+    """
+    Runs an asyncio event loop on a background thread, so the synchronous
+    clients can hand it their network calls and have several of them in
+    flight at once over one pooled HTTP session.
+    """
+    def __init__(self, max_connections=20, timeout=60.0):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self._session = None
+        self._thread = threading.Thread(target=self.loop.run_forever, name='async-io', daemon=True)
+        self._thread.start()
+
+    @property
+    def session(self):
+        """The shared httpx.AsyncClient. Only use it from coroutines running on the engine's loop."""
+        if self._session is None:
+            self._session = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections),
+                timeout=self.timeout
+            )
+        return self._session
+
+    def submit(self, coro):
+        """
+        Schedules a coroutine on the loop and returns a concurrent.futures.Future
+        for its result. The coroutine runs in a copy of the caller's context, so
+        it keeps the caller's job and quota priority.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Runs a coroutine on the loop and blocks the calling thread until it finishes."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncEngine.run cannot be called from the engine's own loop")
+        return self.submit(coro).result()
+
+    def run_all(self, coros, limit=None):
+        """
+        Runs coroutines concurrently, at most `limit` at a time, and blocks until
+        all have finished.
+
+        Returns:
+            list: The results in the same order. A coroutine that raised has
+                  its exception in its place.
+        """
+        return self.run(gather_limited(coros, limit))
+
+    def close(self):
+        """Closes the HTTP session and stops the loop."""
+        if self._session is not None:
+            self.run(self._session.aclose())
+            self._session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+async def gather_limited(coros, limit=None):
+    """Awaits coroutines concurrently, at most `limit` at a time, returning exceptions in place of results."""
+    if not limit:
+        return await asyncio.gather(*coros, return_exceptions=True)
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros), return_exceptions=True)
@@ -1,6 +1,86 @@
 # data_syncer.py
+import json
 import time
 import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from notion_page_index import NotionPageIndex
+from readiness import wait_until_ready, WaitMetrics
+from job_context import log, job_scope
+from resource_locks import ResourceLocks
+from sync_state import SyncStateStore
+from quota import PRIORITY_CLASSES, DEFAULT_PRIORITY, priority_scope
+from a1_notation import split_range, ranges_overlap, column_range, sheet_title
+from sheet_grid import SheetGrid
+from metrics import record_rows, record_cells, record_sleep, record_job_run, job_totals, subtract_totals
+
+class SyncJob:
+    """
+    The state of one sync pair while it runs, handed from one sync stage to the next.
+    """
+    def __init__(self, pair, spreadsheet_id):
+        self.pair = pair
+        self.name = pair.get('NAME', pair.get('RANGE'))
+        self.spreadsheet_id = spreadsheet_id
+        self.sheet_range = pair['RANGE']
+        self.db_id = pair['DATABASE_ID']
+        self.priority = pair['PRIORITY']
+        # Identifies the job's rows in the sync state store.
+        self.state_key = f"{spreadsheet_id}/{self.sheet_range}/{self.db_id}"
+        self.incremental = pair.get('INCREMENTAL', False)
+        # The quota class the job's API requests are served in ('scheduled' or 'backfill').
+        self.quota_priority = pair.get('QUOTA_PRIORITY', DEFAULT_PRIORITY)
+        # Incremental pairs merge into a snapshot, so they cannot be streamed.
+        self.stream = pair.get('STREAM', False) and not self.incremental
+        self.sorts = pair.get('SORTS')
+        # Existing pages are read at most once per run and shared by both sync directions.
+        self.page_index = NotionPageIndex(self.db_id)
+        # The sheet range as read for the current stage, or None if it must be read again.
+        self.sheet_grid = None
+        # The database's NotionSchema from the schema cache, and its properties dict.
+        self.notion_schema = None
+        self.notion_properties = None
+        self.notion_data = None
+        self.ignore_col_indices = None
+        # For 'calculator' jobs, the column offsets read back after the sheet
+        # recalculates (the row key and the [replace] columns), and the
+        # properties those columns write.
+        self.write_back_columns = None
+        self.write_back_properties = None
+        # Row offsets into the range that Notion's values could not be written to,
+        # so they are left out of the Sheet -> Notion step of this run.
+        self.stale_rows = set()
+        self.failed = False
+
+    def conflicts_with(self, other):
+        """Returns True if both jobs touch the same Notion database or overlapping sheet cells."""
+        if self.db_id == other.db_id:
+            return True
+        return self.spreadsheet_id == other.spreadsheet_id and ranges_overlap(self.sheet_range, other.sheet_range)
+
+    def read_ranges(self):
+        """The ranges to read for the job's current stage."""
+        if self.write_back_columns is None:
+            return [self.sheet_range]
+        return [column_range(self.sheet_range, col) for col in self.write_back_columns]
+
+    def grid_from(self, grids):
+        """Builds the job's SheetGrid from a range name -> SheetGrid mapping of its read_ranges()."""
+        if self.write_back_columns is None:
+            return grids[self.sheet_range]
+        return SheetGrid.from_columns(self.sheet_range, self.write_back_columns, [grids[r] for r in self.read_ranges()])
+
+    def write_back_rows(self):
+        """The rows to send to Notion: the whole grid, or only the write-back columns of a 'calculator' job."""
+        grid = self.sheet_grid
+        if self.write_back_columns is None or grid.columns is not None:
+            return grid.values
+        return [[row[col] if col < len(row) else '' for col in self.write_back_columns] for row in grid.values]
+
+    def resource_keys(self):
+        """The names of the shared resources this job must hold while it runs."""
+        return [f"database:{self.db_id}", f"sheet:{self.spreadsheet_id}!{sheet_title(split_range(self.sheet_range)[0])}"]
 
 class DataSyncer:
     """
@@ -10,89 +90,528 @@ class DataSyncer:
         self.config = config
         self.google_sheets_client = google_sheets_client
         self.notion_client_wrapper = notion_client_wrapper
+        self.ready_timeout = config.get('READY_TIMEOUT', 10)
+        self.stream_chunk_rows = max(1, config.get('STREAM_CHUNK_ROWS', 500))
+        self.wait_metrics = WaitMetrics()
+        self.max_workers = max(1, config.get('MAX_WORKERS', 4))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync-job')
+        # Shared with every caller of run_sync_for_pairs, so runs started from
+        # different threads never work on the same database or sheet at once.
+        self.resource_locks = ResourceLocks()
+        # One JSON line per run_sync_for_pairs call, with per-job totals.
+        self.metrics_summary_file = config.get('METRICS_SUMMARY_FILE', 'sync_metrics.jsonl')
+        self.last_run_summary = None
+        # Row hashes from the last sync of every job, so rows changed on neither side are skipped.
+        sync_state_file = config.get('SYNC_STATE_FILE', 'sync_state.sqlite3')
+        self.sync_state = SyncStateStore(sync_state_file) if sync_state_file else None
+
+    def _fail(self, job):
+        """Marks a job as failed. Must be called from an exception handler."""
+        job.failed = True
+        log(f"An error occurred with job '{job.name}' (Range: {job.sheet_range}, DB: {job.db_id}). See sync_errors.log for details.")
+        logging.exception(f"Failed to sync job '{job.name}' (Range: {job.sheet_range}, DB: {job.db_id})")
+
+    def _run_job_step(self, job, step):
+        with job_scope(job.name), priority_scope(job.quota_priority):
+            try:
+                step(job)
+            except Exception:
+                self._fail(job)
+
+    @contextmanager
+    def _shared_scope(self, jobs):
+        """
+        The scope for a call made on behalf of several jobs: it counts towards
+        the job if there is only one, otherwise towards none, and draws quota
+        at the most urgent of the jobs' priorities.
+        """
+        priority = min((job.quota_priority for job in jobs), key=PRIORITY_CLASSES.get)
+        with job_scope(jobs[0].name if len(jobs) == 1 else None), priority_scope(priority):
+            yield
 
-    def _sync_notion_to_sheet(self, spreadsheet_id, sheet_range, db_id):
-        print("Syncing from Notion to Google Sheet...")
-        notion_properties = self.notion_client_wrapper.get_database_properties(db_id)
-        headers = list(notion_properties.keys())
-        headers.reverse()
-        notion_data = self.notion_client_wrapper.get_notion_data(db_id, headers, notion_properties)
-        
-        if notion_data:
-            # Get existing formulas to preserve them
-            formula_data = self.google_sheets_client.get_sheet_data(spreadsheet_id, sheet_range, render_option='FORMULA')
-            self.google_sheets_client.update_sheet_with_formatting(spreadsheet_id, sheet_range, notion_data, notion_properties, formula_data)
-
-    def _sync_sheet_to_notion(self, spreadsheet_id, sheet_range, db_id):
-        print("Syncing from Google Sheet to Notion...")
-        sheet_data = self.google_sheets_client.get_sheet_data(
-            spreadsheet_id, 
-            sheet_range, 
-            render_option='FORMATTED_VALUE'
+    def _run_step(self, jobs, step):
+        """
+        Runs a per-job step for every job, in parallel on the worker pool, and
+        stops further execution for any job that raises.
+        """
+        jobs = [job for job in jobs if not job.failed]
+        if len(jobs) < 2 or self.max_workers == 1:
+            for job in jobs:
+                self._run_job_step(job, step)
+            return
+        for future in [self._pool.submit(self._run_job_step, job, step) for job in jobs]:
+            future.result()
+
+    def _read_grids(self, jobs):
+        """Reads the sheet ranges of the given jobs, with one call per spreadsheet."""
+        by_spreadsheet = {}
+        for job in jobs:
+            if not job.failed:
+                by_spreadsheet.setdefault(job.spreadsheet_id, []).append(job)
+
+        for spreadsheet_id, spreadsheet_jobs in by_spreadsheet.items():
+            try:
+                with self._shared_scope(spreadsheet_jobs):
+                    grids = self.google_sheets_client.get_sheet_grids(
+                        spreadsheet_id, [r for job in spreadsheet_jobs for r in job.read_ranges()]
+                    )
+            except Exception:
+                for job in spreadsheet_jobs:
+                    self._fail(job)
+                continue
+            for job in spreadsheet_jobs:
+                job.sheet_grid = job.grid_from(grids)
+
+    def _notion_headers(self, job):
+        """
+        Loads the job's Notion properties and returns the headers to fetch, or
+        None if the job cannot continue.
+        """
+        if job.priority == 'calculator':
+            log(f"Running '{job.name}' in Calculator Mode...")
+            sheet_headers = job.sheet_grid.headers
+            if split_range(job.sheet_range)[2] != 0:
+                # The range does not start on the header row, so read row 1 separately.
+                sheet_name = job.sheet_range.split('!')[0]
+                sheet_headers_data = self.google_sheets_client.get_sheet_data(job.spreadsheet_id, f"{sheet_name}!1:1")
+                sheet_headers = sheet_headers_data[0] if sheet_headers_data else []
+            if not sheet_headers:
+                log("Could not read headers from the sheet. Skipping calculator mode.")
+                job.failed = True
+                return None
+
+            job.ignore_col_indices = [i for i, h in enumerate(sheet_headers) if h.endswith(" [replace]")]
+            # Only the [replace] columns are the sheet's output, so after recalculating
+            # only they are read back, with the column that matches rows to pages.
+            key_col = sheet_headers.index('ID') if 'ID' in sheet_headers else 0
+            job.write_back_columns = sorted({key_col, *job.ignore_col_indices})
+            job.write_back_properties = {sheet_headers[i].removesuffix(" [replace]") for i in job.ignore_col_indices}
+            headers = [h.removesuffix(" [replace]") if h.endswith(" [replace]") else h for h in sheet_headers]
+            job.notion_schema = self.notion_client_wrapper.get_database_schema(job.db_id)
+            job.notion_properties = job.notion_schema.properties
+            self._wait_for_notion_formulas(job, headers)
+        else:
+            log(f"Syncing '{job.name}' from Notion to Google Sheet...")
+            job.notion_schema = self.notion_client_wrapper.get_database_schema(job.db_id)
+            job.notion_properties = job.notion_schema.properties
+            headers = list(job.notion_properties.keys())
+            headers.reverse()
+        return headers
+
+    def _fetch_notion_data(self, job):
+        headers = self._notion_headers(job)
+        if headers is None:
+            return
+        job.notion_data = self.notion_client_wrapper.get_notion_data(
+            job.db_id, headers, job.notion_schema, incremental=job.incremental,
+            page_index=job.page_index, sorts=job.sorts
         )
-        
-        if sheet_data:
-            notion_properties = self.notion_client_wrapper.get_database_properties(db_id)
-            self.notion_client_wrapper.notion_upsert(sheet_data, db_id, notion_properties)
-
-    def _sync_calculator_mode(self, spreadsheet_id, sheet_range, db_id):
-        print("Running in Calculator Mode...")
-        # Add a delay to allow Notion to finalize calculations before fetching data.
-        print("Waiting 2 seconds for Notion calculations...")
-        time.sleep(2)
-
-        sheet_name = sheet_range.split('!')[0]
-        header_range = f"{sheet_name}!1:1"
-        sheet_headers_data = self.google_sheets_client.get_sheet_data(spreadsheet_id, header_range)
-        if not sheet_headers_data:
-            print("Could not read headers from the sheet. Skipping calculator mode.")
+
+    def _read_header_grid(self, job):
+        """Reads only the first row of a job's range, cut down to the range's columns."""
+        sheet, start_col, start_row, end_col, _ = split_range(job.sheet_range)
+        grid = self.google_sheets_client.get_sheet_grid(job.spreadsheet_id, f"{sheet}!{start_row + 1}:{start_row + 1}")
+
+        def cells(rows):
+            return [row[start_col:end_col + 1 if end_col is not None else None] for row in rows]
+
+        return SheetGrid(job.sheet_range, cells(grid.formulas), cells(grid.values))
+
+    def _stream_to_sheet(self, job):
+        """
+        Streams a job's Notion rows into its range chunk by chunk, without
+        holding the whole database or range in memory. Used for pairs with
+        STREAM set. Only the header row is read up front ('calculator' jobs
+        need it); each chunk of the range is read as its rows arrive.
+        """
+        if job.priority == 'calculator':
+            job.sheet_grid = self._read_header_grid(job)
+        headers = self._notion_headers(job)
+        if headers is None:
+            return
+        row_batches = self.notion_client_wrapper.stream_notion_rows(
+            job.db_id, headers, job.notion_schema, sorts=job.sorts
+        )
+        stats = self.google_sheets_client.stream_sheet_update(
+            job.spreadsheet_id, job.sheet_range, headers, row_batches, job.notion_properties,
+            ignore_col_indices=job.ignore_col_indices, chunk_rows=self.stream_chunk_rows
+        )
+        # The whole range has not been read, so the Sheet -> Notion step reads it.
+        job.sheet_grid = None
+        if stats is None:
+            job.failed = True
+            return
+        record_cells(stats['cells_written'], stats['cells_skipped'])
+
+    def _wait_for_notion_formulas(self, job, headers):
+        """
+        Waits until the job's formula and rollup values read the same twice in a
+        row, so Notion has finished recalculating them before the data is fetched.
+        """
+        computed = [h for h in headers if job.notion_properties.get(h, {}).get('type') in ('formula', 'rollup')]
+        if not computed:
             return
-        sheet_headers = sheet_headers_data[0]
 
-        replace_col_indices = [i for i, h in enumerate(sheet_headers) if h.endswith(" [replace]")]
-        notion_target_headers = [h.removesuffix(" [replace]") if h.endswith(" [replace]") else h for h in sheet_headers]
+        def probe():
+            return self.notion_client_wrapper.sample_computed_values(job.db_id, computed, job.notion_properties)
 
-        notion_properties = self.notion_client_wrapper.get_database_properties(db_id)
-        notion_data = self.notion_client_wrapper.get_notion_data(db_id, notion_target_headers, notion_properties)
+        _, result = wait_until_ready(probe, lambda previous, current: previous == current, timeout=self.ready_timeout)
+        self.wait_metrics.record('notion_formulas', result)
+        record_sleep('notion_formulas', result['slept'])
+        state = "settled" if result['ready'] else "still changing, continuing anyway"
+        log(f"Notion formulas {state} after {result['waited']:.2f}s ({result['attempts']} reads).")
 
-        if notion_data:
-            formula_data = self.google_sheets_client.get_sheet_data(spreadsheet_id, sheet_range, render_option='FORMULA')
-            self.google_sheets_client.update_sheet_with_formatting(
-                spreadsheet_id, sheet_range, notion_data, notion_properties, formula_data,
-                ignore_col_indices=replace_col_indices
+    def _wait_for_sheet_recalculation(self, jobs):
+        """
+        Reads the jobs' ranges until no formula cell shows 'Loading...', leaving
+        the final read in each job's sheet_grid.
+        """
+        def probe():
+            self._read_grids(jobs)
+            return [job for job in jobs if not job.failed and job.sheet_grid.is_loading()]
+
+        loading, result = wait_until_ready(probe, lambda previous, current: not current, timeout=self.ready_timeout)
+        self.wait_metrics.record('sheet_recalculation', result)
+        for job in jobs:
+            record_sleep('sheet_recalculation', result['slept'], job=job.name)
+        if loading:
+            log(f"Sheet formulas still loading after {result['waited']:.2f}s. Continuing anyway.")
+        else:
+            log(f"Sheet ready after {result['waited']:.2f}s ({result['attempts']} reads).")
+
+    def _write_sheets(self, jobs):
+        """
+        Writes the Notion data of all jobs to their ranges, sending the formatting
+        and cell values of every job in one call each per spreadsheet.
+        """
+        pending = {}
+
+        def prepare(job):
+            if not job.notion_data:
+                return
+            update = self.google_sheets_client.prepare_sheet_update(
+                job.spreadsheet_id, job.sheet_range, job.notion_data, job.notion_properties,
+                job.sheet_grid.formulas, ignore_col_indices=job.ignore_col_indices,
+                formatted_data=job.sheet_grid.values
             )
+            if update is not None:
+                pending.setdefault(job.spreadsheet_id, []).append((job, update))
 
-        print("Waiting 1 second for calculations...")
-        time.sleep(1)
+        self._run_step(jobs, prepare)
 
-        self._sync_sheet_to_notion(spreadsheet_id, sheet_range, db_id)
+        for spreadsheet_id, job_updates in pending.items():
+            try:
+                with self._shared_scope([job for job, _ in job_updates]):
+                    self.google_sheets_client.apply_sheet_updates(spreadsheet_id, [update for _, update in job_updates])
+            except Exception:
+                for job, _ in job_updates:
+                    self._fail(job)
+                continue
 
-    def run_sync_for_pair(self, pair):
+            for job, update in job_updates:
+                if update.error is not None and not update.failed_rows:
+                    try:
+                        raise update.error
+                    except Exception:
+                        self._fail(job)
+                    continue
+                if update.failed_rows:
+                    job.stale_rows = update.failed_rows
+                    with job_scope(job.name):
+                        log(f"Could not write {len(update.failed_rows)} rows of '{job.name}' ({update.error}). "
+                            "They are skipped until the next run.")
+                record_cells(update.cells_written, update.cells_skipped, job=job.name)
+                if update.cells_written or update.formatting_applied:
+                    # The sheet changed, so the grid read for this stage is stale.
+                    job.sheet_grid = None
+
+    def _upsert_sheet_data(self, job):
+        log(f"Syncing '{job.name}' from Google Sheet to Notion...")
+        sheet_data = job.write_back_rows()
+        if sheet_data:
+            # 'notion' and 'calculator' jobs have just written Notion's values to the sheet.
+            formulas = job.sheet_grid.formulas if job.write_back_columns is None else None
+            self._upsert_rows(
+                job, sheet_data, job.page_index, notion_first=job.priority in ('notion', 'calculator'),
+                formulas=formulas, stale_rows=job.stale_rows
+            )
+
+    def _upsert_rows(self, job, sheet_data, page_index, notion_first=False, partial=False, formulas=None, stale_rows=None):
         """
-        Runs a sync for a single pair defined in the config file.
+        Sends sheet rows (headers first) to Notion, counts the outcome and saves
+        the job's sync state. With `partial`, the rows are only some of the
+        range's, so the saved state of the other rows is kept. `formulas` are
+        the rows' formulas, which tell 'notion' jobs what the sheet computes.
+        `stale_rows` are offsets into `sheet_data` of rows that are left alone.
+        """
+        record_rows('sheet_to_notion', 'read', len(sheet_data) - 1)
+        schema = self.notion_client_wrapper.get_database_schema(job.db_id)
+        row_state = self.sync_state.load(job.state_key) if self.sync_state else None
+        # For 'notion' jobs, existing pages only get the sheet's computed values.
+        result = self.notion_client_wrapper.notion_upsert(
+            sheet_data, job.db_id, schema, page_index=page_index, row_state=row_state,
+            notion_first=notion_first, notion_wins=job.priority == 'notion',
+            properties_to_write=job.write_back_properties, create_pages=job.priority != 'calculator',
+            formulas=formulas, stale_rows=stale_rows
+        )
+        if result:
+            for outcome in ('updated', 'created', 'skipped', 'failed'):
+                record_rows('sheet_to_notion', outcome, result[outcome])
+            record_rows('sheet_to_notion', 'conflict', result['conflicts'])
+            if result['row_state'] is not None:
+                self.sync_state.save(job.state_key, {**row_state, **result['row_state']} if partial else result['row_state'])
+
+    def _sync_rows_to_notion(self, job, row_numbers):
+        """
+        Sends only the given sheet rows (1-based row numbers) of a job's range
+        to Notion, reading just those rows and the pages they match.
+        """
+        sheet, start_col, start_row, end_col, end_row = split_range(job.sheet_range)
+        header_row = start_row + 1
+        row_numbers = [r for r in sorted(set(row_numbers)) if r > header_row and (end_row is None or r <= end_row + 1)]
+        if not row_numbers:
+            return
+
+        # Consecutive rows are read together, as whole rows cut down to the range's columns.
+        runs = []
+        for r in row_numbers:
+            if runs and runs[-1][1] == r - 1:
+                runs[-1][1] = r
+            else:
+                runs.append([r, r])
+        ranges = [f"{sheet}!{header_row}:{header_row}"] + [f"{sheet}!{first}:{last}" for first, last in runs]
+        grids = self.google_sheets_client.get_sheet_grids(job.spreadsheet_id, ranges)
+
+        def cells(row):
+            return row[start_col:end_col + 1 if end_col is not None else None]
+
+        header_grid = grids[ranges[0]]
+        sheet_data = [cells(header_grid.headers)]
+        formulas = [cells(header_grid.formulas[0]) if header_grid.formulas else []]
+        for (first, last), range_name in zip(runs, ranges[1:]):
+            grid = grids[range_name]
+            sheet_data += [cells(grid.values[i]) if i < len(grid.values) else [] for i in range(last - first + 1)]
+            formulas += [cells(grid.formulas[i]) if i < len(grid.formulas) else [] for i in range(last - first + 1)]
+        if not sheet_data[0]:
+            log(f"Could not read the headers of '{job.name}'. Skipping.")
+            return
+
+        log(f"Syncing {len(row_numbers)} edited rows of '{job.name}' from Google Sheet to Notion...")
+        schema = self.notion_client_wrapper.get_database_schema(job.db_id)
+        page_index = self.notion_client_wrapper.index_pages_for_rows(job.db_id, sheet_data, schema)
+        self._upsert_rows(job, sheet_data, page_index, partial=True, formulas=formulas)
+
+    def _sync_pages_to_sheet(self, job, page_ids):
+        """
+        Writes only the given Notion pages to their rows of a job's range, found
+        by the 'ID' column or else the first column. For 'calculator' jobs the
+        recalculated [replace] columns of those rows are then written back.
+
+        Returns:
+            bool: False if a page could not be placed (it is new, archived or
+                  its key changed), so the whole range must be synced instead.
+        """
+        self._read_grids([job])
+        if job.failed:
+            return True
+        headers = self._notion_headers(job)
+        if headers is None:
+            return True
+        grid = job.sheet_grid
+        if job.priority == 'notion' and grid.headers != headers:
+            return False
+
+        page_rows = self.notion_client_wrapper.get_page_rows(page_ids, headers, job.notion_schema)
+        if len(page_rows) < len(set(page_ids)):
+            return False
+        key_col = headers.index('ID') if 'ID' in headers else 0
+        offsets_by_key = {}
+        for offset, row in enumerate(grid.values[1:], start=1):
+            if key_col < len(row) and row[key_col] != '':
+                offsets_by_key.setdefault(str(row[key_col]), []).append(offset)
+        rows = {}
+        for _, row in page_rows:
+            offsets = offsets_by_key.get(str(row[key_col]), [])
+            if len(offsets) != 1:
+                return False
+            rows[offsets[0]] = row
+
+        log(f"Syncing {len(rows)} changed pages of '{job.name}' from Notion to Google Sheet...")
+        update = self.google_sheets_client.prepare_rows_update(
+            job.sheet_range, rows, grid.formulas, ignore_col_indices=job.ignore_col_indices, formatted_data=grid.values
+        )
+        self.google_sheets_client.apply_sheet_updates(job.spreadsheet_id, [update])
+        if update.error is not None and not update.failed_rows:
+            raise update.error
+        if update.failed_rows:
+            log(f"Could not write {len(update.failed_rows)} rows of '{job.name}' ({update.error}). They are skipped until the next sync.")
+        record_cells(update.cells_written, update.cells_skipped)
+
+        written = sorted(offset for offset in rows if offset not in update.failed_rows)
+        if job.priority == 'calculator' and update.cells_written and written:
+            job.sheet_grid = None
+            self._wait_for_sheet_recalculation([job])
+            data = job.write_back_rows()
+            sheet_data = [data[0]] + [data[offset] if offset < len(data) else [] for offset in written]
+            page_index = NotionPageIndex(job.db_id)
+            page_index.set_pages([page for page, _ in page_rows], headers)
+            self._upsert_rows(job, sheet_data, page_index, notion_first=True, partial=True)
+        return True
+
+    def run_targeted_sync(self, pair, page_ids=(), row_numbers=()):
+        """
+        Syncs only some pages and rows of one sync pair, for change notifications:
+
+        - `row_numbers`, 1-based rows edited in the sheet, are sent to Notion
+          for 'sheet' and 'notion' jobs.
+        - `page_ids`, pages changed in Notion, are written to their rows in the
+          sheet for 'notion' and 'calculator' jobs.
+
+        If a changed page cannot be placed in the sheet, the pair is synced in
+        full instead.
+        """
+        job = SyncJob(pair, self.config['SAMPLE_SPREADSHEET_ID'])
+        if job.priority not in ('notion', 'sheet', 'calculator'):
+            log(f"Unknown priority '{job.priority}' for job '{job.name}'. Skipping.")
+            return
+        if job.quota_priority not in PRIORITY_CLASSES:
+            job.quota_priority = DEFAULT_PRIORITY
+        page_ids = list(dict.fromkeys(page_ids)) if job.priority in ('notion', 'calculator') else []
+        row_numbers = list(row_numbers) if job.priority in ('sheet', 'notion') else []
+        if not page_ids and not row_numbers:
+            return
+
+        full_sync = False
+
+        def sync(job):
+            nonlocal full_sync
+            if row_numbers:
+                self._sync_rows_to_notion(job, row_numbers)
+            if page_ids and not job.failed:
+                full_sync = not self._sync_pages_to_sheet(job, page_ids)
+
+        with self.resource_locks.hold(job.resource_keys()):
+            self.notion_client_wrapper.schema_cache.expire_all()
+            self.notion_client_wrapper.relation_cache.expire_all()
+            start = time.perf_counter()
+            self._run_job_step(job, sync)
+            if not full_sync:
+                record_job_run(job.name, 'failed' if job.failed else 'ok', time.perf_counter() - start)
+        if full_sync:
+            log(f"Some changed pages of '{job.name}' are not in the sheet yet. Syncing the whole range.")
+            self.run_sync_for_pairs([pair])
+
+    def _group_into_rounds(self, jobs):
+        """
+        Splits jobs into rounds that can run together because no two jobs in a
+        round touch the same database or overlapping sheet cells. A job always
+        runs in a later round than any earlier job it conflicts with.
+        """
+        rounds = []
+        for job in jobs:
+            target = 0
+            for i, round_jobs in enumerate(rounds):
+                if any(job.conflicts_with(other) for other in round_jobs):
+                    target = i + 1
+            if target == len(rounds):
+                rounds.append([])
+            rounds[target].append(job)
+        return rounds
+
+    def _run_round(self, jobs):
+        """
+        Runs a round of non-conflicting jobs stage by stage, so that the Sheets
+        reads and writes of all jobs in each stage are combined.
+        """
+        for job in jobs:
+            log(f"Starting Sync for '{job.name}'...")
+
+        # Stage 1: Notion -> Sheet, for 'notion' and 'calculator' jobs.
+        sheet_jobs = [job for job in jobs if job.priority in ('notion', 'calculator')]
+        if sheet_jobs:
+            # One read gives the headers, the formulas to preserve and the current values.
+            # 'notion' jobs do not need it to fetch their data, so the read runs
+            # alongside their Notion fetches; 'calculator' jobs wait for the headers.
+            # Streamed jobs read their range a chunk at a time instead.
+            batched_jobs = [job for job in sheet_jobs if not job.stream]
+            grid_read = self._pool.submit(self._read_grids, batched_jobs)
+            self._run_step([job for job in batched_jobs if job.priority == 'notion'], self._fetch_notion_data)
+            grid_read.result()
+            self._run_step([job for job in batched_jobs if job.priority == 'calculator'], self._fetch_notion_data)
+            # Streamed jobs write their own chunks as the Notion pages arrive.
+            self._run_step([job for job in sheet_jobs if job.stream], self._stream_to_sheet)
+            self._write_sheets([job for job in batched_jobs if not job.failed])
+
+        # Stage 2: Sheet -> Notion, for every job. If nothing was written, the grid
+        # read for the first stage is still current; otherwise wait for the sheet to
+        # recalculate the formulas that depend on the new data.
+        needs_read = [job for job in jobs if not job.failed and job.sheet_grid is None]
+        if any(job in sheet_jobs for job in needs_read):
+            self._wait_for_sheet_recalculation(needs_read)
+        else:
+            self._read_grids(needs_read)
+        self._run_step(jobs, self._upsert_sheet_data)
+
+        for job in jobs:
+            if not job.failed:
+                log(f"Sync finished for job '{job.name}'. \n")
+
+    def run_sync_for_pairs(self, pairs):
+        """
+        Runs several sync pairs defined in the config file together. Jobs that do
+        not touch the same database or sheet cells share their Sheets reads and
+        writes; conflicting jobs run one after another in config order.
         """
-        job_name = pair.get('NAME', pair.get('RANGE'))
-        print(f"Starting Sync for '{job_name}'...")
-        
         spreadsheet_id = self.config['SAMPLE_SPREADSHEET_ID']
-        sheet_range, db_id, priority = pair['RANGE'], pair['DATABASE_ID'], pair['PRIORITY']
+        # Schemas and related page titles fetched in an earlier tick are checked again before use.
+        self.notion_client_wrapper.schema_cache.expire_all()
+        self.notion_client_wrapper.relation_cache.expire_all()
+        jobs = []
+        for pair in pairs:
+            job = SyncJob(pair, spreadsheet_id)
+            if job.priority not in ('notion', 'sheet', 'calculator'):
+                log(f"Unknown priority '{job.priority}' for job '{job.name}'. Skipping.")
+                continue
+            if job.quota_priority not in PRIORITY_CLASSES:
+                log(f"Unknown quota priority '{job.quota_priority}' for job '{job.name}'. Using '{DEFAULT_PRIORITY}'.")
+                job.quota_priority = DEFAULT_PRIORITY
+            jobs.append(job)
+
+        started_at = datetime.now(timezone.utc)
+        summaries = {}
+        for round_jobs in self._group_into_rounds(jobs):
+            keys = [key for job in round_jobs for key in job.resource_keys()]
+            with self.resource_locks.hold(keys):
+                before = {job.name: job_totals(job.name) for job in round_jobs}
+                start = time.perf_counter()
+                self._run_round(round_jobs)
+                seconds = time.perf_counter() - start
+                for job in round_jobs:
+                    status = 'failed' if job.failed else 'ok'
+                    record_job_run(job.name, status, seconds)
+                    summaries[job.name] = {
+                        'status': status, 'seconds': round(seconds, 3),
+                        **subtract_totals(job_totals(job.name), before[job.name])
+                    }
+        self._write_run_summary(started_at, summaries)
 
+    def _write_run_summary(self, started_at, summaries):
+        """Keeps the per-job totals of a run in `last_run_summary` and appends them to the summary file."""
+        self.last_run_summary = {
+            'started_at': started_at.isoformat(),
+            'seconds': round((datetime.now(timezone.utc) - started_at).total_seconds(), 3),
+            'jobs': summaries
+        }
+        if not self.metrics_summary_file:
+            return
         try:
-            if priority == 'notion':
-                self._sync_notion_to_sheet(spreadsheet_id, sheet_range, db_id)
-                print("Waiting 1 second for calculations...")
-                time.sleep(1)
-                self._sync_sheet_to_notion(spreadsheet_id, sheet_range, db_id)
-            elif priority == 'sheet':
-                self._sync_sheet_to_notion(spreadsheet_id, sheet_range, db_id)
-            elif priority == 'calculator':
-                self._sync_calculator_mode(spreadsheet_id, sheet_range, db_id)
-            else:
-                print(f"Unknown priority '{priority}' for job '{job_name}'. Skipping.")
-        
-        except Exception as e:
-            print(f"An error occurred with job '{job_name}' (Range: {sheet_range}, DB: {db_id}). See sync_errors.log for details.")
-            logging.exception(f"Failed to sync job '{job_name}' (Range: {sheet_range}, DB: {db_id})")
-            return # Stop further execution for this pair if an error occurs
-
-        print(f"Sync finished for job '{job_name}'. \n")
\ No newline at end of file
+            with open(self.metrics_summary_file, 'a') as f:
+                f.write(json.dumps(self.last_run_summary) + '\n')
+        except OSError as e:
+            logging.error(f"Could not write the run summary to {self.metrics_summary_file}: {e}")
+
+    def run_sync_for_pair(self, pair):
+        """
+        Runs a sync for a single pair defined in the config file.
+        """
+        self.run_sync_for_pairs([pair])
@@ -1,33 +1,231 @@
 # google_sheets_client.py
+import json
+import time
+import logging
+import hashlib
+import asyncio
+import threading
+import httplib2
+from google_auth_httplib2 import Request as AuthRequest
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from a1_notation import split_range, sub_range, sheet_title
+from sheet_diff import diff_grid
+from sheet_grid import SheetGrid
+from job_context import log
+from async_io import AsyncEngine
+from metrics import instrument_methods, record_api_call
+from retry import RetryLayer
+from quota import QuotaGovernor
 
-def _get_sheet_id(service, spreadsheet_id, sheet_name):
-    """Helper function to get the sheetId from a sheet name."""
-    sheets_metadata = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-    for sheet in sheets_metadata['sheets']:
-        if sheet['properties']['title'] == sheet_name:
-            return sheet['properties']['sheetId']
-    return None
+# Field mask for reading formulas and displayed values of a range in one call.
+_GRID_FIELDS = (
+    'sheets(properties(sheetId,title),'
+    'data(startRow,startColumn,rowData.values(userEnteredValue,effectiveValue,formattedValue)))'
+)
 
+def _fingerprint(requests):
+    """Returns a stable hash of a list of batchUpdate requests."""
+    return hashlib.sha256(json.dumps(requests, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _split_value_range(value_range, max_rows):
+    """Splits a {'range', 'values'} entry into row blocks of at most `max_rows` rows, each with its own A1 range."""
+    values = value_range['values']
+    if len(values) <= max_rows:
+        return [value_range]
+    width = max(len(row) for row in values)
+    return [
+        {'range': sub_range(value_range['range'], offset, 0, len(values[offset:offset + max_rows]), width),
+         'values': values[offset:offset + max_rows]}
+        for offset in range(0, len(values), max_rows)
+    ]
+
+def _pack_value_ranges(value_ranges, max_rows):
+    """Groups value ranges, in order, into batches of at most `max_rows` rows (or one larger range)."""
+    batches, rows = [], 0
+    for value_range in value_ranges:
+        count = len(value_range['values'])
+        if batches and rows + count <= max_rows:
+            batches[-1].append(value_range)
+            rows += count
+        else:
+            batches.append([value_range])
+            rows = count
+    return batches
+
+class SheetUpdate:
+    """
+    The pending formatting requests and changed cell ranges for one sheet range.
+    """
+    def __init__(self, range_name, formatting_requests, fingerprint, value_ranges, cells_written, cells_skipped):
+        self.range_name = range_name
+        self.formatting_requests = formatting_requests
+        self.fingerprint = fingerprint
+        self.value_ranges = value_ranges
+        self.cells_written = cells_written
+        self.cells_skipped = cells_skipped
+        self.formatting_applied = False
+        self.error = None
+        # Row offsets into the range whose values could not be written, even on retry.
+        # If `error` is set and this is empty, nothing of the update was written.
+        self.failed_rows = set()
+
+    def stats(self):
+        return {
+            'cells_written': self.cells_written,
+            'cells_skipped': self.cells_skipped,
+            'formatting_applied': self.formatting_applied
+        }
+
+@instrument_methods('sheets')
 class GoogleSheetsClient:
     """
     A client for interacting with the Google Sheets API.
     """
-    def __init__(self, credentials):
+    def __init__(self, credentials, engine=None, retry_layer=None, write_chunk_rows=1000, write_concurrency=4):
+        self.credentials = credentials
         self.service = build('sheets', 'v4', credentials=credentials)
+        # Requests are built with googleapiclient but sent by the engine over its
+        # pooled session, which any number of threads can share.
+        self.engine = engine if engine is not None else AsyncEngine()
+        # Retries throttled and failed requests, and limits how many are in flight.
+        if retry_layer is None:
+            retry_layer = RetryLayer('sheets', governor=QuotaGovernor.from_config({}))
+        self.retry_layer = retry_layer
+        # Cell values are written in calls of at most this many rows, this many calls at a time.
+        self.write_chunk_rows = max(1, write_chunk_rows)
+        self.write_concurrency = max(1, write_concurrency)
+        self._refresh_lock = None
+        # spreadsheet_id -> {sheet title: sheetId}
+        self._sheet_ids = {}
+        # (spreadsheet_id, range_name) -> fingerprint of the last formatting requests sent
+        self._formatting_fingerprints = {}
+        # Guards both caches, which scheduler and webhook threads use at the same time.
+        self._metadata_lock = threading.Lock()
+
+    def _execute(self, request):
+        """Executes an API request built with `self.service` and returns the parsed response."""
+        if self.credentials is None:
+            return request.execute()
+        return self.engine.run(self.execute_async(request))
+
+    async def execute_async(self, request):
+        """
+        Sends an API request built with `self.service` on the engine's loop.
+        Errors are raised as HttpError, exactly like `request.execute()`.
+        """
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            if not self.credentials.valid:
+                # Token refreshes are rare and blocking, so keep them off the loop.
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.credentials.refresh, AuthRequest(httplib2.Http())
+                )
+
+        headers = {k: v for k, v in request.headers.items() if k.lower() != 'content-length'}
+        self.credentials.apply(headers)
+        session = self.engine.session
+        http_request = session.build_request(request.method, request.uri, content=request.body, headers=headers)
+        start = time.perf_counter()
+        response = await self.retry_layer.send_async(http_request, session.send)
+        record_api_call(
+            'sheets', request.method, response.request.url.path, response.status_code,
+            time.perf_counter() - start, len(request.body or b''), len(response.content)
+        )
+        resp = httplib2.Response(dict(response.headers, status=str(response.status_code)))
+        return request.postproc(resp, response.content)
+
+    def _get_sheet_id(self, spreadsheet_id, sheet_name):
+        """
+        Returns the sheetId for a sheet name, using cached spreadsheet metadata.
+        The metadata is downloaded again if the sheet is not in the cache.
+        """
+        with self._metadata_lock:
+            sheet_ids = self._sheet_ids.get(spreadsheet_id)
+            if sheet_ids is not None and sheet_name in sheet_ids:
+                return sheet_ids[sheet_name]
+        sheets_metadata = self._execute(self.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields='sheets.properties(sheetId,title)'
+        ))
+        sheet_ids = {sheet['properties']['title']: sheet['properties']['sheetId'] for sheet in sheets_metadata['sheets']}
+        with self._metadata_lock:
+            self._sheet_ids[spreadsheet_id] = sheet_ids
+        return sheet_ids.get(sheet_name)
+
+    def invalidate_metadata(self, spreadsheet_id):
+        """
+        Forgets the cached sheet IDs and formatting fingerprints of a spreadsheet.
+        """
+        with self._metadata_lock:
+            self._sheet_ids.pop(spreadsheet_id, None)
+            for key in [k for k in self._formatting_fingerprints if k[0] == spreadsheet_id]:
+                del self._formatting_fingerprints[key]
+
+    def _formatting_unchanged(self, spreadsheet_id, range_name, fingerprint):
+        """Returns True if these formatting requests were the last ones sent for the range."""
+        with self._metadata_lock:
+            return self._formatting_fingerprints.get((spreadsheet_id, range_name)) == fingerprint
+
+    def _remember_formatting(self, spreadsheet_id, range_name, fingerprint):
+        """Records the formatting requests last sent for a range."""
+        with self._metadata_lock:
+            self._formatting_fingerprints[(spreadsheet_id, range_name)] = fingerprint
 
     def get_sheet_data(self, spreadsheet_id, range_name, render_option='FORMATTED_VALUE'):
         """
         Fetches data from a specified range in a Google Sheet.
         """
         sheet = self.service.spreadsheets()
-        result = sheet.values().get(
+        result = self._execute(sheet.values().get(
             spreadsheetId=spreadsheet_id, 
             range=range_name, 
             valueRenderOption=render_option
-        ).execute()
+        ))
         return result.get('values', [])
 
+    def get_sheet_grid(self, spreadsheet_id, range_name):
+        """
+        Reads the formulas and displayed values of a range with a single
+        `spreadsheets.get` call.
+
+        Returns:
+            SheetGrid: The range's formulas, values and headers.
+        """
+        return self.get_sheet_grids(spreadsheet_id, [range_name])[range_name]
+
+    def get_sheet_grids(self, spreadsheet_id, range_names):
+        """
+        Reads the formulas and displayed values of several ranges of one
+        spreadsheet with a single `spreadsheets.get` call.
+
+        Returns:
+            dict: range name -> SheetGrid.
+        """
+        unique_ranges = list(dict.fromkeys(range_names))
+        response = self._execute(self.service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            ranges=unique_ranges,
+            includeGridData=True,
+            fields=_GRID_FIELDS
+        ))
+
+        # The API groups the returned GridData by sheet, in the order the ranges were requested.
+        data_by_sheet = {}
+        for sheet in response.get('sheets', []):
+            properties = sheet['properties']
+            with self._metadata_lock:
+                self._sheet_ids.setdefault(spreadsheet_id, {})[properties['title']] = properties['sheetId']
+            data_by_sheet[properties['title']] = list(sheet.get('data', []))
+
+        grids = {}
+        for range_name in unique_ranges:
+            sheet_data = data_by_sheet.get(sheet_title(split_range(range_name)[0]), [])
+            grid_data = sheet_data.pop(0) if sheet_data else {}
+            grids[range_name] = SheetGrid.from_grid_data(range_name, grid_data)
+        return grids
+
     def get_sheet_grid_data(self, spreadsheet_id, range_name):
         """
         Fetches detailed grid data from a specified range in a Google Sheet.
@@ -37,30 +235,41 @@ class GoogleSheetsClient:
             ranges=[range_name],
             includeGridData=True
         )
-        return request.execute()
+        return self._execute(request)
 
     def batch_update_sheet(self, spreadsheet_id, requests):
         """
         Performs a batch update on a spreadsheet.
         """
         body = {'requests': requests}
-        return self.service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+        return self._execute(self.service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body))
 
-    def update_sheet_with_formatting(self, spreadsheet_id, range_name, notion_data, notion_properties, formula_data=None, ignore_col_indices=None):
+    def update_sheet_with_formatting(self, spreadsheet_id, range_name, notion_data, notion_properties, formula_data=None, ignore_col_indices=None, formatted_data=None):
         """
         Updates a Google Sheet with data and formatting from Notion, preserving formulas and ignoring specified columns.
+
+        `formula_data` is the range as currently read with the FORMULA render
+        option, and `formatted_data` optionally the same range as displayed.
+        Only cells whose value differs from both of them are written.
+
+        Returns:
+            dict: The number of 'cells_written' and 'cells_skipped', and whether
+                  formatting was applied ('formatting_applied').
         """
-        sheet_name = range_name.split('!')[0]
-        sheet_id = _get_sheet_id(self.service, spreadsheet_id, sheet_name)
-        if sheet_id is None:
-            print(f"Error: Sheet '{sheet_name}' not found.")
-            return
+        update = self.prepare_sheet_update(
+            spreadsheet_id, range_name, notion_data, notion_properties, formula_data,
+            ignore_col_indices=ignore_col_indices, formatted_data=formatted_data
+        )
+        if update is None:
+            return None
+        self.apply_sheet_updates(spreadsheet_id, [update])
+        if update.error:
+            raise update.error
+        return update.stats()
 
-        # Step 1: Apply formatting requests (data validation, number formats)
+    def _formatting_requests(self, sheet_id, headers, notion_properties, ignore_col_indices):
+        """Builds the data validation and number format requests for the columns below the header row."""
         formatting_requests = []
-        headers = notion_data[0]
-        if ignore_col_indices is None: ignore_col_indices = []
-
         for col_index, header in enumerate(headers):
             if header not in notion_properties or col_index in ignore_col_indices: continue
 
@@ -125,11 +334,30 @@ class GoogleSheetsClient:
                         'fields': 'userEnteredFormat.numberFormat'
                     }
                 })
-        
-        if formatting_requests:
-            self.batch_update_sheet(spreadsheet_id, formatting_requests)
+        return formatting_requests
+
+    def prepare_sheet_update(self, spreadsheet_id, range_name, notion_data, notion_properties, formula_data=None, ignore_col_indices=None, formatted_data=None):
+        """
+        Works out the formatting requests and changed cells needed to bring a range
+        in line with Notion data, without sending anything. See
+        `update_sheet_with_formatting` for the arguments.
 
-        # Step 2: Update cell values, preserving formulas and ignoring columns
+        Returns:
+            SheetUpdate: The pending update, or None if the sheet does not exist.
+        """
+        sheet_name = sheet_title(split_range(range_name)[0])
+        sheet_id = self._get_sheet_id(spreadsheet_id, sheet_name)
+        if sheet_id is None:
+            log(f"Error: Sheet '{sheet_name}' not found.")
+            return None
+
+        # Step 1: Build formatting requests (data validation, number formats)
+        headers = notion_data[0]
+        if ignore_col_indices is None: ignore_col_indices = []
+        formatting_requests = self._formatting_requests(sheet_id, headers, notion_properties, ignore_col_indices)
+
+        # Step 2: Work out which cells differ from what is already in the sheet,
+        # preserving formulas and ignoring columns
         formula_cells = set()
         if formula_data:
             for r, row in enumerate(formula_data):
@@ -137,21 +365,227 @@ class GoogleSheetsClient:
                     if isinstance(cell, str) and cell.startswith('='):
                         formula_cells.add((r, c))
 
-        final_data = []
-        for r_idx, row in enumerate(notion_data):
-            row_data = []
-            for c_idx, cell_value in enumerate(row):
-                if (r_idx, c_idx) in formula_cells or c_idx in ignore_col_indices:
-                    row_data.append(None) # This tells the values.update API to skip the cell
+        blocks, cells_written, cells_skipped = diff_grid(
+            notion_data, formula_data, skip_cells=formula_cells, skip_cols=ignore_col_indices,
+            formatted_grid=formatted_data
+        )
+        log(f"Writing {cells_written} changed cells in {len(blocks)} ranges, skipping {cells_skipped} unchanged cells.")
+        value_ranges = [
+            {'range': sub_range(range_name, row_offset, col_offset, len(values), len(values[0])), 'values': values}
+            for row_offset, col_offset, values in blocks
+        ]
+
+        # Skip the formatting call entirely if it would re-apply exactly what was sent last time.
+        fingerprint = _fingerprint(formatting_requests)
+        if formatting_requests and self._formatting_unchanged(spreadsheet_id, range_name, fingerprint):
+            log("Formatting unchanged. Skipping formatting update.")
+            formatting_requests = []
+        return SheetUpdate(range_name, formatting_requests, fingerprint, value_ranges, cells_written, cells_skipped)
+
+    def prepare_rows_update(self, range_name, rows, formula_data=None, ignore_col_indices=None, formatted_data=None):
+        """
+        Works out the changed cells needed to bring some rows of a range in line
+        with Notion data, leaving the rest of the range and its formatting alone.
+        Formulas in `formula_data` (the whole range, as for
+        `update_sheet_with_formatting`) are preserved.
+
+        Args:
+            rows (dict): Row offset in the range (0 is the header row) -> row values.
+
+        Returns:
+            SheetUpdate: The pending update, with no formatting requests.
+        """
+        value_ranges = []
+        cells_written = cells_skipped = 0
+        for offset, row in sorted(rows.items()):
+            existing = formula_data[offset:offset + 1] if formula_data else None
+            formatted = formatted_data[offset:offset + 1] if formatted_data is not None else None
+            formula_cells = {
+                (0, c) for c, cell in enumerate(existing[0] if existing else [])
+                if isinstance(cell, str) and cell.startswith('=')
+            }
+            blocks, written, skipped = diff_grid(
+                [row], existing, skip_cells=formula_cells, skip_cols=ignore_col_indices, formatted_grid=formatted
+            )
+            value_ranges += [
+                {'range': sub_range(range_name, offset + row_offset, col_offset, len(values), len(values[0])), 'values': values}
+                for row_offset, col_offset, values in blocks
+            ]
+            cells_written += written
+            cells_skipped += skipped
+        log(f"Writing {cells_written} changed cells in {len(rows)} rows, skipping {cells_skipped} unchanged cells.")
+        return SheetUpdate(range_name, [], None, value_ranges, cells_written, cells_skipped)
+
+    def apply_sheet_updates(self, spreadsheet_id, updates):
+        """
+        Sends pending updates for one spreadsheet, combining the formatting of all
+        of them into one `spreadsheets.batchUpdate` and their cell values into one
+        `values.batchUpdate`. If a combined formatting call fails, the updates are
+        retried one by one so a single bad range does not fail the others. Values
+        go out in row chunks, and a failed chunk is sent once more; the rows of
+        chunks that still fail are stored on their update's `failed_rows`, while
+        the update's other chunks stay written. Failures are stored on each
+        update's `error`.
+        """
+        updates = [u for u in updates if u is not None and u.error is None]
+        formatting = [u for u in updates if u.formatting_requests]
+        if formatting:
+            try:
+                self.batch_update_sheet(spreadsheet_id, [r for u in formatting for r in u.formatting_requests])
+            except HttpError as e:
+                # The sheet may have been deleted or recreated, so the cached sheetId is stale.
+                self.invalidate_metadata(spreadsheet_id)
+                if len(formatting) == 1:
+                    formatting[0].error = e
                 else:
-                    row_data.append(cell_value)
-            final_data.append(row_data)
+                    for update in formatting:
+                        try:
+                            self.batch_update_sheet(spreadsheet_id, update.formatting_requests)
+                        except HttpError as single_error:
+                            update.error = single_error
+            for update in formatting:
+                if update.error is None:
+                    self._remember_formatting(spreadsheet_id, update.range_name, update.fingerprint)
+                    update.formatting_applied = True
 
-        update_body = {'values': final_data}
-        self.service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id, range=range_name,
-            valueInputOption='USER_ENTERED', body=update_body
-        ).execute()
+        writes = [u for u in updates if u.error is None and u.value_ranges]
+        if not writes:
+            return
+        # The ranges are split up front, so every chunk can be traced back to its update.
+        owners = {}
+        value_ranges = []
+        for update in writes:
+            for value_range in update.value_ranges:
+                for piece in _split_value_range(value_range, self.write_chunk_rows):
+                    owners[id(piece)] = update
+                    value_ranges.append(piece)
+
+        # Only the failed chunks are sent again. Chunks are never split further,
+        # so every chunk of the retry is still one of the pieces above.
+        failed = [piece for batch, _ in self.write_value_ranges(spreadsheet_id, value_ranges) for piece in batch]
+        if not failed:
+            return
+        for batch, error in self.write_value_ranges(spreadsheet_id, failed):
+            for piece in batch:
+                update = owners[id(piece)]
+                if update.error is None:
+                    update.error = error
+                first_row = split_range(piece['range'])[2] - split_range(update.range_name)[2]
+                update.failed_rows.update(range(first_row, first_row + len(piece['values'])))
+
+    def stream_sheet_update(self, spreadsheet_id, range_name, headers, row_batches, notion_properties, ignore_col_indices=None, chunk_rows=500):
+        """
+        Writes Notion rows to a range while they are still arriving, instead of
+        building the whole grid first. Formatting is applied up front. The rows
+        from `row_batches` (an iterable of lists of rows) are then collected in
+        chunks of `chunk_rows` rows. As each chunk fills up, the same rows of
+        the range are read, compared with it, and its changed cells are sent,
+        so neither the Notion rows nor the range are held in full.
+
+        See `update_sheet_with_formatting` for the other arguments.
+
+        Returns:
+            dict: The number of 'cells_written' and 'cells_skipped', and whether
+                  formatting was applied ('formatting_applied'), or None if the
+                  sheet does not exist.
+        """
+        sheet_name = sheet_title(split_range(range_name)[0])
+        sheet_id = self._get_sheet_id(spreadsheet_id, sheet_name)
+        if sheet_id is None:
+            log(f"Error: Sheet '{sheet_name}' not found.")
+            return None
+        if ignore_col_indices is None: ignore_col_indices = []
+        stats = {'cells_written': 0, 'cells_skipped': 0, 'formatting_applied': False}
+
+        formatting_requests = self._formatting_requests(sheet_id, headers, notion_properties, ignore_col_indices)
+        fingerprint = _fingerprint(formatting_requests)
+        if formatting_requests and self._formatting_unchanged(spreadsheet_id, range_name, fingerprint):
+            log("Formatting unchanged. Skipping formatting update.")
+        elif formatting_requests:
+            try:
+                self.batch_update_sheet(spreadsheet_id, formatting_requests)
+            except HttpError:
+                self.invalidate_metadata(spreadsheet_id)
+                raise
+            self._remember_formatting(spreadsheet_id, range_name, fingerprint)
+            stats['formatting_applied'] = True
+
+        chunks_sent = 0
+
+        def flush(offset, rows):
+            nonlocal chunks_sent
+            # Only the columns being written matter, so the chunk is read as wide as the headers.
+            grid = self.get_sheet_grid(spreadsheet_id, sub_range(range_name, offset, 0, len(rows), max(len(headers), 1)))
+            formula_cells = {
+                (r, c) for r, row in enumerate(grid.formulas) for c, cell in enumerate(row)
+                if isinstance(cell, str) and cell.startswith('=')
+            }
+            blocks, cells_written, cells_skipped = diff_grid(
+                rows, grid.formulas, skip_cells=formula_cells, skip_cols=ignore_col_indices, formatted_grid=grid.values
+            )
+            del grid
+            if blocks:
+                failures = self.write_value_ranges(spreadsheet_id, [
+                    {'range': sub_range(range_name, offset + row_offset, col_offset, len(values), len(values[0])), 'values': values}
+                    for row_offset, col_offset, values in blocks
+                ])
+                if failures:
+                    # The failed chunks are sent once more before giving up.
+                    failures = self.write_value_ranges(spreadsheet_id, [piece for batch, _ in failures for piece in batch])
+                if failures:
+                    raise failures[0][1]
+                chunks_sent += 1
+            stats['cells_written'] += cells_written
+            stats['cells_skipped'] += cells_skipped
+
+        # The header row goes first, so row offsets match the range.
+        offset, chunk = 0, [list(headers)]
+        for batch in row_batches:
+            chunk.extend(batch)
+            while len(chunk) >= chunk_rows:
+                flush(offset, chunk[:chunk_rows])
+                offset += chunk_rows
+                chunk = chunk[chunk_rows:]
+        if chunk:
+            flush(offset, chunk)
+
+        log(f"Streamed {stats['cells_written']} changed cells in {chunks_sent} writes, skipping {stats['cells_skipped']} unchanged cells.")
+        return stats
+
+    def _values_batch_update(self, spreadsheet_id, value_ranges):
+        body = {'valueInputOption': 'USER_ENTERED', 'data': value_ranges}
+        return self.service.spreadsheets().values().batchUpdate(spreadsheetId=spreadsheet_id, body=body)
+
+    def write_value_ranges(self, spreadsheet_id, value_ranges):
+        """
+        Writes {'range', 'values'} entries with `values.batchUpdate` calls of at
+        most `write_chunk_rows` rows each, sending up to `write_concurrency` calls
+        at once. Taller ranges are split into row blocks with their own A1
+        ranges, so a failed call only loses its own chunk.
+
+        Returns:
+            list: A (value ranges, exception) pair for every chunk that could not
+                  be written. All other chunks were written.
+        """
+        pieces = [piece for value_range in value_ranges for piece in _split_value_range(value_range, self.write_chunk_rows)]
+        batches = _pack_value_ranges(pieces, self.write_chunk_rows)
+        if len(batches) == 1 or self.credentials is None:
+            results = []
+            for batch in batches:
+                try:
+                    results.append(self._execute(self._values_batch_update(spreadsheet_id, batch)))
+                except Exception as e:
+                    results.append(e)
+        else:
+            requests = [self._values_batch_update(spreadsheet_id, batch) for batch in batches]
+            results = self.engine.run_all([self.execute_async(request) for request in requests], limit=self.write_concurrency)
+
+        failures = [(batch, result) for batch, result in zip(batches, results) if isinstance(result, Exception)]
+        if len(batches) > 1:
+            log(f"Wrote {len(pieces)} ranges in {len(batches)} chunks of up to {self.write_chunk_rows} rows ({len(failures)} failed).")
+        for batch, error in failures:
+            logging.warning(f"Failed to write {', '.join(vr['range'] for vr in batch)}: {error}")
+        return failures
 
     def update_sheet(self, spreadsheet_id, range_name, notion_data):
         """
@@ -176,8 +610,10 @@ class GoogleSheetsClient:
                     row_data.append(notion_data[r][c] if c < len(notion_data[r]) else "")
             final_data.append(row_data)
 
-        update_body = {'values': final_data}
-        self.service.spreadsheets().values().update(
-            spreadsheetId=spreadsheet_id, range=range_name,
-            valueInputOption='USER_ENTERED', body=update_body
-        ).execute()
\ No newline at end of file
+        if not final_data or not max_cols:
+            return
+        failures = self.write_value_ranges(spreadsheet_id, [
+            {'range': sub_range(range_name, 0, 0, max_rows, max_cols), 'values': final_data}
+        ])
+        if failures:
+            raise failures[0][1]
\ No newline at end of file
@@ -0,0 +1,38 @@
+# job_context.py
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# A context variable rather than a thread-local, so coroutines running on the
+# async engine's loop keep the job of the thread that submitted them.
+_current_job = contextvars.ContextVar('job', default=None)
+_print_lock = threading.Lock()
+
+def current_job():
+    """Returns the name of the sync job running on this thread or task, or None."""
+    return _current_job.get()
+
+@contextmanager
+def job_scope(job_name):
+    """Attributes everything logged and measured on this thread or task to `job_name` while the block runs."""
+    token = _current_job.set(job_name)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+def log(message):
+    """
+    Prints a progress message, prefixed with the current job's name when one is
+    set, without interleaving it with messages printed by other threads.
+    """
+    job_name = current_job()
+    with _print_lock:
+        print(f"[{job_name}] {message}" if job_name else message)
+
+class JobLogFilter(logging.Filter):
+    """Adds the current job's name to log records as `job`."""
+    def filter(self, record):
+        record.job = current_job() or '-'
+        return True
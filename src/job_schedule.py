@@ -0,0 +1,120 @@
+# job_schedule.py
+import calendar
+from datetime import datetime, timedelta
+
+WEEKDAYS = {'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6}
+
+def _parse_time(time_str):
+    """Parses "HH:MM" into (hour, minute)."""
+    hour, minute = map(int, time_str.split(':'))
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"Invalid time '{time_str}'")
+    return hour, minute
+
+class JobSchedule:
+    """
+    The repeat schedule of one sync pair, parsed once from its `INTERVAL` and
+    `REPEAT_*` settings, that computes the job's next fire time.
+    """
+    def __init__(self, interval, hour=0, minute=0, weekday=None, day=None, month=None):
+        self.interval = interval
+        self.hour = hour
+        self.minute = minute
+        self.weekday = weekday
+        self.day = day
+        self.month = month
+
+    @classmethod
+    def from_job(cls, job):
+        """
+        Compiles a sync pair's schedule.
+
+        Returns:
+            JobSchedule: The schedule, or None if the job does not repeat.
+
+        Raises:
+            ValueError: If the `REPEAT_*` setting for the interval is missing or malformed.
+        """
+        is_repeat = job.get('REPEAT', False) or job.get('REAPEAT', False)
+        interval = job.get('INTERVAL')
+        if not is_repeat or not interval:
+            return None
+
+        try:
+            if interval == 'hour':
+                minute = int(job['REPEAT_HOUR'])
+                if not 0 <= minute <= 59:
+                    raise ValueError(f"Invalid minute '{minute}'")
+                return cls('hour', minute=minute)
+
+            if interval == 'day':
+                hour, minute = _parse_time(job['REPEAT_DAY']) # "18:01"
+                return cls('day', hour, minute)
+
+            if interval == 'week':
+                run_time_str, run_day_str = job['REPEAT_WEEK'].split('-') # "00:01-Monday"
+                hour, minute = _parse_time(run_time_str)
+                return cls('week', hour, minute, weekday=WEEKDAYS[run_day_str.lower()])
+
+            if interval == 'month':
+                run_time_str, run_day_str = job['REPEAT_MONTH'].split('-') # "11:59-31"
+                hour, minute = _parse_time(run_time_str)
+                day = int(run_day_str)
+                if not 1 <= day <= 31:
+                    raise ValueError(f"Invalid day of month '{day}'")
+                return cls('month', hour, minute, day=day)
+
+            if interval == 'year':
+                run_time_str, run_day_str, run_month_str = job['REPEAT_YEAR'].split('-') # "00:01-31-12"
+                hour, minute = _parse_time(run_time_str)
+                day, month = int(run_day_str), int(run_month_str)
+                # Validate against a leap year so 29-02 is accepted.
+                datetime(2024, month, day)
+                return cls('year', hour, minute, day=day, month=month)
+        except KeyError as e:
+            raise ValueError(f"Missing or unknown value {e}") from e
+
+        raise ValueError(f"Unknown interval '{interval}'")
+
+    def next_fire(self, after):
+        """Returns the first fire time strictly later than the datetime `after`."""
+        if self.interval == 'hour':
+            candidate = after.replace(minute=self.minute, second=0, microsecond=0)
+            return candidate if candidate > after else candidate + timedelta(hours=1)
+
+        if self.interval == 'day':
+            candidate = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+            return candidate if candidate > after else candidate + timedelta(days=1)
+
+        if self.interval == 'week':
+            # Monday is 0, Sunday is 6
+            candidate = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+            candidate += timedelta(days=(self.weekday - after.weekday()) % 7)
+            return candidate if candidate > after else candidate + timedelta(days=7)
+
+        if self.interval == 'month':
+            year, month = after.year, after.month
+            while True:
+                # Days past the end of a month (e.g. 31 in February) run on its last day.
+                _, last_day = calendar.monthrange(year, month)
+                candidate = datetime(year, month, min(self.day, last_day), self.hour, self.minute)
+                if candidate > after:
+                    return candidate
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+        # 'year': 29-02 only exists in leap years, so look ahead until it does.
+        year = after.year
+        while True:
+            if self.day <= calendar.monthrange(year, self.month)[1]:
+                candidate = datetime(year, self.month, self.day, self.hour, self.minute)
+                if candidate > after:
+                    return candidate
+            year += 1
+
+    def missed_fires(self, fire_time, now):
+        """Returns how many fire times from `fire_time` up to `now` (inclusive) have passed."""
+        count = 0
+        while fire_time <= now:
+            count += 1
+            fire_time = self.next_fire(fire_time)
+        return count
@@ -1,24 +1,44 @@
 # main.py
 import time
 import logging
+import argparse
 from config_loader import ConfigLoader
 from google_auth import GoogleAuth
 from google_sheets_client import GoogleSheetsClient
 from notion_client_wrapper import NotionClientWrapper
+from relation_cache import RelationTitleCache
+from notion_snapshot import NotionSnapshotStore
+from notion_write_executor import NotionWriteExecutor
+from notion_schema import SchemaCache
 from data_syncer import DataSyncer
+from async_io import AsyncEngine
+from job_context import JobLogFilter
+from metrics import MetricsServer
+from retry import RetryLayer, RetryPolicy, AdaptiveWindow
+from quota import QuotaGovernor
 
 logging.basicConfig(
     filename='sync_errors.log',
     level=logging.ERROR,
-    format='%(asctime)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(levelname)s - [%(job)s] %(message)s'
 )
+for handler in logging.getLogger().handlers:
+    handler.addFilter(JobLogFilter())
 
 from scheduler import Scheduler
+from webhook_listener import WebhookListener
 
 def main():
     """
     Main function to run the synchronization script.
     """
+    parser = argparse.ArgumentParser(description="Syncs Notion databases with Google Sheets.")
+    parser.add_argument(
+        '--full-rescan', action='store_true',
+        help="Discard the snapshots of INCREMENTAL sync pairs, so their first run reads the whole database."
+    )
+    args = parser.parse_args()
+
     config_loader = ConfigLoader()
     config = config_loader.load_config()
     if not config:
@@ -27,11 +47,55 @@ def main():
     google_auth = GoogleAuth(scopes=['https://www.googleapis.com/auth/spreadsheets'])
     google_creds = google_auth.get_credentials()
     
-    google_sheets_client = GoogleSheetsClient(credentials=google_creds)
-    notion_client_wrapper = NotionClientWrapper(auth_token=config['NOTION_INTEGRATION_TOKEN'])
+    # One event loop and connection pool carries the network calls of both clients.
+    engine = AsyncEngine(max_connections=config.get('HTTP_MAX_CONNECTIONS', 20))
+    # One request budget per API, shared by every job.
+    governor = QuotaGovernor.from_config(config).export_metrics()
+    retry_policy = RetryPolicy(
+        max_attempts=config.get('RETRY_MAX_ATTEMPTS', 5),
+        base_delay=config.get('RETRY_BASE_DELAY', 1.0),
+        max_delay=config.get('RETRY_MAX_DELAY', 60.0)
+    )
+    google_sheets_client = GoogleSheetsClient(
+        credentials=google_creds,
+        engine=engine,
+        retry_layer=RetryLayer('sheets', retry_policy, AdaptiveWindow(maximum=config.get('SHEETS_MAX_IN_FLIGHT', 10)), governor),
+        write_chunk_rows=config.get('SHEETS_WRITE_CHUNK_ROWS', 1000),
+        write_concurrency=config.get('SHEETS_WRITE_CONCURRENCY', 4)
+    )
+    relation_cache = RelationTitleCache(
+        ttl=config.get('RELATION_CACHE_TTL', 3600),
+        max_size=config.get('RELATION_CACHE_SIZE', 10000),
+        cache_file=config.get('RELATION_CACHE_FILE')
+    )
+    snapshot_store = NotionSnapshotStore(
+        snapshot_dir=config.get('SNAPSHOT_DIR', 'notion_snapshots'),
+        full_rescan_interval=config.get('FULL_RESCAN_INTERVAL', 86400)
+    )
+    if args.full_rescan:
+        for pair in config.get('SYNC_PAIRS', []):
+            if pair.get('INCREMENTAL'):
+                snapshot_store.invalidate(pair['DATABASE_ID'])
+        print("Discarded the Notion snapshots. Incremental sync pairs will read their whole database.")
+    write_executor = NotionWriteExecutor(max_workers=config.get('NOTION_WRITE_WORKERS', 3))
+    notion_client_wrapper = NotionClientWrapper(
+        auth_token=config['NOTION_INTEGRATION_TOKEN'],
+        relation_cache=relation_cache,
+        prefetch_relations=config.get('RELATION_PREFETCH', True),
+        snapshot_store=snapshot_store,
+        write_executor=write_executor,
+        schema_cache=SchemaCache(ttl=config.get('SCHEMA_CACHE_TTL')),
+        engine=engine,
+        read_concurrency=config.get('NOTION_READ_CONCURRENCY', 3),
+        retry_layer=RetryLayer('notion', retry_policy, AdaptiveWindow(maximum=config.get('NOTION_MAX_IN_FLIGHT', 6)), governor)
+    )
+
+    if config.get('METRICS_PORT'):
+        MetricsServer(config['METRICS_PORT'], host=config.get('METRICS_HOST', '127.0.0.1')).start()
 
     syncer = DataSyncer(config, google_sheets_client, notion_client_wrapper)
-    scheduler = Scheduler(syncer)
+    listener = WebhookListener.from_config(syncer).start() if config.get('WEBHOOK_PORT') else None
+    scheduler = Scheduler(syncer, stay_alive=listener is not None)
 
     try:
         scheduler.run()
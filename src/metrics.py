@@ -0,0 +1,397 @@
+# metrics.py
+import re
+import time
+import bisect
+import inspect
+import logging
+import threading
+import functools
+import httpx
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from job_context import current_job
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """A thread-safe counter with one value per combination of label values."""
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        """Returns {label values tuple: value}."""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = []
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge:
+    """
+    A value that can go up and down, with one value per combination of label
+    values. Its values are either set directly or read from a function when
+    the metrics are rendered.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function):
+        """Reads the values from `function()`, which returns {label values tuple: value}, from now on."""
+        self._function = function
+
+    def values(self):
+        if self._function is not None:
+            return dict(self._function())
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in sorted(self.values().items())]
+
+class Histogram:
+    """A thread-safe histogram of observed values, with one series per combination of label values."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Per-bucket counts plus an overflow slot, then the sum.
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def values(self):
+        """Returns {label values tuple: (count, sum)}."""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._series.items()}
+
+    def render(self):
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = []
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += counts[-1]
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Holds the metrics of the process and renders them in the Prometheus text format."""
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._add(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._add(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+API_REQUESTS = REGISTRY.counter('sync_api_requests_total', "HTTP requests sent to the Notion and Sheets APIs.", ('job', 'service', 'endpoint', 'status'))
+API_LATENCY = REGISTRY.histogram('sync_api_request_seconds', "Latency of HTTP requests to the Notion and Sheets APIs.", ('service', 'endpoint'))
+API_BYTES_SENT = REGISTRY.counter('sync_api_bytes_sent_total', "Request body bytes sent to the APIs.", ('job', 'service'))
+API_BYTES_RECEIVED = REGISTRY.counter('sync_api_bytes_received_total', "Response body bytes received from the APIs.", ('job', 'service'))
+API_RETRIES = REGISTRY.counter('sync_api_retries_total', "API requests sent again after a throttle, server or network error.", ('job', 'service', 'reason'))
+CLIENT_CALLS = REGISTRY.counter('sync_client_calls_total', "Calls to the Notion and Sheets client methods.", ('job', 'client', 'method', 'outcome'))
+CLIENT_LATENCY = REGISTRY.histogram('sync_client_call_seconds', "Time spent in the Notion and Sheets client methods.", ('client', 'method'))
+ROWS = REGISTRY.counter('sync_rows_total', "Rows read and written, by direction and outcome.", ('job', 'direction', 'outcome'))
+CELLS = REGISTRY.counter('sync_cells_total', "Sheet cells written or left unchanged.", ('job', 'outcome'))
+SLEEP_SECONDS = REGISTRY.counter('sync_sleep_seconds_total', "Time spent waiting on rate limits, recalculation and the schedule.", ('job', 'reason'))
+QUOTA_GRANTS = REGISTRY.counter('sync_quota_grants_total', "Requests let through by the quota governor.", ('job', 'api', 'kind', 'priority'))
+QUOTA_UTILIZATION = REGISTRY.gauge('sync_quota_utilization', "Share of each quota bucket's burst currently used, from 0 to 1.", ('api', 'kind'))
+QUOTA_WAITING = REGISTRY.gauge('sync_quota_waiting', "Requests waiting for quota.", ('api', 'kind', 'priority'))
+JOB_RUNS = REGISTRY.counter('sync_job_runs_total', "Completed sync job runs.", ('job', 'status'))
+JOB_DURATION = REGISTRY.histogram('sync_job_duration_seconds', "Wall time of sync job runs.", ('job',))
+WEBHOOK_EVENTS = REGISTRY.counter('sync_webhook_events_total', "Change notifications received, by source and what was done with them.", ('source', 'outcome'))
+
+def _job():
+    return current_job() or '-'
+
+def record_rows(direction, outcome, count, job=None):
+    """Counts rows read or written, e.g. ('sheet_to_notion', 'updated', 12). `job` defaults to the current job."""
+    if count:
+        ROWS.inc(count, job=job or _job(), direction=direction, outcome=outcome)
+
+def record_retry(service, reason):
+    API_RETRIES.inc(job=_job(), service=service, reason=reason)
+
+def record_quota_grant(api, kind, priority):
+    QUOTA_GRANTS.inc(job=_job(), api=api, kind=kind, priority=priority)
+
+def record_cells(written, skipped, job=None):
+    job = job or _job()
+    if written:
+        CELLS.inc(written, job=job, outcome='written')
+    if skipped:
+        CELLS.inc(skipped, job=job, outcome='skipped')
+
+def record_sleep(reason, seconds, job=None):
+    if seconds:
+        SLEEP_SECONDS.inc(seconds, job=job or _job(), reason=reason)
+
+def record_job_run(job_name, status, seconds):
+    JOB_RUNS.inc(job=job_name, status=status)
+    JOB_DURATION.observe(seconds, job=job_name)
+
+def record_webhook_event(source, outcome, count=1):
+    """Counts change notifications, e.g. ('notion', 'queued') or ('sheet', 'rejected')."""
+    if count:
+        WEBHOOK_EVENTS.inc(count, source=source, outcome=outcome)
+
+def job_totals(job_name):
+    """
+    Returns the running totals recorded for one job, for the per-run summary.
+    Subtract two results to get the totals of the run in between.
+    """
+    totals = {'api_calls': 0, 'bytes_sent': 0, 'bytes_received': 0, 'rows': {}, 'cells': {}, 'sleep_seconds': {}}
+    for (job, service, endpoint, status), value in API_REQUESTS.values().items():
+        if job == job_name:
+            totals['api_calls'] += value
+    for (job, service), value in API_BYTES_SENT.values().items():
+        if job == job_name:
+            totals['bytes_sent'] += value
+    for (job, service), value in API_BYTES_RECEIVED.values().items():
+        if job == job_name:
+            totals['bytes_received'] += value
+    for (job, direction, outcome), value in ROWS.values().items():
+        if job == job_name:
+            totals['rows'][f"{direction}.{outcome}"] = value
+    for (job, outcome), value in CELLS.values().items():
+        if job == job_name:
+            totals['cells'][outcome] = value
+    for (job, reason), value in SLEEP_SECONDS.values().items():
+        if job == job_name:
+            totals['sleep_seconds'][reason] = value
+    return totals
+
+def subtract_totals(after, before):
+    """Returns `after - before` for two results of job_totals."""
+    diff = {}
+    for key, value in after.items():
+        if isinstance(value, dict):
+            previous = before.get(key, {})
+            diff[key] = {k: v - previous.get(k, 0) for k, v in value.items() if v - previous.get(k, 0)}
+        else:
+            diff[key] = value - before.get(key, 0)
+    return diff
+
+# --- Client instrumentation --------------------------------------------------
+
+def _observe_call(client, method, start, outcome):
+    CLIENT_CALLS.inc(job=_job(), client=client, method=method, outcome=outcome)
+    CLIENT_LATENCY.observe(time.perf_counter() - start, client=client, method=method)
+
+def _instrument(func, client):
+    method = func.__name__
+
+    if inspect.isgeneratorfunction(func):
+        # Generators are timed from the first to the last item they produce.
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                yield from func(*args, **kwargs)
+                outcome = 'ok'
+            finally:
+                _observe_call(client, method, start, outcome)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = func(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            _observe_call(client, method, start, outcome)
+    return wrapper
+
+def instrument_methods(client):
+    """
+    Class decorator that counts and times every public synchronous method of
+    a client class under `sync_client_calls_total` and `sync_client_call_seconds`.
+    """
+    def decorate(cls):
+        for name, func in list(vars(cls).items()):
+            if name.startswith('_') or not inspect.isfunction(func) or inspect.iscoroutinefunction(func):
+                continue
+            setattr(cls, name, _instrument(func, client))
+        return cls
+    return decorate
+
+# Object IDs and A1 ranges are replaced so endpoints have few distinct values.
+_ID_PATTERN = re.compile(r'/(pages|databases|blocks|users|comments|spreadsheets)/[^/:]+')
+_RANGE_PATTERN = re.compile(r'/values/[^/]+?(?=(:append|:clear)?$)')
+
+def endpoint_name(method, path):
+    """Returns a low-cardinality name for an API call, e.g. 'POST /v1/databases/{id}/query'."""
+    path = _RANGE_PATTERN.sub('/values/{range}', path)
+    path = _ID_PATTERN.sub(r'/\1/{id}', path)
+    return f"{method} {path}"
+
+def _request_started(request):
+    request.extensions['metrics_start'] = time.perf_counter()
+
+def record_api_call(service, method, path, status, seconds, bytes_sent, bytes_received):
+    """Records one HTTP request to an API under the `sync_api_*` metrics."""
+    endpoint = endpoint_name(method, path)
+    job = _job()
+    API_REQUESTS.inc(job=job, service=service, endpoint=endpoint, status=str(status))
+    API_LATENCY.observe(seconds, service=service, endpoint=endpoint)
+    API_BYTES_SENT.inc(bytes_sent, job=job, service=service)
+    API_BYTES_RECEIVED.inc(bytes_received, job=job, service=service)
+
+def _response_received(service, response):
+    request = response.request
+    start = request.extensions.get('metrics_start', time.perf_counter())
+    record_api_call(
+        service, request.method, request.url.path, response.status_code,
+        time.perf_counter() - start, len(request.content), len(response.content)
+    )
+
+def instrument_http_client(http_client, service):
+    """
+    Adds event hooks to an httpx.Client or httpx.AsyncClient that record every
+    request it sends under the `sync_api_*` metrics, labelled with `service`.
+    """
+    if isinstance(http_client, httpx.AsyncClient):
+        async def on_request(request):
+            _request_started(request)
+
+        async def on_response(response):
+            await response.aread()
+            _response_received(service, response)
+    else:
+        def on_request(request):
+            _request_started(request)
+
+        def on_response(response):
+            response.read()
+            _response_received(service, response)
+
+    hooks = http_client.event_hooks
+    hooks['request'] = hooks.get('request', []) + [on_request]
+    hooks['response'] = hooks.get('response', []) + [on_response]
+    http_client.event_hooks = hooks
+    return http_client
+
+# --- Exporter ----------------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class MetricsServer:
+    """
+    Serves the registry in the Prometheus text format at `/metrics` from a
+    background thread. Only this machine can read it unless `host` says otherwise.
+    """
+    def __init__(self, port, host='127.0.0.1', registry=REGISTRY):
+        self.port = port
+        self.host = host
+        self.registry = registry
+        self._httpd = None
+
+    def start(self):
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        except OSError as e:
+            logging.error(f"Could not start the metrics endpoint on {self.host}:{self.port}: {e}")
+            print(f"Could not start the metrics endpoint on port {self.port}: {e}")
+            return None
+        self._httpd.daemon_threads = True
+        self._httpd.registry = self.registry
+        threading.Thread(target=self._httpd.serve_forever, name='metrics-server', daemon=True).start()
+        print(f"Serving metrics at http://{self.host}:{self.port}/metrics")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
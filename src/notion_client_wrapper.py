@@ -1,229 +1,598 @@
 # notion_client_wrapper.py
+import time
 import logging
-from notion_client import Client
+import httpx
+from datetime import datetime, timedelta, timezone
+from notion_client import Client, AsyncClient
+from relation_cache import RelationTitleCache
+from notion_snapshot import NotionSnapshotStore
+from notion_page_index import NotionPageIndex
+from notion_write_executor import NotionWriteExecutor
+from notion_schema import NotionSchema, SchemaCache
+from sync_state import row_hash
+from notion_codecs import extract_rows, COMPARATORS
+from job_context import log
+from async_io import AsyncEngine
+from retry import RetryLayer, RetryTransport, AsyncRetryTransport
+from quota import QuotaGovernor
+from metrics import instrument_methods, instrument_http_client, record_rows
 
+def _trim_page(page, property_names):
+    """Returns a copy of a page that keeps only the given properties."""
+    properties = page['properties']
+    return {
+        'id': page['id'],
+        'last_edited_time': page.get('last_edited_time'),
+        'properties': {name: properties[name] for name in property_names if name in properties}
+    }
+
+def _projection(notion_properties, property_names):
+    """
+    Returns the query arguments that make Notion return only the given
+    properties of each page, or none if no property ID is known.
+    """
+    property_ids = [notion_properties[name]['id'] for name in property_names if 'id' in notion_properties.get(name, {})]
+    return {'filter_properties': property_ids} if property_ids else {}
+
+def _as_schema(notion_properties):
+    """
+    Returns a NotionSchema for either a NotionSchema or a plain properties dict.
+    Callers pass the schema cache's NotionSchema so its codecs are compiled
+    once per schema version, not once per call.
+    """
+    return notion_properties if isinstance(notion_properties, NotionSchema) else NotionSchema(notion_properties)
+
+def _get_page_title(page):
+    """Returns the text of a page's title property, or None if it has no title."""
+    for prop in page['properties'].values():
+        if prop['type'] == 'title' and prop['title']:
+            return prop['title'][0]['text']['content']
+    return None
+
+@instrument_methods('notion')
 class NotionClientWrapper:
     """
     A wrapper for the Notion client to handle data retrieval and updates.
     """
-    def __init__(self, auth_token):
-        self.client = Client(auth=auth_token)
+    def __init__(self, auth_token, relation_cache=None, prefetch_relations=True, snapshot_store=None, write_executor=None, schema_cache=None, engine=None, read_concurrency=3, retry_layer=None):
+        # Both clients send through one retry layer, so throttling seen by
+        # either shrinks the number of requests in flight for both.
+        if retry_layer is None:
+            retry_layer = RetryLayer('notion', governor=QuotaGovernor.from_config({}))
+        self.retry_layer = retry_layer
+        self.client = Client(auth=auth_token, client=httpx.Client(transport=RetryTransport(self.retry_layer)))
+        # Reads that fan out (related databases, related pages) are sent
+        # concurrently with the async client on the engine's loop.
+        self.engine = engine if engine is not None else AsyncEngine()
+        self.async_client = AsyncClient(auth=auth_token, client=httpx.AsyncClient(transport=AsyncRetryTransport(self.retry_layer)))
+        instrument_http_client(self.client.client, 'notion')
+        instrument_http_client(self.async_client.client, 'notion')
+        self.read_concurrency = max(1, read_concurrency)
+        self.relation_cache = relation_cache if relation_cache is not None else RelationTitleCache()
+        self.prefetch_relations = prefetch_relations
+        self.snapshot_store = snapshot_store if snapshot_store is not None else NotionSnapshotStore()
+        self.write_executor = write_executor if write_executor is not None else NotionWriteExecutor()
+        self.schema_cache = schema_cache if schema_cache is not None else SchemaCache()
 
     def get_database_properties(self, database_id):
         """
         Retrieves the properties (schema) of a Notion database.
         """
+        return self.get_database_schema(database_id).properties
+
+    def get_database_schema(self, database_id):
+        """
+        Retrieves the schema of a Notion database as a NotionSchema, through the schema cache.
+        """
+        return self.schema_cache.get(database_id, self._retrieve_database)
+
+    def _retrieve_database(self, database_id):
         response = self.client.databases.retrieve(database_id=database_id)
         if 'properties' not in response:
             logging.error(f"Failed to retrieve properties for database '{database_id}'. Response: {response}")
             raise KeyError(f"'properties' not in response for database '{database_id}'")
-        return response['properties']
+        return response
 
     def update_database_properties(self, database_id, properties):
         """
         Updates the properties (schema) of a Notion database.
         """
         self.client.databases.update(database_id=database_id, properties=properties)
+        self.schema_cache.invalidate(database_id)
 
-    def get_notion_data(self, database_id, expected_headers, notion_properties):
+    def get_notion_data(self, database_id, expected_headers, notion_properties, incremental=False, page_index=None, sorts=None):
         """
         Retrieves all pages from a Notion database and formats them into a grid,
         handling various property types, including formulas, rollups, and relations.
+
+        If `incremental` is True, only pages edited since the last sync are
+        fetched and merged into a local snapshot of the database's rows.
+        If a `page_index` is given, it is filled with the fetched pages, or for
+        an incremental fetch with the snapshot's copies of them, so
+        `notion_upsert` can reuse them.
+        If `sorts` (Notion sort objects) are given, a full read returns the rows
+        in that order instead of the reverse of Notion's default order.
+        Only the properties in `expected_headers` are requested from Notion.
+        `notion_properties` may be a NotionSchema or a plain properties dict.
         """
-        results = []
+        schema = _as_schema(notion_properties)
+        notion_properties = schema.properties
+        projection = _projection(notion_properties, expected_headers)
+        if incremental:
+            rows = self._get_rows_incremental(database_id, expected_headers, schema, page_index)
+        elif sorts:
+            results = list(self._query_all(database_id, sorts=sorts, **projection))
+            if page_index is not None:
+                page_index.set_pages(results, expected_headers)
+            rows = self._pages_to_rows(results, expected_headers, schema)
+        else:
+            results = list(self._query_all(database_id, **projection))
+            if page_index is not None:
+                page_index.set_pages(results, expected_headers)
+            results.reverse()
+            rows = self._pages_to_rows(results, expected_headers, schema)
+
+        self.relation_cache.save()
+        if any(notion_properties.get(h, {}).get('type') == 'relation' for h in expected_headers):
+            stats = self.relation_cache.stats()
+            log(f"Relation cache: {stats['hits']} hits, {stats['misses']} misses ({stats['size']} entries).")
+        return [expected_headers] + rows
+
+    def stream_notion_rows(self, database_id, expected_headers, notion_properties, sorts=None):
+        """
+        Reads a Notion database one response (up to 100 pages) at a time and
+        yields each response's pages as a list of rows, so the rows can be
+        written out before the last page has arrived. The raw pages are
+        dropped once converted, and nothing of them is kept.
+
+        Notion sorts the pages, by `sorts` or by creation time (oldest first)
+        if none are given. Only the properties in `expected_headers` are
+        requested from Notion. `notion_properties` may be a NotionSchema or a
+        plain properties dict.
+        """
+        schema = _as_schema(notion_properties)
+        notion_properties = schema.properties
+        sorts = sorts or [{'timestamp': 'created_time', 'direction': 'ascending'}]
+        projection = _projection(notion_properties, expected_headers)
+
         has_more = True
         next_cursor = None
-        
         while has_more:
-            response = self.client.databases.query(database_id=database_id, start_cursor=next_cursor)
-            results.extend(response['results'])
+            response = self.client.databases.query(database_id=database_id, start_cursor=next_cursor, sorts=sorts, **projection)
+            results = response['results']
             has_more = response['has_more']
             next_cursor = response['next_cursor']
+            rows = self._pages_to_rows(results, expected_headers, schema)
+            del response, results
+            yield rows
+
+        self.relation_cache.save()
+
+    def _get_rows_incremental(self, database_id, expected_headers, schema, page_index=None):
+        """
+        Returns the database's rows from the local snapshot, after merging in the
+        pages edited since the last sync. Falls back to a full scan when there is
+        no usable snapshot.
+
+        The snapshot also keeps each page's writable properties, so a
+        `page_index` is filled from it and the edited pages without reading the
+        rest of the database again.
+        """
+        synced_at = datetime.now(timezone.utc)
+        notion_properties = schema.properties
+        snapshot = self.snapshot_store.load(database_id, expected_headers, notion_properties)
+        projection = _projection(notion_properties, expected_headers)
+        writable = [name for name in expected_headers if notion_properties.get(name, {}).get('type') in COMPARATORS]
+        if snapshot is not None and any(len(entry) < 4 for entry in snapshot['rows']):
+            # Taken before snapshots kept the pages' properties.
+            snapshot = None
+
+        if snapshot is None:
+            log("No usable snapshot found. Performing a full scan of the database...")
+            results = list(self._query_all(database_id, **projection))
+            if page_index is not None:
+                page_index.set_pages(results, expected_headers)
+            results.reverse()
+            rows = self._pages_to_rows(results, expected_headers, schema)
+            entries = [
+                [page['id'], page.get('last_edited_time'), row, _trim_page(page, writable)['properties']]
+                for page, row in zip(results, rows)
+            ]
+            full_scan_at = time.time()
+        else:
+            # Notion rounds last_edited_time down to the minute, so look back one extra minute.
+            since = datetime.fromisoformat(snapshot['synced_at']) - timedelta(minutes=1)
+            changed = list(self._query_all(database_id, filter={
+                'timestamp': 'last_edited_time',
+                'last_edited_time': {'on_or_after': since.isoformat()}
+            }, **projection))
+            changed.reverse()
+            log(f"Incremental fetch: {len(changed)} pages edited since {since.isoformat()}.")
 
-        results.reverse()
+            changed_rows = self._pages_to_rows(changed, expected_headers, schema)
+            entries = snapshot['rows']
+            position = {entry[0]: i for i, entry in enumerate(entries)}
+            for page, row in zip(changed, changed_rows):
+                entry = [page['id'], page.get('last_edited_time'), row, _trim_page(page, writable)['properties']]
+                if page['id'] in position:
+                    entries[position[page['id']]] = entry
+                else:
+                    position[page['id']] = len(entries)
+                    entries.append(entry)
+            if page_index is not None:
+                # Newest first, the order a full scan returns them in.
+                page_index.set_pages(
+                    ({'id': page_id, 'last_edited_time': edited, 'properties': properties}
+                     for page_id, edited, _, properties in reversed(entries)),
+                    writable
+                )
+            full_scan_at = snapshot['full_scan_at']
+
+        self.snapshot_store.save(
+            database_id, expected_headers, notion_properties, entries,
+            synced_at=synced_at.isoformat(), full_scan_at=full_scan_at
+        )
+        return [entry[2] for entry in entries]
 
-        data_grid = [expected_headers]
+    def _pages_to_rows(self, results, expected_headers, schema):
+        """
+        Converts Notion pages into rows of cell values, one per header, with the
+        codecs of a NotionSchema.
+        """
+        notion_properties = schema.properties
+        record_rows('notion_to_sheet', 'read', len(results))
+        # Any page we have just fetched tells us whether a cached title for it is stale.
         for page in results:
-            row = []
-            for prop_name in expected_headers:
-                if prop_name == 'ID':
-                    row.append(page['id'])
-                    continue
-
-                prop_data = page['properties'].get(prop_name, {})
-                prop_type = prop_data.get('type')
-                content = ""
-
-                if prop_type and prop_data.get(prop_type):
-                    prop_value = prop_data[prop_type]
-                    if prop_type == 'title' and prop_value: content = prop_value[0]['text']['content']
-                    elif prop_type == 'rich_text' and prop_value: content = prop_value[0]['text']['content']
-                    elif prop_type == 'number': content = prop_value
-                    elif prop_type == 'checkbox': content = prop_value
-                    elif prop_type == 'select' and prop_value: content = prop_value['name']
-                    elif prop_type == 'multi_select': content = ', '.join([opt['name'] for opt in prop_value])
-                    elif prop_type == 'formula':
-                        formula_result = prop_data.get('formula')
-                        if formula_result:
-                            result_type = formula_result.get('type')
-                            if result_type == 'number':
-                                content = formula_result.get('number') if formula_result.get('number') is not None else '[Null Number]'
-                            elif result_type == 'string' and formula_result.get('string') is not None:
-                                content = formula_result['string']
-                            elif result_type == 'boolean' and formula_result.get('boolean') is not None:
-                                content = formula_result['boolean']
-                            elif result_type == 'date' and formula_result.get('date'):
-                                content = formula_result['date']['start']
-                            elif result_type == 'error':
-                                content = f"[Formula Error: {formula_result.get('error')}]"
-                            else:
-                                content = "[Unsupported Formula Result]"
-                    elif prop_type == 'rollup':
-                        rollup_obj = prop_data.get('rollup')
-                        if rollup_obj:
-                            result_type = rollup_obj.get('type')
-                            if result_type == 'number':
-                                content = rollup_obj.get('number') if rollup_obj.get('number') is not None else '[Null Number]'
-                            elif result_type == 'string' and rollup_obj.get('string') is not None:
-                                content = rollup_obj['string']
-                            elif result_type == 'date' and rollup_obj.get('date'):
-                                content = rollup_obj['date']['start']
-                            elif result_type == 'array':
-                                content = "[Rollup Array]"
-                            else:
-                                content = "[Unsupported Rollup Result]"
-                    elif prop_type == 'relation' and prop_value:
-                        related_page_titles = []
-                        for item in prop_value:
-                            try:
-                                related_page_id = item['id']
-                                related_page = self.client.pages.retrieve(page_id=related_page_id)
-                                for prop in related_page['properties'].values():
-                                    if prop['type'] == 'title' and prop['title']:
-                                        related_page_titles.append(prop['title'][0]['text']['content'])
-                                        break
-                            except Exception as e:
-                                logging.warning(f"Could not retrieve title for related page {item.get('id')}: {e}")
-                                related_page_titles.append(item.get('id', ''))
-                        content = ', '.join(related_page_titles)
-
-                row.append(content)
-            data_grid.append(row)
-        return data_grid
-
-    def _are_properties_different(self, new_props, existing_props, schema):
+            self.relation_cache.observe(page['id'], page.get('last_edited_time'))
+
+        relation_index = {}
+        if self.prefetch_relations:
+            relation_index = self._prefetch_related_titles(results, expected_headers, notion_properties)
+
+        # Related pages neither prefetched nor cached are retrieved together rather than one per cell.
+        missing = set()
+        for prop_name in expected_headers:
+            if notion_properties.get(prop_name, {}).get('type') != 'relation':
+                continue
+            for page in results:
+                for item in page['properties'].get(prop_name, {}).get('relation') or []:
+                    related_page_id = item.get('id')
+                    if related_page_id in relation_index or related_page_id in missing:
+                        continue
+                    title = self.relation_cache.get(related_page_id)
+                    if title is None:
+                        missing.add(related_page_id)
+                    else:
+                        relation_index[related_page_id] = title
+        relation_index.update(self._fetch_related_titles(sorted(missing)))
+
+        def resolve_title(related_page_id):
+            title = relation_index.get(related_page_id)
+            if title is None:
+                title = self._get_related_page_title(related_page_id)
+            return title
+
+        # One extractor per column, chosen from the schema once rather than per cell.
+        return extract_rows(schema.extractors(expected_headers), results, resolve_title)
+
+    def build_page_index(self, database_id, page_index=None, property_names=None, notion_properties=None):
+        """
+        Reads every page of a database into a NotionPageIndex. With
+        `property_names` and the database's `notion_properties`, the pages are
+        read with only those properties.
+        """
+        page_index = page_index if page_index is not None else NotionPageIndex(database_id)
+        projection = _projection(notion_properties, property_names) if property_names is not None and notion_properties is not None else {}
+        page_index.set_pages(self._query_all(database_id, **projection), property_names if projection else None)
+        return page_index
+
+    def get_pages(self, page_ids, property_names=None, notion_properties=None):
+        """
+        Retrieves the given pages concurrently, with only `property_names` if
+        given with the database's `notion_properties`. Pages that cannot be
+        read, or are archived, are left out.
+
+        Returns:
+            list: The pages, in the order of `page_ids`.
+        """
+        page_ids = list(page_ids)
+        projection = _projection(notion_properties, property_names) if property_names is not None and notion_properties is not None else {}
+        responses = self.engine.run_all(
+            [self._retrieve_page_async(page_id, **projection) for page_id in page_ids], limit=self.read_concurrency
+        )
+        pages = []
+        for page_id, page in zip(page_ids, responses):
+            if isinstance(page, Exception):
+                logging.warning(f"Could not retrieve page {page_id}: {page}")
+            elif not page.get('archived') and not page.get('in_trash'):
+                pages.append(page)
+        return pages
+
+    def get_page_rows(self, page_ids, expected_headers, notion_properties):
+        """
+        Retrieves the given pages and converts them into rows, one cell per
+        header, the way `get_notion_data` does for a whole database.
+
+        `notion_properties` may be a NotionSchema or a plain properties dict.
+
+        Returns:
+            list: [page, row] pairs for the pages that exist and are not archived.
+        """
+        schema = _as_schema(notion_properties)
+        pages = self.get_pages(page_ids, expected_headers, schema.properties)
+        rows = self._pages_to_rows(pages, expected_headers, schema)
+        self.relation_cache.save()
+        return [[page, row] for page, row in zip(pages, rows)]
+
+    def index_pages_for_rows(self, database_id, data, notion_properties, page_index=None):
+        """
+        Fills a NotionPageIndex with only the pages that the given sheet rows
+        (headers first) are matched to by `notion_upsert`: by page ID if there
+        is an 'ID' column, otherwise by title, with one query per 100 titles.
+        The index then counts as complete for those rows, so the upsert does
+        not read the whole database.
+        """
+        headers, data_rows = data[0], data[1:]
+        schema = _as_schema(notion_properties)
+        page_index = page_index if page_index is not None else NotionPageIndex(database_id)
+        needed = {target for _, target, _ in schema.encoders(headers)}
+        if headers[0] in schema.properties:
+            needed.add(headers[0])
+
+        if 'ID' in headers:
+            id_col = headers.index('ID')
+            page_ids = list(dict.fromkeys(row[id_col] for row in data_rows if id_col < len(row) and row[id_col]))
+            normalized_db_id = database_id.replace('-', '')
+            pages = [
+                page for page in self.get_pages(page_ids, needed, schema.properties)
+                if page.get('parent', {}).get('database_id', database_id).replace('-', '') == normalized_db_id
+            ]
+        elif schema.properties.get(headers[0], {}).get('type') == 'title':
+            titles = list(dict.fromkeys(row[0] for row in data_rows if row and row[0]))
+            projection = _projection(schema.properties, needed)
+            pages = []
+            for start in range(0, len(titles), 100):
+                conditions = [{'property': headers[0], 'title': {'equals': title}} for title in titles[start:start + 100]]
+                pages.extend(self._query_all(database_id, filter={'or': conditions}, **projection))
+        else:
+            # Rows are matched on a column that is not the title, which Notion cannot filter on.
+            return self.build_page_index(database_id, page_index, needed, schema.properties)
+
+        page_index.set_pages(pages, needed)
+        return page_index
+
+    def sample_computed_values(self, database_id, property_names, notion_properties):
+        """
+        Cheaply reads the first page of results of a database, limited to the given
+        (formula or rollup) properties, to check whether Notion is still computing them.
+
+        Returns:
+            list: One [page_id, {property name: value}] entry per page.
+        """
+        property_ids = [notion_properties[name]['id'] for name in property_names if 'id' in notion_properties[name]]
+        response = self.client.databases.query(database_id=database_id, page_size=100, filter_properties=property_ids)
+        return [
+            [page['id'], {name: page['properties'].get(name) for name in property_names}]
+            for page in response['results']
+        ]
+
+    def _query_all(self, database_id, **query_args):
+        """
+        Pages through a database query, yielding every page in the order Notion returns them.
+        """
+        has_more = True
+        next_cursor = None
+        while has_more:
+            response = self.client.databases.query(database_id=database_id, start_cursor=next_cursor, **query_args)
+            yield from response['results']
+            has_more = response['has_more']
+            next_cursor = response['next_cursor']
+
+    def _prefetch_related_titles(self, pages, expected_headers, notion_properties):
+        """
+        Builds an ID -> title index for the relation columns in `expected_headers`
+        by paging through each related database once, instead of retrieving every
+        related page on its own. The listing also tells which cached titles are
+        stale, so a database is queried if any referenced page is uncached or was
+        not checked yet this run; databases whose referenced pages all were are
+        not queried.
+        """
+        uncached_by_database = {}
+        for prop_name in expected_headers:
+            prop_schema = notion_properties.get(prop_name, {})
+            if prop_schema.get('type') != 'relation':
+                continue
+            related_db_id = prop_schema.get('relation', {}).get('database_id')
+            if not related_db_id:
+                continue
+
+            uncached = uncached_by_database.setdefault(related_db_id, set())
+            for page in pages:
+                for item in page['properties'].get(prop_name, {}).get('relation') or []:
+                    if not self.relation_cache.is_verified(item['id']):
+                        uncached.add(item['id'])
+
+        related_db_ids = [db_id for db_id, uncached in uncached_by_database.items() if uncached]
+        for related_db_id in related_db_ids:
+            log(f"Prefetching titles from related database '{related_db_id}' for {len(uncached_by_database[related_db_id])} uncached or unchecked pages...")
+        # The related databases are paged through concurrently, reading only
+        # the title, whose property ID is always 'title'.
+        listings = self.engine.run_all(
+            [self._query_all_async(db_id, filter_properties=['title']) for db_id in related_db_ids], limit=self.read_concurrency
+        )
+
+        relation_index = {}
+        for related_db_id, listing in zip(related_db_ids, listings):
+            if isinstance(listing, Exception):
+                # Without access to the related database, fall back to per-page retrieval.
+                logging.warning(f"Could not prefetch related database {related_db_id}: {listing}")
+                continue
+            for related_page in listing:
+                title = _get_page_title(related_page) or ''
+                relation_index[related_page['id']] = title
+                self.relation_cache.set(related_page['id'], title, related_page.get('last_edited_time'))
+            # A referenced page missing from the listing may have moved or been
+            # deleted, so its cached title is dropped and it is looked up on its own.
+            for page_id in uncached_by_database[related_db_id] - relation_index.keys():
+                self.relation_cache.invalidate(page_id)
+        return relation_index
+
+    def _fetch_related_titles(self, page_ids):
+        """
+        Retrieves the titles of related pages that are neither prefetched nor
+        cached, several at a time, and caches them.
+
+        Returns:
+            dict: page ID -> title. A page that cannot be read maps to its own ID.
+        """
+        page_ids = list(page_ids)
+        if not page_ids:
+            return {}
+        log(f"Retrieving {len(page_ids)} related pages...")
+        pages = self.engine.run_all([self._retrieve_page_async(page_id) for page_id in page_ids], limit=self.read_concurrency)
+
+        titles = {}
+        for page_id, related_page in zip(page_ids, pages):
+            if isinstance(related_page, Exception):
+                logging.warning(f"Could not retrieve title for related page {page_id}: {related_page}")
+                titles[page_id] = page_id or ''
+                continue
+            # Untitled pages are cached as '' so they are not fetched again.
+            titles[page_id] = _get_page_title(related_page) or ''
+            self.relation_cache.set(page_id, titles[page_id], related_page.get('last_edited_time'))
+        return titles
+
+    async def _query_all_async(self, database_id, **query_args):
+        """Pages through a database query with the async client and returns every page."""
+        pages = []
+        next_cursor = None
+        while True:
+            response = await self.async_client.databases.query(database_id=database_id, start_cursor=next_cursor, **query_args)
+            pages.extend(response['results'])
+            if not response['has_more']:
+                return pages
+            next_cursor = response['next_cursor']
+
+    async def _retrieve_page_async(self, page_id, **query_args):
+        return await self.async_client.pages.retrieve(page_id=page_id, **query_args)
+
+    def _get_related_page_title(self, related_page_id):
+        """
+        Returns the title of a related page, using the relation cache and falling
+        back to `pages.retrieve`. Returns '' for untitled pages and the page ID
+        itself if the page cannot be read.
+        """
+        title = self.relation_cache.get(related_page_id)
+        if title is not None:
+            return title
+        try:
+            related_page = self.client.pages.retrieve(page_id=related_page_id)
+        except Exception as e:
+            logging.warning(f"Could not retrieve title for related page {related_page_id}: {e}")
+            return related_page_id or ''
+
+        # Untitled pages are cached as '' so they are not fetched again.
+        title = _get_page_title(related_page) or ''
+        self.relation_cache.set(related_page_id, title, related_page.get('last_edited_time'))
+        return title
+
+    def _are_properties_different(self, new_props, existing_props, comparators):
         """Compares new and existing properties to see if an update is needed."""
         for prop_name, new_value_obj in new_props.items():
-            prop_type = schema[prop_name]['type']
             existing_value_obj = existing_props.get(prop_name)
 
             if not existing_value_obj:
                 return True # Property didn't exist before
 
-            if prop_type == 'rich_text' or prop_type == 'title':
-                new_text = new_value_obj[prop_type][0]['text']['content']
-                old_text = existing_value_obj[prop_type][0]['text']['content'] if existing_value_obj[prop_type] else ""
-                if new_text != old_text:
-                    return True
-            elif prop_type == 'number':
-                new_num = new_value_obj['number']
-                old_num = existing_value_obj['number']
-                if new_num != old_num:
-                    return True
-            elif prop_type == 'checkbox':
-                new_bool = new_value_obj['checkbox']
-                old_bool = existing_value_obj['checkbox']
-                if new_bool != old_bool:
-                    return True
-            elif prop_type == 'select':
-                new_option_name = new_value_obj['select']['name']
-                old_option = existing_value_obj['select']
-                old_option_name = old_option['name'] if old_option else None
-                if new_option_name != old_option_name:
-                    return True
-            elif prop_type == 'multi_select':
-                new_options = {opt['name'] for opt in new_value_obj['multi_select']}
-                old_options = {opt['name'] for opt in existing_value_obj['multi_select']}
-                if new_options != old_options:
-                    return True
+            if comparators[prop_name](new_value_obj, existing_value_obj):
+                return True
         return False
 
-    def notion_upsert(self, data, database_id, notion_properties):
+    def _values_hash(self, properties, columns, schema):
+        """Hashes the values of a page's (or an encoded row's) written properties."""
+        return row_hash([schema.canonicalizers[target](properties.get(target)) for _, target, _ in columns])
+
+    def notion_upsert(self, data, database_id, notion_properties, page_index=None, row_state=None,
+                      notion_first=False, notion_wins=False, properties_to_write=None, create_pages=True,
+                      formulas=None, stale_rows=None):
         """
         Performs an intelligent "upsert" in Notion. If an 'ID' column is present,
         it will use the page ID to update existing pages. Otherwise, it falls back
         to matching by title to update or create pages.
+
+        `notion_properties` may be a NotionSchema or a plain properties dict.
+        Existing pages are looked up in `page_index`. If it is missing, or was not
+        filled earlier in the run with the properties the sheet maps to, every page
+        of the database is read into it first, with only those properties.
+        The writes are sent concurrently through the write executor.
+
+        With `row_state`, the page_id -> (sheet_hash, notion_hash) state saved
+        after the last sync, rows that changed on neither side since are skipped
+        without being compared. `notion_first` says Notion's values were written
+        to the sheet earlier in the run, so a row of a page that changed in Notion
+        changed in the sheet because of it, not as a conflicting edit. If
+        `notion_wins` is set, existing pages only get the values the sheet
+        computes itself: those of cells holding a formula in `formulas` (the
+        sheet's formulas, in the shape of `data`). The other cells hold
+        Notion's values as displayed in the sheet, so they are not sent back.
+
+        With `properties_to_write`, only those properties are compared and sent.
+        Without `create_pages`, rows that match no page are left alone. So are
+        `stale_rows`, offsets into `data` of rows that Notion's values could not
+        be written to earlier in the run; they keep their saved state.
+
+        Returns:
+            dict: Counts of 'updated', 'created', 'skipped' and 'failed' pages, of
+                  'unchanged' rows (skipped by their state), rows 'changed' per side
+                  ('notion' and 'sheet') and 'conflicts' (rows changed on both
+                  sides), the per-row 'results' from the write executor, and the
+                  new 'row_state' if one was given.
         """
-        if not data or len(data) < 2: return
+        if not data or len(data) < 2: return None
 
         headers, data_rows = data[0], data[1:]
-        
-        all_existing_pages = self.client.databases.query(database_id=database_id)['results']
+        schema = _as_schema(notion_properties)
+
+        # Sheet columns that map to writable properties, with their encoders.
+        columns = schema.encoders(headers)
+        if properties_to_write is not None:
+            columns = [column for column in columns if column[1] in properties_to_write]
+        # Pages are only matched and compared on these properties, so the index needs no others.
+        needed = {target for _, target, _ in columns}
+        if headers[0] in schema.properties:
+            needed.add(headers[0])
+        if page_index is None:
+            page_index = NotionPageIndex(database_id)
+        if not page_index.covers(needed):
+            self.build_page_index(database_id, page_index, needed, schema.properties)
 
         # Decide which mapping to use: ID-based or Title-based
         try:
             id_column_index = headers.index('ID')
-            id_to_page = {p['id']: p for p in all_existing_pages}
-            print("Using 'ID' column for updates.")
+            id_to_page = page_index.id_to_page()
+            log("Using 'ID' column for updates.")
         except ValueError:
             id_column_index = -1
             title_property_name = headers[0]
-            title_to_page = {
-                p['properties'][title_property_name]['title'][0]['text']['content']: p
-                for p in all_existing_pages if p['properties'].get(title_property_name, {}).get('title')
-            }
-            print("No 'ID' column found. Using title for upserts.")
+            title_to_page = page_index.title_to_page(title_property_name)
+            log("No 'ID' column found. Using title for upserts.")
 
-        for row_data in reversed(data_rows):
+        # Rows are matched to pages up front, in order, so the outcome does not
+        # depend on the order in which the concurrent writes complete.
+        updates, creates = [], []
+        skipped = unchanged = conflicts = 0
+        changed = {'notion': 0, 'sheet': 0}
+        new_state = {}
+        # Row 1 of the range is the header row.
+        for row_number, row_data in reversed(list(enumerate(data_rows, start=2))):
             if not row_data or not row_data[0]: continue
-
-            new_properties = {}
-            page_id_to_update = None
+            if row_state is not None:
+                sheet_hash = row_hash([row_data[i] if i < len(row_data) else "" for i, _, _ in columns])
 
             # Build the properties object from the sheet data
-            for i, header in enumerate(headers):
-                target_header = header.removesuffix(" [replace]") if header.endswith(" [replace]") else header
-
-                if target_header not in notion_properties or target_header == 'ID': continue
-                
-                value = row_data[i] if i < len(row_data) else ""
-                prop_type = notion_properties[target_header]['type']
-                prop_value = None
-
-                if prop_type == 'title':
-                    prop_value = {'title': [{'text': {'content': str(value)}}]}
-                elif prop_type == 'number':
-                    try:
-                        num_format = notion_properties[target_header]['number']['format']
-                        cleaned_value = str(value).strip()
-                        
-                        if num_format in ['dollar', 'euro']:
-                            cleaned_value = cleaned_value.replace('$', '').replace('€', '').replace(',', '')
-                        elif num_format == 'percent':
-                            cleaned_value = cleaned_value.replace('%', '')
-                        else: # number, number_with_commas
-                            cleaned_value = cleaned_value.replace(',', '')
-
-                        num = float(cleaned_value)
-
-                        if num_format == 'percent':
-                            num /= 100.0
-
-                        prop_value = {'number': num}
-                    except (ValueError, TypeError, KeyError):
-                        pass
-                elif prop_type == 'rich_text':
-                    prop_value = {'rich_text': [{'text': {'content': str(value)}}]}
-                elif prop_type == 'select':
-                    if value in [opt['name'] for opt in notion_properties[target_header]['select']['options']]:
-                        prop_value = {'select': {'name': str(value)}}
-                elif prop_type == 'multi_select':
-                    values = [v.strip() for v in str(value).split(',') if v.strip()]
-                    prop_value = {'multi_select': [{'name': v} for v in values]} if values else {'multi_select': []}
-                elif prop_type == 'checkbox':
-                    if str(value).upper() == 'TRUE': prop_value = {'checkbox': True}
-                    elif str(value).upper() == 'FALSE': prop_value = {'checkbox': False}
-
+            new_properties = {}
+            for i, target_header, encode in columns:
+                prop_value = encode(row_data[i] if i < len(row_data) else "")
                 if prop_value is not None:
                     new_properties[target_header] = prop_value
 
@@ -238,14 +607,96 @@ class NotionClientWrapper:
                 if title_value in title_to_page:
                     existing_page = title_to_page[title_value]
 
+            if stale_rows and row_number - 1 in stale_rows:
+                # The row still shows old values, which must neither be written nor recorded.
+                if existing_page and row_state is not None and existing_page['id'] in row_state:
+                    new_state[existing_page['id']] = row_state[existing_page['id']]
+                skipped += 1
+                continue
+
             if existing_page:
-                if self._are_properties_different(new_properties, existing_page['properties'], notion_properties):
-                    print(f"Updating page: {existing_page['id']}")
-                    self.client.pages.update(page_id=existing_page['id'], properties=new_properties)
+                page_id = existing_page['id']
+                if row_state is not None:
+                    current = (sheet_hash, self._values_hash(existing_page['properties'], columns, schema))
+                    previous = row_state.get(page_id)
+                    if current == previous:
+                        new_state[page_id] = current
+                        unchanged += 1
+                        continue
+                    notion_changed = previous is None or previous[1] != current[1]
+                    if previous is not None:
+                        if notion_changed and (notion_first or previous[0] == current[0]):
+                            changed['notion'] += 1
+                        elif notion_changed:
+                            conflicts += 1
+                        else:
+                            changed['sheet'] += 1
+                if notion_wins:
+                    formula_row = formulas[row_number - 1] if formulas and row_number - 1 < len(formulas) else []
+                    computed = {
+                        target for i, target, _ in columns
+                        if i < len(formula_row) and isinstance(formula_row[i], str) and formula_row[i].startswith('=')
+                    }
+                    new_properties = {name: value for name, value in new_properties.items() if name in computed}
+                if self._are_properties_different(new_properties, existing_page['properties'], schema.comparators):
+                    update = {'row': row_number, 'action': 'update', 'page_id': page_id, 'properties': new_properties}
+                    if row_state is not None:
+                        update['state'] = (sheet_hash, self._values_hash({**existing_page['properties'], **new_properties}, columns, schema))
+                        update['previous_state'] = row_state.get(page_id)
+                    updates.append(update)
                 else:
-                    print(f"Skipping unchanged page: {existing_page['id']}")
+                    if row_state is not None:
+                        new_state[page_id] = current
+                    skipped += 1
             else:
                 # Only create if we are in title-matching mode and the title is not empty
-                if id_column_index == -1 and row_data[0]:
-                    print(f"Creating new page: {row_data[0]}")
-                    self.client.pages.create(parent={'database_id': database_id}, properties=new_properties)
+                if create_pages and id_column_index == -1 and row_data[0]:
+                    create = {'row': row_number, 'action': 'create', 'title': row_data[0], 'properties': new_properties}
+                    if row_state is not None:
+                        create['state'] = (sheet_hash, self._values_hash(new_properties, columns, schema))
+                    creates.append(create)
+
+        if row_state is not None:
+            log(f"Since the last sync: {unchanged} rows unchanged, {changed['notion']} changed in Notion, {changed['sheet']} changed in the sheet.")
+            if conflicts:
+                log(f"{conflicts} rows changed in both Notion and the sheet. Keeping the values from {'Notion' if notion_wins else 'the sheet'}.")
+        log(f"Updating {len(updates)} pages, creating {len(creates)} pages, skipping {skipped + unchanged} unchanged pages.")
+        results = self.write_executor.execute(updates, self._write_page)
+        # Creates go out one at a time so new pages keep the sheet's row order in Notion.
+        results += self.write_executor.execute(creates, lambda op: self._write_page(op, database_id), ordered=True)
+
+        if row_state is not None:
+            for operation, result in zip(updates + creates, results):
+                if not result['error']:
+                    new_state[result['page_id']] = operation['state']
+                elif operation.get('previous_state') is not None:
+                    # Keep the old state, so the row still counts as changed next time.
+                    new_state[result['page_id']] = operation['previous_state']
+                else:
+                    new_state.pop(result['page_id'], None)
+
+        failures = [r for r in results if r['error']]
+        if failures:
+            # A rejected write may mean the schema changed under us.
+            self.schema_cache.invalidate(database_id)
+        for failure in failures:
+            log(f"Failed to {failure['action']} page for row {failure['row']}: {failure['error']}")
+        return {
+            'updated': sum(1 for r in results if r['action'] == 'update' and not r['error']),
+            'created': sum(1 for r in results if r['action'] == 'create' and not r['error']),
+            'skipped': skipped + unchanged,
+            'failed': len(failures),
+            'unchanged': unchanged,
+            'changed': changed,
+            'conflicts': conflicts,
+            'results': results,
+            'row_state': new_state if row_state is not None else None
+        }
+
+    def _write_page(self, operation, database_id=None):
+        """Sends a single update or create operation built by notion_upsert."""
+        if operation['action'] == 'update':
+            log(f"Updating page: {operation['page_id']}")
+            return self.client.pages.update(page_id=operation['page_id'], properties=operation['properties'])
+        log(f"Creating new page: {operation['title']}")
+        return self.client.pages.create(parent={'database_id': database_id}, properties=operation['properties'])
@@ -0,0 +1,296 @@
+# notion_codecs.py
+# Per-type functions that turn Notion property values into sheet cells and back.
+# They are looked up once per column when a schema is compiled (see
+# NotionSchema.extractors and NotionSchema.encoders), so the per-row loops only
+# call them instead of branching on the property type for every cell.
+
+# --- Notion -> Sheet ---------------------------------------------------------
+# Each extractor takes the (non-empty) value stored under the property's type
+# key, the whole property object and a `resolve_title(page_id)` callable for
+# relations, and returns the cell content.
+
+def _extract_text(value, prop_data, resolve_title):
+    return value[0]['text']['content']
+
+def _extract_plain(value, prop_data, resolve_title):
+    return value
+
+def _extract_select(value, prop_data, resolve_title):
+    return value['name']
+
+def _extract_multi_select(value, prop_data, resolve_title):
+    return ', '.join([opt['name'] for opt in value])
+
+def _extract_formula(value, prop_data, resolve_title):
+    result_type = value.get('type')
+    if result_type == 'number':
+        return value.get('number') if value.get('number') is not None else '[Null Number]'
+    if result_type == 'string' and value.get('string') is not None:
+        return value['string']
+    if result_type == 'boolean' and value.get('boolean') is not None:
+        return value['boolean']
+    if result_type == 'date' and value.get('date'):
+        return value['date']['start']
+    if result_type == 'error':
+        return f"[Formula Error: {value.get('error')}]"
+    return "[Unsupported Formula Result]"
+
+def _extract_rollup(value, prop_data, resolve_title):
+    result_type = value.get('type')
+    if result_type == 'number':
+        return value.get('number') if value.get('number') is not None else '[Null Number]'
+    if result_type == 'string' and value.get('string') is not None:
+        return value['string']
+    if result_type == 'date' and value.get('date'):
+        return value['date']['start']
+    if result_type == 'array':
+        return "[Rollup Array]"
+    return "[Unsupported Rollup Result]"
+
+def _extract_relation(value, prop_data, resolve_title):
+    related_page_titles = []
+    for item in value:
+        title = resolve_title(item.get('id'))
+        if title:
+            related_page_titles.append(title)
+    return ', '.join(related_page_titles)
+
+def _extract_unsupported(value, prop_data, resolve_title):
+    return ""
+
+EXTRACTORS = {
+    'title': _extract_text,
+    'rich_text': _extract_text,
+    'number': _extract_plain,
+    'checkbox': _extract_plain,
+    'select': _extract_select,
+    'multi_select': _extract_multi_select,
+    'formula': _extract_formula,
+    'rollup': _extract_rollup,
+    'relation': _extract_relation,
+}
+
+def _extract_any(prop_data, resolve_title):
+    """Extracts a property by looking up its type, for values that do not match the schema."""
+    if not prop_data:
+        return ""
+    prop_type = prop_data.get('type')
+    value = prop_data.get(prop_type) if prop_type else None
+    if not value:
+        return ""
+    return EXTRACTORS.get(prop_type, _extract_unsupported)(value, prop_data, resolve_title)
+
+def _extract_page_id(properties, page, resolve_title):
+    return page['id']
+
+def compile_extractor(prop_name, prop_type):
+    """
+    Returns an `extract(properties, page, resolve_title)` function for one
+    column, where `properties` is `page['properties']`. Empty values become "".
+    A page whose property has a different type than the schema (e.g. the
+    schema changed mid-run) falls back to a lookup by type.
+    """
+    if prop_name == 'ID':
+        return _extract_page_id
+
+    # The most common types are handled inline, so a cell costs a single call.
+    if prop_type in ('title', 'rich_text'):
+        def extract(properties, page, resolve_title):
+            prop_data = properties.get(prop_name)
+            if prop_data and prop_data.get('type') == prop_type:
+                value = prop_data[prop_type]
+                return value[0]['text']['content'] if value else ""
+            return _extract_any(prop_data, resolve_title)
+    elif prop_type in ('number', 'checkbox'):
+        def extract(properties, page, resolve_title):
+            prop_data = properties.get(prop_name)
+            if prop_data and prop_data.get('type') == prop_type:
+                # Like any other empty value, 0 and False become "".
+                return prop_data[prop_type] or ""
+            return _extract_any(prop_data, resolve_title)
+    elif prop_type == 'select':
+        def extract(properties, page, resolve_title):
+            prop_data = properties.get(prop_name)
+            if prop_data and prop_data.get('type') == 'select':
+                value = prop_data['select']
+                return value['name'] if value else ""
+            return _extract_any(prop_data, resolve_title)
+    else:
+        extract_value = EXTRACTORS.get(prop_type, _extract_unsupported)
+
+        def extract(properties, page, resolve_title):
+            prop_data = properties.get(prop_name)
+            if prop_data and prop_data.get('type') == prop_type:
+                value = prop_data[prop_type]
+                return extract_value(value, prop_data, resolve_title) if value else ""
+            return _extract_any(prop_data, resolve_title)
+
+    return extract
+
+def extract_rows(extractors, pages, resolve_title):
+    """Turns pages into rows of cell values with compiled column extractors."""
+    rows = []
+    for page in pages:
+        properties = page['properties']
+        rows.append([extract(properties, page, resolve_title) for extract in extractors])
+    return rows
+
+# --- Sheet -> Notion ---------------------------------------------------------
+# Each encoder takes a cell value and returns the property value to send to
+# Notion, or None if the cell cannot be written to that property.
+
+def _encode_title(value):
+    return {'title': [{'text': {'content': str(value)}}]}
+
+def _encode_rich_text(value):
+    return {'rich_text': [{'text': {'content': str(value)}}]}
+
+def _encode_multi_select(value):
+    values = [v.strip() for v in str(value).split(',') if v.strip()]
+    return {'multi_select': [{'name': v} for v in values]} if values else {'multi_select': []}
+
+def _encode_checkbox(value):
+    text = str(value).upper()
+    if text == 'TRUE':
+        return {'checkbox': True}
+    if text == 'FALSE':
+        return {'checkbox': False}
+    return None
+
+def _make_number_encoder(prop):
+    try:
+        num_format = prop['number']['format']
+    except (KeyError, TypeError):
+        # Without a format in the schema the value cannot be interpreted.
+        return lambda value: None
+
+    if num_format in ('dollar', 'euro'):
+        def clean(text):
+            return text.replace('$', '').replace('€', '').replace(',', '')
+    elif num_format == 'percent':
+        def clean(text):
+            return text.replace('%', '')
+    else: # number, number_with_commas
+        def clean(text):
+            return text.replace(',', '')
+    scale = 100.0 if num_format == 'percent' else None
+
+    def encode(value):
+        try:
+            num = float(clean(str(value).strip()))
+        except (ValueError, TypeError):
+            return None
+        if scale is not None:
+            num /= scale
+        return {'number': num}
+
+    return encode
+
+def _make_select_encoder(options):
+    def encode(value):
+        if value in options:
+            return {'select': {'name': str(value)}}
+        return None
+    return encode
+
+def compile_encoder(prop, select_options=None):
+    """
+    Returns an `encode(value)` function for a property, or None if sheet
+    values are never written to properties of its type.
+
+    Args:
+        prop (dict): The property's schema.
+        select_options (frozenset): Valid option names, for select properties.
+    """
+    prop_type = prop['type']
+    if prop_type == 'title':
+        return _encode_title
+    if prop_type == 'rich_text':
+        return _encode_rich_text
+    if prop_type == 'number':
+        return _make_number_encoder(prop)
+    if prop_type == 'select':
+        return _make_select_encoder(select_options or frozenset())
+    if prop_type == 'multi_select':
+        return _encode_multi_select
+    if prop_type == 'checkbox':
+        return _encode_checkbox
+    return None
+
+# --- Change detection --------------------------------------------------------
+# Each comparator takes an encoded value and the page's current property and
+# returns True if writing the value would change the page.
+
+def _text_differs(prop_type):
+    def differs(new_value_obj, existing_value_obj):
+        new_text = new_value_obj[prop_type][0]['text']['content']
+        old_text = existing_value_obj[prop_type][0]['text']['content'] if existing_value_obj[prop_type] else ""
+        return new_text != old_text
+    return differs
+
+def _value_differs(prop_type):
+    def differs(new_value_obj, existing_value_obj):
+        return new_value_obj[prop_type] != existing_value_obj[prop_type]
+    return differs
+
+def _select_differs(new_value_obj, existing_value_obj):
+    old_option = existing_value_obj['select']
+    return new_value_obj['select']['name'] != (old_option['name'] if old_option else None)
+
+def _multi_select_differs(new_value_obj, existing_value_obj):
+    new_options = {opt['name'] for opt in new_value_obj['multi_select']}
+    old_options = {opt['name'] for opt in existing_value_obj['multi_select']}
+    return new_options != old_options
+
+def _never_differs(new_value_obj, existing_value_obj):
+    return False
+
+COMPARATORS = {
+    'title': _text_differs('title'),
+    'rich_text': _text_differs('rich_text'),
+    'number': _value_differs('number'),
+    'checkbox': _value_differs('checkbox'),
+    'select': _select_differs,
+    'multi_select': _multi_select_differs,
+}
+
+def compile_comparator(prop_type):
+    return COMPARATORS.get(prop_type, _never_differs)
+
+# --- Canonical values --------------------------------------------------------
+# Each canonicalizer reduces a page's property, or an encoded value, to the
+# part the comparators look at, so the two can be hashed alike. A missing
+# property reads the same as an empty one.
+
+def _canonical_text(prop_type):
+    def canonical(value_obj):
+        items = value_obj.get(prop_type) if value_obj else None
+        return items[0]['text']['content'] if items else ""
+    return canonical
+
+def _canonical_value(prop_type):
+    def canonical(value_obj):
+        return value_obj.get(prop_type) if value_obj else None
+    return canonical
+
+def _canonical_select(value_obj):
+    option = value_obj.get('select') if value_obj else None
+    return option['name'] if option else None
+
+def _canonical_multi_select(value_obj):
+    return sorted(opt['name'] for opt in value_obj.get('multi_select') or []) if value_obj else []
+
+def _canonical_none(value_obj):
+    return None
+
+CANONICALIZERS = {
+    'title': _canonical_text('title'),
+    'rich_text': _canonical_text('rich_text'),
+    'number': _canonical_value('number'),
+    'checkbox': _canonical_value('checkbox'),
+    'select': _canonical_select,
+    'multi_select': _canonical_multi_select,
+}
+
+def compile_canonicalizer(prop_type):
+    return CANONICALIZERS.get(prop_type, _canonical_none)
@@ -0,0 +1,51 @@
+# notion_page_index.py
+
+class NotionPageIndex:
+    """
+    Holds the existing pages of a Notion database for one sync run, with lookups
+    by page ID and by title. It is filled either by the Notion -> Sheet step,
+    which has already read every page, or on demand by `notion_upsert`.
+    """
+    def __init__(self, database_id):
+        self.database_id = database_id
+        self.complete = False
+        # The properties the pages were read with, or None if they have all of them.
+        self.property_names = None
+        self._pages = []
+        self._id_to_page = None
+        self._title_to_page = {}
+
+    def set_pages(self, pages, property_names=None):
+        """
+        Replaces the indexed pages with a complete listing of the database,
+        in the order Notion returned them. `property_names` lists the only
+        properties the pages were read with, if they were read with a projection.
+        """
+        self._pages = list(pages)
+        self.property_names = frozenset(property_names) if property_names is not None else None
+        self._id_to_page = None
+        self._title_to_page = {}
+        self.complete = True
+
+    def covers(self, property_names):
+        """Returns True if the index is complete and its pages have all the given properties."""
+        return self.complete and (self.property_names is None or self.property_names.issuperset(property_names))
+
+    @property
+    def pages(self):
+        return self._pages
+
+    def id_to_page(self):
+        """Returns a page ID -> page mapping, built once."""
+        if self._id_to_page is None:
+            self._id_to_page = {p['id']: p for p in self._pages}
+        return self._id_to_page
+
+    def title_to_page(self, title_property_name):
+        """Returns a title -> page mapping for the given title property, built once per property."""
+        if title_property_name not in self._title_to_page:
+            self._title_to_page[title_property_name] = {
+                p['properties'][title_property_name]['title'][0]['text']['content']: p
+                for p in self._pages if p['properties'].get(title_property_name, {}).get('title')
+            }
+        return self._title_to_page[title_property_name]
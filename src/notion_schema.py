@@ -0,0 +1,106 @@
+# notion_schema.py
+import time
+import threading
+from notion_codecs import compile_extractor, compile_encoder, compile_comparator, compile_canonicalizer
+
+class NotionSchema:
+    """
+    The properties (schema) of a Notion database, together with structures
+    derived from them that are computed once per schema version.
+    """
+    def __init__(self, properties, last_edited_time=None):
+        self.properties = properties
+        self.last_edited_time = last_edited_time
+        self.title_property = next((name for name, prop in properties.items() if prop['type'] == 'title'), None)
+        # Property name -> set of valid option names, for validating sheet values.
+        self.select_options = {
+            name: frozenset(opt['name'] for opt in prop['select']['options'])
+            for name, prop in properties.items() if prop['type'] == 'select'
+        }
+        # Property name -> comparator telling whether a new value changes a page.
+        self.comparators = {name: compile_comparator(prop['type']) for name, prop in properties.items()}
+        # Property name -> function reducing a property to the value the comparator sees.
+        self.canonicalizers = {name: compile_canonicalizer(prop['type']) for name, prop in properties.items()}
+        # Compiled columns, keyed by the tuple of headers they were compiled for.
+        self._extractors = {}
+        self._encoders = {}
+
+    def extractors(self, headers):
+        """
+        Returns one column extractor per header, for turning pages into sheet
+        rows with `notion_codecs.extract_rows`.
+        """
+        key = tuple(headers)
+        if key not in self._extractors:
+            self._extractors[key] = [
+                compile_extractor(name, self.properties.get(name, {}).get('type')) for name in headers
+            ]
+        return self._extractors[key]
+
+    def encoders(self, headers):
+        """
+        Returns (column index, property name, encode) entries for the sheet
+        headers that map to writable properties, for turning sheet rows into
+        page properties. A ' [replace]' suffix on a header is ignored, and the
+        'ID' column is never written.
+        """
+        key = tuple(headers)
+        if key not in self._encoders:
+            columns = []
+            for i, header in enumerate(headers):
+                target_header = header.removesuffix(" [replace]")
+                if target_header not in self.properties or target_header == 'ID':
+                    continue
+                encode = compile_encoder(self.properties[target_header], self.select_options.get(target_header))
+                if encode is not None:
+                    columns.append((i, target_header, encode))
+            self._encoders[key] = columns
+        return self._encoders[key]
+
+class SchemaCache:
+    """
+    Caches database schemas by database ID.
+
+    With a `ttl` in seconds, an entry is trusted for that long. Without one, an
+    entry is trusted until `expire_all` is called, which the syncer does at the
+    start of every scheduler tick. An expired entry is fetched again, but the
+    existing NotionSchema object is kept if the database's `last_edited_time`
+    has not changed, so its derived structures are not rebuilt.
+    """
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        # database_id -> [NotionSchema, fetched_at, expired]
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, database_id, fetch):
+        """
+        Returns the schema of a database, calling `fetch(database_id)` for the
+        `databases.retrieve` response if the cached entry is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(database_id)
+            if entry is not None and not entry[2] and (self.ttl is None or time.time() - entry[1] < self.ttl):
+                return entry[0]
+
+        response = fetch(database_id)
+        last_edited_time = response.get('last_edited_time')
+        with self._lock:
+            entry = self._entries.get(database_id)
+            if entry is not None and last_edited_time is not None and entry[0].last_edited_time == last_edited_time:
+                schema = entry[0]
+            else:
+                schema = NotionSchema(response['properties'], last_edited_time)
+            self._entries[database_id] = [schema, time.time(), False]
+            return schema
+
+    def expire_all(self):
+        """Marks every entry as expired, so each schema is checked again on next use."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry[2] = True
+
+    def invalidate(self, database_id):
+        """Drops a database's schema, e.g. after a write was rejected."""
+        with self._lock:
+            self._entries.pop(database_id, None)
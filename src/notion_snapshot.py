@@ -0,0 +1,90 @@
+# notion_snapshot.py
+import os
+import json
+import time
+import hashlib
+import logging
+
+class NotionSnapshotStore:
+    """
+    Stores the rows extracted from a Notion database on disk, so later runs can
+    fetch only the pages edited since the last sync and merge them in.
+
+    A snapshot is kept per database and set of headers. It is only reused if
+    the headers and their property types are unchanged, and a full rescan is
+    requested once it is older than `full_rescan_interval` seconds, which is
+    how deleted pages and stale formula/rollup values get picked up.
+    """
+    def __init__(self, snapshot_dir='notion_snapshots', full_rescan_interval=86400):
+        self.snapshot_dir = snapshot_dir
+        self.full_rescan_interval = full_rescan_interval
+
+    def _schema_key(self, expected_headers, notion_properties):
+        columns = [[h, notion_properties.get(h, {}).get('type')] for h in expected_headers]
+        return hashlib.sha1(json.dumps(columns).encode('utf-8')).hexdigest()
+
+    def _path(self, database_id, schema_key):
+        return os.path.join(self.snapshot_dir, f"{database_id}-{schema_key[:8]}.json")
+
+    def load(self, database_id, expected_headers, notion_properties):
+        """
+        Returns the stored snapshot for this database and headers, or None if
+        there is none, it was taken with a different schema, or it is due for
+        a full rescan.
+        """
+        schema_key = self._schema_key(expected_headers, notion_properties)
+        path = self._path(database_id, schema_key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Could not load Notion snapshot {path}: {e}")
+            return None
+
+        if snapshot.get('schema_key') != schema_key:
+            return None
+        if self.full_rescan_interval is not None and time.time() - snapshot['full_scan_at'] > self.full_rescan_interval:
+            return None
+        return snapshot
+
+    def save(self, database_id, expected_headers, notion_properties, rows, synced_at, full_scan_at):
+        """
+        Writes a snapshot.
+
+        Args:
+            rows (list): [page_id, last_edited_time, row, properties] entries in sheet order,
+                where `properties` are the page's writable properties as Notion returned them.
+            synced_at (str): ISO timestamp taken just before the pages were queried.
+            full_scan_at (float): Epoch time of the last full scan.
+        """
+        schema_key = self._schema_key(expected_headers, notion_properties)
+        path = self._path(database_id, schema_key)
+        snapshot = {
+            'schema_key': schema_key,
+            'synced_at': synced_at,
+            'full_scan_at': full_scan_at,
+            'rows': rows
+        }
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not save Notion snapshot {path}: {e}")
+
+    def invalidate(self, database_id):
+        """
+        Deletes all snapshots of a database, forcing a full rescan on its next sync.
+        """
+        if not os.path.isdir(self.snapshot_dir):
+            return
+        for name in os.listdir(self.snapshot_dir):
+            if name.startswith(f"{database_id}-"):
+                try:
+                    os.remove(os.path.join(self.snapshot_dir, name))
+                except OSError as e:
+                    logging.warning(f"Could not delete Notion snapshot {name}: {e}")
@@ -0,0 +1,50 @@
+# notion_write_executor.py
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+class NotionWriteExecutor:
+    """
+    Sends Notion page writes from a pool of worker threads. The client's
+    quota governor keeps them within Notion's rate limit.
+    """
+    def __init__(self, max_workers=3):
+        self.max_workers = max(1, max_workers)
+
+    def _run(self, operation, write):
+        result = {'row': operation['row'], 'action': operation['action'], 'page_id': operation.get('page_id'), 'error': None}
+        try:
+            response = write(operation)
+            if result['page_id'] is None and isinstance(response, dict):
+                result['page_id'] = response.get('id')
+        except Exception as e:
+            logging.error(f"Failed to {operation['action']} Notion page for row {operation['row']}: {e}")
+            result['error'] = str(e)
+        return result
+
+    def execute(self, operations, write, ordered=False):
+        """
+        Runs `write(operation)` for every operation. A failed write is recorded
+        in its result and does not stop the others.
+
+        Args:
+            operations (list): Dicts with at least 'row' and 'action' keys.
+            write (callable): Performs one write and returns the API response.
+            ordered (bool): If True, the writes are sent one at a time in order.
+
+        Returns:
+            list: One result dict per operation, in the same order, with 'row',
+                  'action', 'page_id' and 'error' (None on success) keys.
+        """
+        if ordered or self.max_workers == 1 or len(operations) < 2:
+            return [self._run(op, write) for op in operations]
+
+        # Worker threads log, and draw quota, as the job that submitted the writes.
+        # A context can only be entered by one thread at a time, so each write gets a copy.
+        context = contextvars.copy_context()
+
+        def run(op):
+            return context.copy().run(self._run, op, write)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='notion-write') as pool:
+            return list(pool.map(run, operations))
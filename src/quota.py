@@ -0,0 +1,97 @@
+# quota.py
+import contextvars
+from contextlib import contextmanager
+from rate_limiter import PriorityTokenBucket
+from metrics import QUOTA_UTILIZATION, QUOTA_WAITING, record_quota_grant, record_sleep
+
+# Jobs in a lower-numbered class get quota first when requests are waiting.
+PRIORITY_CLASSES = {'scheduled': 0, 'backfill': 1}
+DEFAULT_PRIORITY = 'scheduled'
+
+# Like the current job, the priority follows a job's work onto other threads
+# only where it is explicitly carried over (see NotionWriteExecutor).
+_current_priority = contextvars.ContextVar('quota_priority', default=DEFAULT_PRIORITY)
+
+def current_priority():
+    return _current_priority.get()
+
+@contextmanager
+def priority_scope(priority):
+    """Draws quota for requests made in the block at `priority`, a key of PRIORITY_CLASSES."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+class QuotaGovernor:
+    """
+    One request budget per API for the whole process, shared by every job.
+    Each API has a 'read' and a 'write' bucket, and optionally an 'all'
+    bucket that both draw from, for limits that count every request.
+
+    Args:
+        limits (dict): (api, kind) -> (requests per second, burst), where kind
+                       is 'read', 'write' or 'all'.
+    """
+    def __init__(self, limits):
+        self.buckets = {key: PriorityTokenBucket(rate, burst) for key, (rate, burst) in limits.items()}
+
+    @classmethod
+    def from_config(cls, config):
+        notion_rate = config.get('NOTION_REQUESTS_PER_SECOND', 3)
+        notion_burst = config.get('NOTION_BURST', 10)
+        sheets_burst = config.get('SHEETS_BURST', 10)
+        return cls({
+            ('notion', 'all'): (notion_rate, notion_burst),
+            ('notion', 'read'): (config.get('NOTION_READS_PER_SECOND', notion_rate), notion_burst),
+            ('notion', 'write'): (config.get('NOTION_WRITES_PER_SECOND', notion_rate), notion_burst),
+            ('sheets', 'read'): (config.get('SHEETS_READS_PER_MINUTE', 60) / 60.0, sheets_burst),
+            ('sheets', 'write'): (config.get('SHEETS_WRITES_PER_MINUTE', 60) / 60.0, sheets_burst),
+        })
+
+    def _buckets(self, api, kind):
+        return [self.buckets[key] for key in ((api, kind), (api, 'all')) if key in self.buckets]
+
+    def acquire(self, api, kind, tokens=1):
+        """
+        Blocks until the current job's priority class may send `tokens`
+        requests of `kind` ('read' or 'write') to `api`.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        priority = current_priority()
+        waited = sum(bucket.acquire(tokens, PRIORITY_CLASSES[priority]) for bucket in self._buckets(api, kind))
+        record_quota_grant(api, kind, priority)
+        record_sleep('quota', waited)
+        return waited
+
+    async def acquire_async(self, api, kind, tokens=1):
+        """Like `acquire`, but waits without blocking the event loop."""
+        priority = current_priority()
+        waited = 0.0
+        for bucket in self._buckets(api, kind):
+            waited += await bucket.acquire_async(tokens, PRIORITY_CLASSES[priority])
+        record_quota_grant(api, kind, priority)
+        record_sleep('quota', waited)
+        return waited
+
+    def utilization(self):
+        """Returns {(api, kind): share of the bucket's burst in use}."""
+        return {key: bucket.utilization() for key, bucket in self.buckets.items()}
+
+    def waiting(self):
+        """Returns {(api, kind, priority class): number of requests waiting}."""
+        names = {number: name for name, number in PRIORITY_CLASSES.items()}
+        counts = {}
+        for (api, kind), bucket in self.buckets.items():
+            for priority, count in bucket.waiting().items():
+                counts[(api, kind, names.get(priority, str(priority)))] = count
+        return counts
+
+    def export_metrics(self):
+        """Reports this governor's utilization and queues under the `sync_quota_*` gauges."""
+        QUOTA_UTILIZATION.set_function(self.utilization)
+        QUOTA_WAITING.set_function(self.waiting)
+        return self
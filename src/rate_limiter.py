@@ -0,0 +1,162 @@
+# rate_limiter.py
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens are added at `rate` per second up to
+    `capacity`, so short bursts are allowed while the average rate is capped.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes tokens if they are available right now.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds to wait before retrying.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until the tokens are available and takes them.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens=1):
+        """
+        Like `acquire`, but waits with asyncio.sleep so other coroutines keep running.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0.0:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+class PriorityTokenBucket(TokenBucket):
+    """
+    A token bucket that serves waiting callers in priority order (lower
+    numbers first, first come first served within a priority), so a burst
+    of low-priority requests cannot starve higher-priority ones.
+    """
+    # Waiters re-check at least this often, so a newly arrived higher-priority
+    # caller is served before those already asleep.
+    MAX_POLL_SECONDS = 0.5
+
+    def __init__(self, rate, capacity=None):
+        super().__init__(rate, capacity)
+        self._queue = []
+        self._seq = itertools.count()
+
+    def _take_or_wait(self, ticket):
+        """Takes the ticket's tokens if it is first in line and they are available; otherwise returns the seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            priority, seq, tokens = ticket
+            if self._queue[0] == ticket and self._tokens >= tokens:
+                heapq.heappop(self._queue)
+                self._tokens -= tokens
+                return 0.0
+            ahead = sum(entry[2] for entry in self._queue if entry <= ticket)
+            return min(self.MAX_POLL_SECONDS, max(0.001, (ahead - self._tokens) / self.rate))
+
+    def _enqueue(self, tokens, priority):
+        """Takes the tokens at once if nobody is waiting, otherwise returns a place in line."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if not self._queue and self._tokens >= tokens:
+                self._tokens -= tokens
+                return None
+            ticket = (priority, next(self._seq), tokens)
+            heapq.heappush(self._queue, ticket)
+            return ticket
+
+    def _leave(self, ticket):
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+                heapq.heapify(self._queue)
+
+    def acquire(self, tokens=1, priority=0):
+        """
+        Blocks until the tokens are available to this priority and takes them.
+
+        Returns:
+            float: The number of seconds spent waiting.
+        """
+        ticket = self._enqueue(tokens, priority)
+        if ticket is None:
+            return 0.0
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._take_or_wait(ticket)
+                if wait == 0.0:
+                    return time.monotonic() - start
+                time.sleep(wait)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    async def acquire_async(self, tokens=1, priority=0):
+        """Like `acquire`, but waits with asyncio.sleep so other coroutines keep running."""
+        ticket = self._enqueue(tokens, priority)
+        if ticket is None:
+            return 0.0
+        start = time.monotonic()
+        try:
+            while True:
+                wait = self._take_or_wait(ticket)
+                if wait == 0.0:
+                    return time.monotonic() - start
+                await asyncio.sleep(wait)
+        except BaseException:
+            self._leave(ticket)
+            raise
+
+    def utilization(self):
+        """Returns the share of the burst capacity currently used, from 0 to 1."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return 1.0 - self._tokens / self.capacity
+
+    def waiting(self):
+        """Returns {priority: number of callers waiting}."""
+        with self._lock:
+            counts = {}
+            for priority, _, _ in self._queue:
+                counts[priority] = counts.get(priority, 0) + 1
+            return counts
@@ -0,0 +1,54 @@
+# readiness.py
+import time
+import threading
+
+def wait_until_ready(probe, is_ready, timeout=10.0, initial_delay=0.25, max_delay=2.0, backoff=2.0):
+    """
+    Calls `probe()` until `is_ready(previous, current)` returns True, sleeping
+    with exponential backoff between attempts, or until `timeout` seconds pass.
+    `previous` is None on the first attempt.
+
+    Returns:
+        tuple: (last probe result, dict with 'ready', 'waited' seconds, 'slept'
+               seconds (the part of 'waited' spent sleeping) and 'attempts').
+    """
+    start = time.monotonic()
+    delay = initial_delay
+    previous = None
+    attempts = 0
+    slept = 0.0
+    while True:
+        current = probe()
+        attempts += 1
+        if is_ready(previous, current):
+            return current, {'ready': True, 'waited': time.monotonic() - start, 'slept': slept, 'attempts': attempts}
+
+        remaining = timeout - (time.monotonic() - start)
+        if remaining <= 0:
+            return current, {'ready': False, 'waited': time.monotonic() - start, 'slept': slept, 'attempts': attempts}
+        pause = min(delay, remaining)
+        time.sleep(pause)
+        slept += pause
+        delay = min(delay * backoff, max_delay)
+        previous = current
+
+class WaitMetrics:
+    """
+    Keeps running totals of readiness waits, per kind of wait.
+    """
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, result):
+        with self._lock:
+            totals = self._totals.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'timeouts': 0})
+            totals['count'] += 1
+            totals['total_seconds'] += result['waited']
+            totals['max_seconds'] = max(totals['max_seconds'], result['waited'])
+            if not result['ready']:
+                totals['timeouts'] += 1
+
+    def summary(self):
+        with self._lock:
+            return {name: dict(totals) for name, totals in self._totals.items()}
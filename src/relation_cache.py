@@ -0,0 +1,160 @@
+# relation_cache.py
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+class RelationTitleCache:
+    """
+    Caches the titles of related Notion pages, keyed by page ID.
+
+    Entries expire after `ttl` seconds, the least recently used entries are
+    evicted once `max_size` is reached, and an entry is dropped as soon as the
+    page's `last_edited_time` is seen to differ from the one it was stored with.
+    If `cache_file` is given, the cache is loaded from and saved to that JSON
+    file so it survives restarts.
+
+    A page's `last_edited_time` can only be compared when the page is read,
+    so entries also count as unverified after `expire_all` (called at the
+    start of every run) until they are stored or observed again.
+    """
+    def __init__(self, ttl=3600, max_size=10000, cache_file=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        # page_id -> [title, last_edited_time, stored_at]
+        self._entries = OrderedDict()
+        # Pages whose entry was stored or confirmed since the last expire_all.
+        self._verified = set()
+        self._lock = threading.Lock()
+        if self.cache_file:
+            self.load()
+
+    def _is_expired(self, entry, now):
+        return self.ttl is not None and now - entry[2] > self.ttl
+
+    def get(self, page_id, last_edited_time=None):
+        """
+        Returns the cached title for a page, or None on a miss.
+
+        If `last_edited_time` is given and differs from the stored one, the
+        entry is treated as stale and removed.
+        """
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is not None:
+                stale = last_edited_time is not None and entry[1] is not None and entry[1] != last_edited_time
+                if stale or self._is_expired(entry, time.time()):
+                    del self._entries[page_id]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(page_id)
+            self.hits += 1
+            return entry[0]
+
+    def contains(self, page_id):
+        """
+        Returns True if an unexpired entry exists for the page, without
+        affecting the hit/miss counters or the LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(page_id)
+            return entry is not None and not self._is_expired(entry, time.time())
+
+    def is_verified(self, page_id):
+        """Returns True if the page has an unexpired entry that was stored or confirmed since the last `expire_all`."""
+        with self._lock:
+            entry = self._entries.get(page_id)
+            return page_id in self._verified and entry is not None and not self._is_expired(entry, time.time())
+
+    def expire_all(self):
+        """Marks every entry as unverified, so its page is checked again before the entry is trusted."""
+        with self._lock:
+            self._verified.clear()
+
+    def set(self, page_id, title, last_edited_time=None):
+        """
+        Stores the title of a page, evicting the least recently used entries if needed.
+        """
+        with self._lock:
+            self._entries[page_id] = [title, last_edited_time, time.time()]
+            self._entries.move_to_end(page_id)
+            self._verified.add(page_id)
+            while self.max_size and len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                self._verified.discard(evicted)
+
+    def observe(self, page_id, last_edited_time):
+        """
+        Invalidates the entry for a page if it was stored with a different
+        `last_edited_time`. Call this for any page seen in an API response.
+        """
+        with self._lock:
+            entry = self._entries.get(page_id)
+            if entry is not None and entry[1] is not None and entry[1] != last_edited_time:
+                del self._entries[page_id]
+                self._verified.discard(page_id)
+            elif entry is not None:
+                self._verified.add(page_id)
+
+    def invalidate(self, page_id=None):
+        """
+        Removes a single entry, or clears the whole cache if no page ID is given.
+        """
+        with self._lock:
+            if page_id is None:
+                self._entries.clear()
+                self._verified.clear()
+            else:
+                self._entries.pop(page_id, None)
+                self._verified.discard(page_id)
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and current size of the cache.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def load(self):
+        """
+        Loads unexpired entries from the backing file, if it exists.
+        """
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                stored = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Could not load relation cache from {self.cache_file}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            for page_id, entry in stored.items():
+                if not self._is_expired(entry, now):
+                    self._entries[page_id] = entry
+            while self.max_size and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """
+        Writes the cache to the backing file. Does nothing if no file is configured.
+        """
+        if not self.cache_file:
+            return
+        with self._lock:
+            stored = dict(self._entries)
+        tmp_file = f"{self.cache_file}.tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(stored, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Could not save relation cache to {self.cache_file}: {e}")
@@ -0,0 +1,35 @@
+# resource_locks.py
+import threading
+from contextlib import contextmanager
+
+class ResourceLocks:
+    """
+    One lock per shared resource (a Notion database or a sheet range), created
+    on demand, so jobs touching the same resource run one at a time.
+    """
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    @contextmanager
+    def hold(self, keys):
+        """
+        Holds the locks for all `keys` while the block runs. Locks are always
+        taken in sorted order, so two callers can never deadlock each other.
+        """
+        locks = [self._lock_for(key) for key in sorted(set(keys))]
+        acquired = []
+        try:
+            for lock in locks:
+                lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
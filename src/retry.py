@@ -0,0 +1,272 @@
+# retry.py
+import re
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import httpx
+from job_context import log
+from metrics import record_retry, record_sleep
+
+# Status codes that mean the request was rejected because of load; the
+# request was not processed, so it is safe to send again whatever it does.
+THROTTLE_STATUSES = (429,)
+# Status codes worth retrying, but only for requests that can be repeated.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'PATCH')
+# POST endpoints that only read, or overwrite fixed cells with fixed values.
+IDEMPOTENT_POST_PATHS = (
+    re.compile(r'/databases/[^/]+/query$'),
+    re.compile(r'/values:batch(Get|Update|Clear)$'),
+)
+
+# POST endpoints that only read.
+READ_POST_PATHS = (
+    re.compile(r'/databases/[^/]+/query$'),
+    re.compile(r'/values:batchGet$'),
+)
+
+def request_kind(request):
+    """Returns 'read' or 'write', the quota bucket an httpx.Request draws from."""
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return 'read'
+    if request.method == 'POST' and any(p.search(request.url.path) for p in READ_POST_PATHS):
+        return 'read'
+    return 'write'
+
+def is_idempotent(request):
+    """Returns True if sending the httpx.Request twice has the same effect as sending it once."""
+    if request.method in IDEMPOTENT_METHODS:
+        return True
+    return request.method == 'POST' and any(p.search(request.url.path) for p in IDEMPOTENT_POST_PATHS)
+
+def parse_retry_after(value):
+    """Returns the seconds to wait from a Retry-After header (seconds or an HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """
+    How often and how long to wait before sending a failed request again.
+    Waits grow exponentially from `base_delay` up to `max_delay`, with full
+    jitter so clients that were throttled together do not retry together.
+    """
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Returns the seconds to wait after the given failed attempt (1 for the first).
+        A server's Retry-After is always waited out in full.
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            return retry_after + backoff * 0.1
+        return backoff
+
+class AdaptiveWindow:
+    """
+    Caps how many requests are in flight at once, and adjusts the cap AIMD
+    style: it grows by one for every window's worth of successful calls and
+    halves (at most once per `decrease_interval` seconds) when a call is
+    throttled. Threads and coroutines on any event loop can share one window.
+    """
+    def __init__(self, maximum=8, minimum=1, initial=None, decrease_interval=1.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(initial if initial is not None else self.maximum)
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _has_room(self):
+        return self.in_flight < int(self.limit)
+
+    def acquire(self):
+        """Blocks the calling thread until a slot is free and takes it."""
+        with self._lock:
+            if not self._waiters and self._has_room():
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event.set)
+        event.wait()
+
+    async def acquire_async(self):
+        """Like `acquire`, but waits without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if not self._waiters and self._has_room():
+                self.in_flight += 1
+                return
+            self._waiters.append(lambda: loop.call_soon_threadsafe(self._grant, future))
+        await future
+
+    def _grant(self, future):
+        if future.cancelled():
+            # The waiter gave up, so hand its slot to the next one.
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self, outcome=None):
+        """
+        Frees a slot. `outcome` is 'success' or 'throttled' to adjust the cap,
+        or None for a call that says nothing about the server's load.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == 'success':
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            elif outcome == 'throttled':
+                now = time.monotonic()
+                if now - self._last_decrease >= self.decrease_interval:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            wake = []
+            while self._waiters and self._has_room():
+                self.in_flight += 1
+                wake.append(self._waiters.popleft())
+        for notify in wake:
+            notify()
+
+class RetryLayer:
+    """
+    Sends httpx requests through an AdaptiveWindow and retries them by a
+    RetryPolicy: throttled (429) requests always, server errors and network
+    errors only if the request is idempotent. With a QuotaGovernor, every
+    attempt first waits for the service's read or write quota.
+    """
+    def __init__(self, service, policy=None, window=None, governor=None):
+        self.service = service
+        self.policy = policy if policy is not None else RetryPolicy()
+        self.window = window if window is not None else AdaptiveWindow()
+        self.governor = governor
+
+    def _retry_delay(self, request, attempt, response=None, error=None):
+        """Returns the seconds to wait before retrying, or None to give up."""
+        if attempt >= self.policy.max_attempts:
+            return None
+        if response is not None:
+            if response.status_code in THROTTLE_STATUSES:
+                reason = 'throttled'
+            elif response.status_code in RETRY_STATUSES and is_idempotent(request):
+                reason = 'server_error'
+            else:
+                return None
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        elif is_idempotent(request):
+            reason, retry_after = 'network_error', None
+        else:
+            return None
+
+        delay = self.policy.delay(attempt, retry_after)
+        record_retry(self.service, reason)
+        record_sleep('retry', delay)
+        cause = f"HTTP {response.status_code}" if response is not None else type(error).__name__
+        log(f"{self.service.capitalize()} request {request.method} {request.url.path} failed ({cause}), retrying in {delay:.1f}s (attempt {attempt} of {self.policy.max_attempts}).")
+        return delay
+
+    @staticmethod
+    def _outcome(response):
+        if response.status_code in THROTTLE_STATUSES:
+            return 'throttled'
+        return 'success' if response.status_code < 500 else None
+
+    def send(self, request, send):
+        """Sends `request` with `send(request)` from the calling thread, retrying as needed."""
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.governor is not None:
+                self.governor.acquire(self.service, request_kind(request))
+            self.window.acquire()
+            try:
+                response = send(request)
+            except httpx.TransportError as e:
+                self.window.release()
+                delay = self._retry_delay(request, attempt, error=e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.window.release()
+                raise
+            self.window.release(self._outcome(response))
+            delay = self._retry_delay(request, attempt, response=response)
+            if delay is None:
+                return response
+            response.close()
+            time.sleep(delay)
+
+    async def send_async(self, request, send):
+        """Like `send`, for a coroutine function `send(request)`."""
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.governor is not None:
+                await self.governor.acquire_async(self.service, request_kind(request))
+            await self.window.acquire_async()
+            try:
+                response = await send(request)
+            except httpx.TransportError as e:
+                self.window.release()
+                delay = self._retry_delay(request, attempt, error=e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.window.release()
+                raise
+            self.window.release(self._outcome(response))
+            delay = self._retry_delay(request, attempt, response=response)
+            if delay is None:
+                return response
+            await response.aclose()
+            await asyncio.sleep(delay)
+
+class RetryTransport(httpx.BaseTransport):
+    """An httpx transport that sends every request through a RetryLayer."""
+    def __init__(self, layer, transport=None):
+        self.layer = layer
+        self.transport = transport if transport is not None else httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        return self.layer.send(request, self.transport.handle_request)
+
+    def close(self):
+        self.transport.close()
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """An httpx async transport that sends every request through a RetryLayer."""
+    def __init__(self, layer, transport=None):
+        self.layer = layer
+        self.transport = transport if transport is not None else httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        return await self.layer.send_async(request, self.transport.handle_async_request)
+
+    async def aclose(self):
+        await self.transport.aclose()
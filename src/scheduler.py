@@ -1,118 +1,156 @@
 # scheduler.py
 import time
-import calendar
+import heapq
+import logging
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from job_context import log
+from job_schedule import JobSchedule
+from metrics import record_sleep
+
+# The longest single sleep, so the loop notices wall-clock changes (e.g. DST).
+MAX_SLEEP_SECONDS = 300
 
 class Scheduler:
     """
     Manages scheduling and running of sync jobs based on per-job configurations.
     """
-    def __init__(self, syncer):
+    def __init__(self, syncer, stay_alive=False):
         self.syncer = syncer
+        # Keeps the process running without repeating jobs, e.g. for the webhook listener.
+        self.stay_alive = stay_alive
         self.jobs = self.syncer.config.get('SYNC_PAIRS', [])
-        # Use a unique identifier for each job for tracking last run times
-        self.last_run_times = {f"{job.get('DATABASE_ID')}-{job.get('RANGE')}": None for job in self.jobs}
-
-    def _is_due(self, job, now):
-        """
-        Checks if a job is due to run based on its schedule.
-        """
-        # Support both 'REPEAT' and the user's typo 'REAPEAT' for robustness.
-        is_repeat = job.get('REPEAT', False) or job.get('REAPEAT', False)
-        if not is_repeat:
-            return False
-
-        interval = job.get('INTERVAL')
-        if not interval:
-            return False
-
-        last_run = self.last_run_times[f"{job.get('DATABASE_ID')}-{job.get('RANGE')}"]
+        # Due batches run in the background so a slow sync does not hold up the
+        # clock; the syncer's resource locks keep batches that share a database
+        # or sheet from running at the same time.
+        self._pool = ThreadPoolExecutor(max_workers=self.syncer.max_workers, thread_name_prefix='scheduler')
+        # Jobs (by position in SYNC_PAIRS) whose submitted runs are queued or
+        # running. A job is not submitted again until they finish.
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        # What to do with runs missed by more than MISFIRE_GRACE_TIME seconds:
+        # 'once' runs the job once, 'skip' waits for the next run, 'all' runs every missed run.
+        self.catch_up_policy = self.syncer.config.get('CATCH_UP_POLICY', 'once')
+        self.misfire_grace_time = self.syncer.config.get('MISFIRE_GRACE_TIME', 60)
+        if self.catch_up_policy not in ('once', 'skip', 'all'):
+            log(f"Unknown CATCH_UP_POLICY '{self.catch_up_policy}'. Using 'once'.")
+            self.catch_up_policy = 'once'
 
+    def _run_batches(self, batches, job_ids):
+        """Runs batches of due jobs one after another, then marks the jobs as no longer in flight."""
         try:
-            if interval == 'hour':
-                run_minute = int(job['REPEAT_HOUR'])
-                if now.minute == run_minute:
-                    if last_run is None or (now - last_run).total_seconds() > 60:
-                        return True
-            
-            elif interval == 'day':
-                run_time_str = job['REPEAT_DAY'] # "18:01"
-                run_hour, run_minute = map(int, run_time_str.split(':'))
-                if now.hour == run_hour and now.minute == run_minute:
-                    if last_run is None or (now - last_run).days >= 1:
-                        return True
-
-            elif interval == 'week':
-                run_time_str, run_day_str = job['REPEAT_WEEK'].split('-') # "00:01-Monday"
-                run_hour, run_minute = map(int, run_time_str.split(':'))
-                # Monday is 0, Sunday is 6
-                weekday_map = {'monday': 0, 'tuesday': 1, 'wednesday': 2, 'thursday': 3, 'friday': 4, 'saturday': 5, 'sunday': 6}
-                run_weekday = weekday_map[run_day_str.lower()]
-                if now.weekday() == run_weekday and now.hour == run_hour and now.minute == run_minute:
-                    if last_run is None or (now - last_run).days >= 7:
-                        return True
-
-            elif interval == 'month':
-                run_time_str, run_day_of_month_str = job['REPEAT_MONTH'].split('-') # "11:59-31"
-                run_hour, run_minute = map(int, run_time_str.split(':'))
-                run_day_of_month = int(run_day_of_month_str)
-
-                # Get the last day of the current month
-                _, last_day_of_current_month = calendar.monthrange(now.year, now.month)
-
-                # Determine the target day for this month
-                target_run_day = min(run_day_of_month, last_day_of_current_month)
+            for jobs in batches:
+                try:
+                    self.syncer.run_sync_for_pairs(jobs)
+                except Exception as e:
+                    log(f"Error running scheduled jobs: {e}")
+                    logging.exception("Error running scheduled jobs")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.difference_update(job_ids)
 
-                if now.day == target_run_day and now.hour == run_hour and now.minute == run_minute:
-                    if last_run is None or (now.month != last_run.month or now.year != last_run.year):
-                        return True
+    def _build_queue(self, jobs, now):
+        """
+        Compiles the schedule of every repeating job and returns a heap of
+        (next fire time, sequence number, job, schedule) entries.
+        """
+        queue = []
+        for seq, job in enumerate(jobs):
+            try:
+                schedule = JobSchedule.from_job(job)
+            except ValueError as e:
+                log(f"Error parsing schedule for job {job['RANGE']}: {e}")
+                continue
+            if schedule is not None:
+                queue.append((schedule.next_fire(now), seq, job, schedule))
+        heapq.heapify(queue)
+        return queue
 
-            elif interval == 'year':
-                run_time_str, run_day, run_month = job['REPEAT_YEAR'].split('-') # "00:01-31-12"
-                run_hour, run_minute = map(int, run_time_str.split(':'))
-                if now.month == int(run_month) and now.day == int(run_day) and now.hour == run_hour and now.minute == run_minute:
-                    if last_run is None or now.year != last_run.year:
-                        return True
+    def _runs_for(self, job, schedule, fire_time, now):
+        """Returns how many times a job popped from the queue should run now."""
+        if (now - fire_time).total_seconds() <= self.misfire_grace_time:
+            return 1
 
-        except (ValueError, KeyError) as e:
-            print(f"Error parsing schedule for job {job['RANGE']}: {e}")
-            return False
-            
-        return False
+        job_name = job.get('NAME', job.get('RANGE'))
+        missed = schedule.missed_fires(fire_time, now)
+        if self.catch_up_policy == 'skip':
+            log(f"Scheduled job '{job_name}' missed {missed} run(s) since {fire_time:%Y-%m-%d %H:%M}. Skipping to the next run.")
+            return 0
+        if self.catch_up_policy == 'all':
+            log(f"Scheduled job '{job_name}' missed {missed} run(s) since {fire_time:%Y-%m-%d %H:%M}. Running all of them.")
+            return missed
+        log(f"Scheduled job '{job_name}' missed {missed} run(s) since {fire_time:%Y-%m-%d %H:%M}. Running it once.")
+        return 1
 
     def run(self):
         """
         Starts the main scheduler loop.
         """
         # First, run all jobs once that are not configured to repeat.
-        print("Performing initial run for all non-repeating jobs...")
-        for job in self.jobs:
-            is_repeat = job.get('REPEAT', False) or job.get('REAPEAT', False)
-            job_name = job.get('NAME', job.get('RANGE'))
-            if not is_repeat:
-                try:
-                    self.syncer.run_sync_for_pair(job)
-                except Exception as e:
-                    print(f"Error running initial sync for job '{job_name}': {e}")
+        log("Performing initial run for all non-repeating jobs...")
+        initial_jobs = [job for job in self.jobs if not (job.get('REPEAT', False) or job.get('REAPEAT', False))]
+        if initial_jobs:
+            try:
+                self.syncer.run_sync_for_pairs(initial_jobs)
+            except Exception as e:
+                log(f"Error running initial sync: {e}")
 
-        # Check if there are any repeating jobs to schedule
-        repeating_jobs = [job for job in self.jobs if job.get('REPEAT', False) or job.get('REAPEAT', False)]
-        if not repeating_jobs:
-            print("No repeating jobs configured. Exiting.")
-            return
+        # Schedules are parsed once into next fire times, kept in a priority queue.
+        queue = self._build_queue(self.jobs, datetime.now())
+        if not queue:
+            if not self.stay_alive:
+                log("No repeating jobs configured. Exiting.")
+                return
+            log("No repeating jobs configured. Waiting for change notifications...")
+            while True:
+                time.sleep(MAX_SLEEP_SECONDS)
 
-        print("Scheduler started. Checking for due jobs...")
+        log("Scheduler started. Waiting for the next due job...")
         while True:
+            delay = (queue[0][0] - datetime.now()).total_seconds()
+            if delay > 0:
+                pause = min(delay, MAX_SLEEP_SECONDS)
+                time.sleep(pause)
+                record_sleep('schedule', pause)
+                continue
+
             now = datetime.now()
-            for job in repeating_jobs:
-                job_name = job.get('NAME', job.get('RANGE'))
-                if self._is_due(job, now):
-                    print(f"Scheduled job '{job_name}' is due. Running sync.")
-                    try:
-                        self.syncer.run_sync_for_pair(job)
-                        self.last_run_times[f"{job.get('DATABASE_ID')}-{job.get('RANGE')}"] = now
-                    except Exception as e:
-                        print(f"Error running scheduled job '{job_name}': {e}")
-            
-            # Sleep for 60 seconds before checking again
-            time.sleep(60)
+            self._submit_due(queue, now)
+
+    def _submit_due(self, queue, now):
+        """
+        Pops the jobs due at `now` off the queue, pushes their next fire times,
+        and submits their runs. Jobs due at the same time run together so their
+        Sheets calls are batched. A job whose previous run is still queued or
+        running is skipped, so a job slower than its interval does not pile up
+        runs behind the resource locks.
+
+        Returns:
+            list: The submitted batches of jobs, in the order they run.
+        """
+        batches = []
+        job_ids = set()
+        while queue and queue[0][0] <= now:
+            fire_time, seq, job, schedule = heapq.heappop(queue)
+            heapq.heappush(queue, (schedule.next_fire(now), seq, job, schedule))
+            job_name = job.get('NAME', job.get('RANGE'))
+            with self._in_flight_lock:
+                busy = seq in self._in_flight
+            if busy:
+                log(f"Scheduled job '{job_name}' is due, but its previous run has not finished. Skipping this run.")
+                continue
+            runs = self._runs_for(job, schedule, fire_time, now)
+            if runs:
+                log(f"Scheduled job '{job_name}' is due. Running sync.")
+                job_ids.add(seq)
+            for i in range(runs):
+                if i == len(batches):
+                    batches.append([])
+                batches[i].append(job)
+
+        if batches:
+            with self._in_flight_lock:
+                self._in_flight.update(job_ids)
+            self._pool.submit(self._run_batches, batches, job_ids)
+        return batches
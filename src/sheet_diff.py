@@ -0,0 +1,89 @@
+# sheet_diff.py
+
+def _cell(grid, r, c):
+    if grid is None or r >= len(grid) or c >= len(grid[r]):
+        return ''
+    value = grid[r][c]
+    return '' if value is None else value
+
+def cells_equal(new_value, existing_value):
+    """
+    Returns True if writing `new_value` with USER_ENTERED input would leave a
+    cell that currently holds `existing_value` (as read back from the Sheets
+    API) unchanged.
+    """
+    if new_value is None:
+        new_value = ''
+    if isinstance(new_value, bool) or isinstance(existing_value, bool):
+        return str(new_value).upper() == str(existing_value).upper()
+    if isinstance(new_value, (int, float)) and isinstance(existing_value, (int, float)):
+        return float(new_value) == float(existing_value)
+    if isinstance(new_value, (int, float)) and isinstance(existing_value, str):
+        try:
+            return float(new_value) == float(existing_value.replace(',', ''))
+        except ValueError:
+            return False
+    return str(new_value) == str(existing_value)
+
+def diff_grid(new_grid, existing_grid, skip_cells=None, skip_cols=None, formatted_grid=None):
+    """
+    Compares an outgoing grid with the values already in the sheet and groups
+    the cells that need writing into rectangular blocks.
+
+    Consecutive rows with at least one changed cell are merged into one block
+    spanning their changed columns. Cells inside a block that must not be
+    written are set to None, which the Sheets API skips.
+
+    Args:
+        new_grid (list): The rows to be written, starting at the range's top-left cell.
+        existing_grid (list): The rows currently in the sheet, read from the same range.
+        skip_cells (set): (row, col) cells that must never be written, e.g. formulas.
+        skip_cols (iterable): Column indices that must never be written.
+        formatted_grid (list): Optionally, the same rows as displayed. A cell is
+            also left alone if the new value matches its displayed text, which
+            catches values such as dates that the sheet stores differently.
+
+    Returns:
+        tuple: (blocks, cells_written, cells_skipped), where each block is a
+               (row_offset, col_offset, values) tuple.
+    """
+    skip_cells = skip_cells or set()
+    skip_cols = set(skip_cols or [])
+    cells_written = 0
+    cells_skipped = 0
+
+    changed_rows = []
+    for r, row in enumerate(new_grid):
+        changed_cols = []
+        for c, value in enumerate(row):
+            if (r, c) in skip_cells or c in skip_cols:
+                continue
+            if cells_equal(value, _cell(existing_grid, r, c)) or (
+                formatted_grid is not None and str(value) == str(_cell(formatted_grid, r, c))
+            ):
+                cells_skipped += 1
+            else:
+                changed_cols.append(c)
+        cells_written += len(changed_cols)
+        if changed_cols:
+            changed_rows.append((r, set(changed_cols)))
+
+    # Group runs of consecutive changed rows.
+    groups = []
+    for r, changed_cols in changed_rows:
+        if groups and groups[-1][-1][0] == r - 1:
+            groups[-1].append((r, changed_cols))
+        else:
+            groups.append([(r, changed_cols)])
+
+    blocks = []
+    for group in groups:
+        first_col = min(min(cols) for _, cols in group)
+        last_col = max(max(cols) for _, cols in group)
+        values = [
+            [new_grid[r][c] if c in cols else None for c in range(first_col, last_col + 1)]
+            for r, cols in group
+        ]
+        blocks.append((group[0][0], first_col, values))
+
+    return blocks, cells_written, cells_skipped
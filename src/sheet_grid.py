@@ -0,0 +1,71 @@
+# sheet_grid.py
+
+def _trim(rows):
+    """Drops trailing empty cells and rows, the way the values API does."""
+    for row in rows:
+        while row and row[-1] == '':
+            row.pop()
+    while rows and not rows[-1]:
+        rows.pop()
+    return rows
+
+def _raw_value(cell):
+    """Returns a cell's value the way the FORMULA render option reports it."""
+    entered = cell.get('userEnteredValue') or {}
+    if 'formulaValue' in entered:
+        return entered['formulaValue']
+    for source in (entered, cell.get('effectiveValue') or {}):
+        for key in ('stringValue', 'numberValue', 'boolValue'):
+            if key in source:
+                return source[key]
+    return cell.get('formattedValue', '')
+
+class SheetGrid:
+    """
+    The contents of one sheet range, read once and kept in two forms:
+    `formulas` holds formulas and unformatted values (like the FORMULA render
+    option) and `values` holds what the sheet displays (like FORMATTED_VALUE).
+    """
+    def __init__(self, range_name, formulas, values, columns=None):
+        self.range_name = range_name
+        self.formulas = formulas
+        self.values = values
+        # The offsets of the range's columns this grid holds, or None for all of them.
+        self.columns = columns
+
+    @property
+    def headers(self):
+        """The first row of the range, as displayed."""
+        return self.values[0] if self.values else []
+
+    def is_loading(self):
+        """Returns True if any formula in the range is still being calculated."""
+        return any(cell == 'Loading...' for row in self.values for cell in row)
+
+    @classmethod
+    def from_grid_data(cls, range_name, grid_data):
+        """
+        Builds a SheetGrid from the GridData returned by `spreadsheets.get`
+        with `includeGridData`.
+        """
+        formulas, values = [], []
+        for row_data in grid_data.get('rowData', []):
+            cells = row_data.get('values', [])
+            formulas.append([_raw_value(cell) if cell else '' for cell in cells])
+            values.append([cell.get('formattedValue', '') if cell else '' for cell in cells])
+        return cls(range_name, _trim(formulas), _trim(values))
+
+    @classmethod
+    def from_columns(cls, range_name, columns, column_grids):
+        """
+        Builds a SheetGrid holding only some columns of `range_name`, side by
+        side, from one single-column grid per column offset in `columns`.
+        """
+        height = max((len(grid.values) for grid in column_grids), default=0)
+
+        def cell(rows, r):
+            return rows[r][0] if r < len(rows) and rows[r] else ''
+
+        formulas = [[cell(grid.formulas, r) for grid in column_grids] for r in range(height)]
+        values = [[cell(grid.values, r) for grid in column_grids] for r in range(height)]
+        return cls(range_name, _trim(formulas), _trim(values), columns=list(columns))
@@ -0,0 +1,70 @@
+# sync_state.py
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+
+def row_hash(values):
+    """Returns a short, stable hash of a list of JSON-serializable values."""
+    encoded = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+class SyncStateStore:
+    """
+    Remembers, per job, what every synced row looked like on both sides at the
+    end of its last sync: a hash of the sheet row's values and a hash of the
+    Notion page's values, keyed by page ID. Comparing the current hashes with
+    these tells which side changed since, so rows that changed on neither side
+    can be skipped without comparing them property by property.
+
+    The state lives in one SQLite file shared by all jobs. If it is deleted,
+    every row is compared against Notion again on the next run.
+    """
+    def __init__(self, path='sync_state.sqlite3'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS row_state ("
+                " job TEXT NOT NULL, page_id TEXT NOT NULL,"
+                " sheet_hash TEXT NOT NULL, notion_hash TEXT NOT NULL, synced_at TEXT NOT NULL,"
+                " PRIMARY KEY (job, page_id))"
+            )
+
+    def load(self, job_key):
+        """
+        Returns the state from a job's last sync.
+
+        Returns:
+            dict: page_id -> (sheet_hash, notion_hash).
+        """
+        try:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT page_id, sheet_hash, notion_hash FROM row_state WHERE job = ?", (job_key,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            logging.warning(f"Could not load the sync state of {job_key} from {self.path}: {e}")
+            return {}
+        return {page_id: (sheet_hash, notion_hash) for page_id, sheet_hash, notion_hash in rows}
+
+    def save(self, job_key, state):
+        """Replaces a job's state with `state`, a page_id -> (sheet_hash, notion_hash) dict."""
+        synced_at = datetime.now(timezone.utc).isoformat()
+        try:
+            with self._lock, self._connection:
+                self._connection.execute("DELETE FROM row_state WHERE job = ?", (job_key,))
+                self._connection.executemany(
+                    "INSERT INTO row_state (job, page_id, sheet_hash, notion_hash, synced_at) VALUES (?, ?, ?, ?, ?)",
+                    [(job_key, page_id, sheet_hash, notion_hash, synced_at) for page_id, (sheet_hash, notion_hash) in state.items()]
+                )
+        except sqlite3.Error as e:
+            logging.warning(f"Could not save the sync state of {job_key} to {self.path}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,311 @@
+# webhook_listener.py
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from job_context import log
+from a1_notation import column_letter, ranges_overlap
+from metrics import record_webhook_event
+
+# Larger bodies are refused; real notifications are a few kilobytes.
+MAX_BODY_BYTES = 1024 * 1024
+
+# Notion page events synced page by page; other page events and all database
+# events sync the whole pair, and events not listed here are ignored.
+NOTION_PAGE_EVENTS = ('page.properties_updated', 'page.created')
+NOTION_FULL_SYNC_EVENTS = ('page.deleted', 'page.undeleted', 'page.moved')
+
+# Hosts that only accept connections from this machine.
+LOOPBACK_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+def _normalize_id(notion_id):
+    return str(notion_id or '').replace('-', '').lower()
+
+def _matches(expected, given):
+    """Compares a secret with a received value in constant time, whatever characters the value holds."""
+    return hmac.compare_digest(expected.encode('utf-8'), given.encode('utf-8', 'surrogatepass'))
+
+class _PendingChange:
+    """The changes to one sync pair received since its last targeted sync."""
+    def __init__(self, now):
+        self.first_seen = now
+        self.last_seen = now
+        self.page_ids = set()
+        self.row_numbers = set()
+        self.full = False
+
+class ChangeBatcher:
+    """
+    Collects change notifications per sync pair and runs one sync per pair
+    once its notifications have been quiet for `debounce` seconds, or at the
+    latest `max_delay` seconds after the first one, so a burst of edits to a
+    row or page is synced once.
+
+    Args:
+        syncer (DataSyncer): Runs the syncs.
+        pairs (list): The SYNC_PAIRS the notifications refer to by index.
+    """
+    def __init__(self, syncer, pairs, debounce=2.0, max_delay=30.0):
+        self.syncer = syncer
+        self.pairs = pairs
+        self.debounce = debounce
+        self.max_delay = max(debounce, max_delay)
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=syncer.max_workers, thread_name_prefix='webhook-sync')
+        threading.Thread(target=self._dispatch, name='webhook-batcher', daemon=True).start()
+
+    def add(self, pair_index, page_ids=(), row_numbers=(), full=False):
+        """Queues a sync of the given pages and rows, or of the whole pair if `full`."""
+        with self._condition:
+            now = time.monotonic()
+            pending = self._pending.get(pair_index)
+            if pending is None:
+                pending = self._pending[pair_index] = _PendingChange(now)
+            pending.last_seen = now
+            pending.page_ids.update(page_ids)
+            pending.row_numbers.update(row_numbers)
+            pending.full = pending.full or full
+            self._condition.notify()
+
+    def _due_at(self, pending):
+        return min(pending.last_seen + self.debounce, pending.first_seen + self.max_delay)
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                due = {index: pending for index, pending in self._pending.items() if self._due_at(pending) <= now}
+                if not due:
+                    wait = min((self._due_at(pending) for pending in self._pending.values()), default=None)
+                    self._condition.wait(None if wait is None else wait - now)
+                    continue
+                for index in due:
+                    del self._pending[index]
+
+            full_pairs = [self.pairs[index] for index, pending in due.items() if pending.full]
+            if full_pairs:
+                self._pool.submit(self._run, self.syncer.run_sync_for_pairs, full_pairs)
+            for index, pending in due.items():
+                if not pending.full:
+                    self._pool.submit(
+                        self._run, self.syncer.run_targeted_sync, self.pairs[index],
+                        sorted(pending.page_ids), sorted(pending.row_numbers)
+                    )
+
+    @staticmethod
+    def _run(sync, *args):
+        try:
+            sync(*args)
+        except Exception as e:
+            log(f"Error running a sync for change notifications: {e}")
+            logging.exception("Error running a sync for change notifications")
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        path = self.path.split('?')[0].rstrip('/')
+        handlers = {'/notion': self.server.listener.handle_notion, '/sheet': self.server.listener.handle_sheet}
+        if path not in handlers:
+            self._respond(404, {'error': 'unknown path'})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self._respond(413, {'error': 'body too large'})
+            return
+        body = self.rfile.read(length)
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            self._respond(400, {'error': 'invalid JSON'})
+            return
+        if not isinstance(payload, dict):
+            self._respond(400, {'error': 'expected a JSON object'})
+            return
+        self._respond(*handlers[path](payload, body, self.headers))
+
+class WebhookListener:
+    """
+    Receives change notifications over HTTP from a background thread and
+    queues targeted syncs of the pages and rows they name:
+
+    - `POST /notion` takes Notion webhook events. Page property changes sync
+      only the changed pages; other page and database events sync the pair.
+    - `POST /sheet` takes sheet edits, e.g. from an Apps Script `onEdit`
+      trigger, as {"sheet": "Sheet1", "row": 5, "num_rows": 1} with optional
+      "column"/"num_columns" (1-based, like the Apps Script range), or with
+      "rows": [5, 6] instead of "row".
+
+    Every accepted request is answered with 202 before the sync runs. The
+    listener only listens on a loopback address unless `token` is set, and
+    then unsigned Notion events are only taken if `notion_verification_token`
+    is set as well.
+    """
+    def __init__(self, syncer, port, host='127.0.0.1', token=None, notion_verification_token=None, debounce=2.0, max_delay=30.0,
+                 verification_token_file='notion_webhook_verification_token'):
+        self.port = port
+        self.host = host
+        self.token = token
+        self.notion_verification_token = notion_verification_token
+        self.verification_token_file = verification_token_file
+        self.spreadsheet_id = syncer.config['SAMPLE_SPREADSHEET_ID']
+        self.pairs = syncer.config.get('SYNC_PAIRS', [])
+        self.batcher = ChangeBatcher(syncer, self.pairs, debounce=debounce, max_delay=max_delay)
+        self._httpd = None
+
+    @classmethod
+    def from_config(cls, syncer):
+        config = syncer.config
+        return cls(
+            syncer, config['WEBHOOK_PORT'], host=config.get('WEBHOOK_HOST', '127.0.0.1'),
+            token=config.get('WEBHOOK_TOKEN'),
+            notion_verification_token=config.get('NOTION_WEBHOOK_VERIFICATION_TOKEN'),
+            debounce=config.get('WEBHOOK_DEBOUNCE', 2.0), max_delay=config.get('WEBHOOK_MAX_DELAY', 30.0),
+            verification_token_file=config.get('NOTION_WEBHOOK_VERIFICATION_FILE', 'notion_webhook_verification_token')
+        )
+
+    @property
+    def loopback(self):
+        return self.host in LOOPBACK_HOSTS
+
+    def start(self):
+        if not self.loopback and not self.token:
+            logging.error(f"Refusing to start the webhook listener on {self.host} without a WEBHOOK_TOKEN.")
+            print(f"Not starting the webhook listener: set WEBHOOK_TOKEN to listen on {self.host}, "
+                  "or leave WEBHOOK_HOST at 127.0.0.1.")
+            return None
+        try:
+            self._httpd = ThreadingHTTPServer((self.host, self.port), _WebhookHandler)
+        except OSError as e:
+            logging.error(f"Could not start the webhook listener on {self.host}:{self.port}: {e}")
+            print(f"Could not start the webhook listener on port {self.port}: {e}")
+            return None
+        # With port 0 the system picks a free port.
+        self.port = self._httpd.server_port
+        self._httpd.daemon_threads = True
+        self._httpd.listener = self
+        threading.Thread(target=self._httpd.serve_forever, name='webhook-listener', daemon=True).start()
+        print(f"Listening for change notifications at http://{self.host}:{self.port}/notion and /sheet")
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def handle_notion(self, payload, body, headers):
+        """
+        Handles a Notion webhook request.
+
+        Returns:
+            tuple: (HTTP status, JSON-serializable response body).
+        """
+        if 'verification_token' in payload:
+            # Sent once when the subscription is created. It is also the key of
+            # later signatures, so it is written to a file rather than logged.
+            self._save_verification_token(str(payload['verification_token']))
+            record_webhook_event('notion', 'verification')
+            return 200, {'status': 'ok'}
+        if self.notion_verification_token:
+            expected = 'sha256=' + hmac.new(self.notion_verification_token.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            if not _matches(expected, headers.get('X-Notion-Signature', '')):
+                record_webhook_event('notion', 'rejected')
+                return 401, {'error': 'invalid signature'}
+        elif not self.loopback:
+            # Anyone who can reach the listener could send unsigned events.
+            record_webhook_event('notion', 'rejected')
+            return 401, {'error': 'set NOTION_WEBHOOK_VERIFICATION_TOKEN to accept Notion events'}
+
+        event_type = payload.get('type', '')
+        entity = payload.get('entity') or {}
+        parent = (payload.get('data') or {}).get('parent') or {}
+        if event_type in NOTION_PAGE_EVENTS or event_type in NOTION_FULL_SYNC_EVENTS:
+            database_ids = {_normalize_id(parent.get('id')), _normalize_id(parent.get('database_id'))}
+        elif event_type.startswith('database.') or event_type.startswith('data_source.'):
+            database_ids = {_normalize_id(entity.get('id')), _normalize_id(parent.get('id'))}
+        else:
+            record_webhook_event('notion', 'ignored')
+            return 202, {'status': 'ignored', 'pairs': 0}
+        database_ids.discard('')
+
+        full = event_type not in NOTION_PAGE_EVENTS
+        matched = 0
+        for index, pair in enumerate(self.pairs):
+            if _normalize_id(pair.get('DATABASE_ID')) in database_ids:
+                self.batcher.add(index, page_ids=() if full else [entity.get('id')], full=full)
+                matched += 1
+        record_webhook_event('notion', 'queued' if matched else 'unmatched')
+        return 202, {'status': 'queued' if matched else 'unmatched', 'pairs': matched}
+
+    def handle_sheet(self, payload, body, headers):
+        """
+        Handles a sheet edit notification.
+
+        Returns:
+            tuple: (HTTP status, JSON-serializable response body).
+        """
+        if self.token:
+            given = headers.get('X-Webhook-Token') or str(payload.get('token', ''))
+            if not _matches(self.token, given):
+                record_webhook_event('sheet', 'rejected')
+                return 401, {'error': 'invalid token'}
+        if payload.get('spreadsheet_id') not in (None, self.spreadsheet_id):
+            record_webhook_event('sheet', 'ignored')
+            return 202, {'status': 'ignored', 'pairs': 0}
+
+        try:
+            sheet = str(payload['sheet'])
+            if 'rows' in payload:
+                rows = sorted({int(row) for row in payload['rows']})
+            else:
+                rows = list(range(int(payload['row']), int(payload['row']) + int(payload.get('num_rows', 1))))
+            column = int(payload['column']) if 'column' in payload else None
+            num_columns = int(payload.get('num_columns', 1))
+        except (KeyError, TypeError, ValueError):
+            record_webhook_event('sheet', 'invalid')
+            return 400, {'error': 'expected "sheet" and "row" or "rows"'}
+        if not rows or rows[0] < 1 or (column is not None and (column < 1 or num_columns < 1)):
+            record_webhook_event('sheet', 'invalid')
+            return 400, {'error': 'rows and columns are 1-based'}
+
+        quoted = "'" + sheet.replace("'", "''") + "'"
+        if column is None:
+            edited = f"{quoted}!{rows[0]}:{rows[-1]}"
+        else:
+            edited = f"{quoted}!{column_letter(column - 1)}{rows[0]}:{column_letter(column + num_columns - 2)}{rows[-1]}"
+        matched = 0
+        for index, pair in enumerate(self.pairs):
+            if ranges_overlap(pair.get('RANGE', ''), edited):
+                self.batcher.add(index, row_numbers=rows)
+                matched += 1
+        record_webhook_event('sheet', 'queued' if matched else 'unmatched')
+        return 202, {'status': 'queued' if matched else 'unmatched', 'pairs': matched}
+
+    def _save_verification_token(self, verification_token):
+        """Writes a Notion verification token to `verification_token_file`, readable only by its owner."""
+        try:
+            fd = os.open(self.verification_token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(verification_token + '\n')
+        except OSError as e:
+            logging.error(f"Could not save the Notion webhook verification token to {self.verification_token_file}: {e}")
+            log("Notion webhook verification token received, but it could not be saved. See the error log.")
+            return
+        log(f"Notion webhook verification token received and saved to {self.verification_token_file}. "
+            "Paste it into Notion to verify the subscription, and set it as NOTION_WEBHOOK_VERIFICATION_TOKEN to check event signatures.")
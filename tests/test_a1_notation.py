@@ -0,0 +1,66 @@
+# test_a1_notation.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a1_notation import column_letter, column_index, split_range, sub_range, column_range, ranges_overlap, sheet_title
+
+@pytest.mark.parametrize('letters, index', [('A', 0), ('Z', 25), ('AA', 26), ('AZ', 51), ('ZZ', 701), ('ZZZ', 18277)])
+def test_column_letters_round_trip(letters, index):
+    assert column_index(letters) == index
+    assert column_index(letters.lower()) == index
+    assert column_letter(index) == letters
+
+@pytest.mark.parametrize('range_name, parts', [
+    ('Sheet1!A1:D10', ('Sheet1', 0, 0, 3, 9)),
+    ('Sheet1!B2:E', ('Sheet1', 1, 1, 4, None)),
+    ('Sheet1!A:C', ('Sheet1', 0, 0, 2, None)),
+    ('Sheet1!3:5', ('Sheet1', 0, 2, None, 4)),
+    ('Sheet1!C7', ('Sheet1', 2, 6, 2, 6)),
+    ('Sheet1!$B$2:$AA$20', ('Sheet1', 1, 1, 26, 19)),
+    ("'My Sheet'!A1:B2", ("'My Sheet'", 0, 0, 1, 1)),
+    ("'A!B'!C3:D4", ("'A!B'", 2, 2, 3, 3)),
+    ('Sheet1', ('Sheet1', 0, 0, None, None)),
+])
+def test_split_range(range_name, parts):
+    assert split_range(range_name) == parts
+
+@pytest.mark.parametrize('range_name', [
+    'Sheet1!NamedRange', 'Sheet1!ABCD1:ABCE2', 'Sheet1!A1:B2:C3', 'Sheet1!A1B', 'Sheet1!A0:B2', 'Sheet1!R1C1',
+])
+def test_split_range_rejects_what_is_not_a_cell_range(range_name):
+    with pytest.raises(ValueError):
+        split_range(range_name)
+
+def test_sub_range():
+    assert sub_range('Sheet1!B2:E', 0, 0, 1, 1) == 'Sheet1!B2:B2'
+    assert sub_range('Sheet1!B2:E', 3, 1, 2, 3) == 'Sheet1!C5:E6'
+    assert sub_range("'My Sheet'!Y1:AD9", 1, 1, 1, 2) == "'My Sheet'!Z2:AA2"
+
+def test_sub_range_of_a_named_range_raises():
+    with pytest.raises(ValueError):
+        sub_range('Sheet1!NamedRange', 0, 0, 1, 1)
+
+def test_column_range():
+    assert column_range('Sheet1!B2:E10', 2) == 'Sheet1!D2:D10'
+    assert column_range('Sheet1!B2:E', 0) == 'Sheet1!B2:B'
+
+def test_ranges_overlap():
+    assert ranges_overlap('Sheet1!A1:C10', 'Sheet1!C10:D20')
+    assert not ranges_overlap('Sheet1!A1:C10', 'Sheet1!D1:D20')
+    assert not ranges_overlap('Sheet1!A1:C10', 'Sheet2!A1:C10')
+    assert ranges_overlap('Sheet1!A:A', 'Sheet1!5:5')
+    assert ranges_overlap("'Sheet1'!B2", 'Sheet1!A1:C3')
+
+@pytest.mark.parametrize('sheet, title', [
+    ('Sheet1', 'Sheet1'), ("'My Sheet'", 'My Sheet'), ("'Bob''s data'", "Bob's data"), ("''''", "'"),
+])
+def test_sheet_title(sheet, title):
+    assert sheet_title(sheet) == title
+
+def test_ranges_overlap_with_escaped_quotes():
+    assert ranges_overlap("'Bob''s data'!A1:B2", "'Bob''s data'!B2")
+    assert not ranges_overlap("'Bob''s data'!A1:B2", "'Bobs data'!A1:B2")
@@ -0,0 +1,133 @@
+# test_google_sheets_client.py
+import os
+import sys
+import threading
+
+from google.oauth2.credentials import Credentials
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from a1_notation import split_range
+from google_sheets_client import GoogleSheetsClient
+
+class FakeRequest:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+class FakeService:
+    """Answers every spreadsheets.get with the same response."""
+    def __init__(self, response):
+        self.response = response
+
+    def spreadsheets(self):
+        return self
+
+    def get(self, **request):
+        return FakeRequest(self.response)
+
+def grid_data(text):
+    return {'rowData': [{'values': [{'formattedValue': text}]}]}
+
+def make_client(response):
+    client = GoogleSheetsClient(Credentials(token='test'))
+    # Without credentials, requests are sent with their own execute().
+    client.credentials = None
+    client.service = FakeService(response)
+    return client
+
+def test_quoted_sheet_names_match_their_titles():
+    client = make_client({'sheets': [
+        {'properties': {'sheetId': 0, 'title': 'Plain'}, 'data': [grid_data('plain')]},
+        {'properties': {'sheetId': 1, 'title': "Bob's data"}, 'data': [grid_data('bob')]},
+        {'properties': {'sheetId': 2, 'title': 'My Sheet'}, 'data': [grid_data('mine')]},
+    ]})
+    grids = client.get_sheet_grids('spreadsheet', ['Plain!A1:B2', "'Bob''s data'!A1:B2", "'My Sheet'!A1:B2"])
+    assert grids['Plain!A1:B2'].headers == ['plain']
+    assert grids["'Bob''s data'!A1:B2"].headers == ['bob']
+    assert grids["'My Sheet'!A1:B2"].headers == ['mine']
+    assert client._get_sheet_id('spreadsheet', "Bob's data") == 1
+
+def test_metadata_caches_can_be_used_from_several_threads():
+    client = make_client({'sheets': [{'properties': {'sheetId': 0, 'title': 'Plain'}, 'data': [grid_data('plain')]}]})
+    errors = []
+
+    def remember(worker):
+        try:
+            for i in range(2000):
+                client._remember_formatting('spreadsheet', f'Plain!A{worker}:B{i}', 'fingerprint')
+                client.get_sheet_grids('spreadsheet', ['Plain!A1:B2'])
+        except Exception as e:
+            errors.append(e)
+
+    def invalidate():
+        try:
+            for _ in range(2000):
+                client.invalidate_metadata('spreadsheet')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=remember, args=(worker,)) for worker in range(3)] + [threading.Thread(target=invalidate)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+class SheetService:
+    """An in-memory sheet named 'Data' that records the ranges read and written."""
+    def __init__(self, cells):
+        self.cells = cells
+        self.reads = []
+        self.writes = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, ranges=(), includeGridData=False, fields=None):
+        sheet = {'properties': {'sheetId': 0, 'title': 'Data'}, 'data': []}
+        for range_name in ranges:
+            self.reads.append(range_name)
+            _, start_col, start_row, end_col, end_row = split_range(range_name)
+            sheet['data'].append({'rowData': [
+                {'values': [{'formattedValue': str(self.cells.get((r, c), ''))} if (r, c) in self.cells else {}
+                            for c in range(start_col, end_col + 1)]}
+                for r in range(start_row, end_row + 1)
+            ]})
+        return FakeRequest({'sheets': [sheet]})
+
+    def batchUpdate(self, spreadsheetId, body):
+        for value_range in body.get('data', []):
+            self.writes.append(value_range['range'])
+            _, start_col, start_row, _, _ = split_range(value_range['range'])
+            for r, row in enumerate(value_range['values']):
+                for c, value in enumerate(row):
+                    if value is not None:
+                        self.cells[(start_row + r, start_col + c)] = value
+        return FakeRequest({})
+
+def test_stream_reads_and_writes_the_range_a_chunk_at_a_time():
+    # Rows 1-300 already hold the values being streamed, except for the N of row 150.
+    cells = {(0, 0): 'Name', (0, 1): 'N'}
+    for r in range(1, 301):
+        cells[(r, 0)], cells[(r, 1)] = f'n{r}', r
+    cells[(150, 1)] = 0
+    client = GoogleSheetsClient(Credentials(token='test'))
+    client.credentials = None
+    client.service = SheetService(cells)
+    client._formatting_requests = lambda *args: []
+
+    def batches():
+        for start in range(1, 1001, 100):
+            yield [[f'n{r}', r] for r in range(start, start + 100)]
+
+    stats = client.stream_sheet_update('spreadsheet', 'Data!A1:B', ['Name', 'N'], batches(), {}, chunk_rows=250)
+    assert client.service.reads == ['Data!A1:B250', 'Data!A251:B500', 'Data!A501:B750', 'Data!A751:B1000', 'Data!A1001:B1001']
+    assert client.service.writes == ['Data!B151:B151', 'Data!A302:B500', 'Data!A501:B750', 'Data!A751:B1000', 'Data!A1001:B1001']
+    assert stats['cells_written'] == 1 + 2 * 700
+    assert cells[(150, 1)] == 150 and cells[(1000, 0)] == 'n1000'
@@ -0,0 +1,98 @@
+# test_incremental_fetch.py
+import os
+import sys
+import copy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from notion_client_wrapper import NotionClientWrapper
+from notion_page_index import NotionPageIndex
+from notion_snapshot import NotionSnapshotStore
+from notion_write_executor import NotionWriteExecutor
+
+DATABASE_ID = 'db'
+PROPERTIES = {
+    'Name': {'id': 'title', 'type': 'title'},
+    'Qty': {'id': 'qty', 'type': 'number', 'number': {'format': 'number'}},
+}
+HEADERS = ['Name', 'Qty']
+
+def make_page(i):
+    return {
+        'id': f'page-{i}',
+        'last_edited_time': '2024-01-01T00:00:00.000Z',
+        'properties': {
+            'Name': {'id': 'title', 'type': 'title', 'title': [{'type': 'text', 'text': {'content': f'Row {i}'}, 'plain_text': f'Row {i}'}]},
+            'Qty': {'id': 'qty', 'type': 'number', 'number': i},
+        },
+    }
+
+class FakeDatabases:
+    """Answers databases.query from a list of pages, 100 at a time, newest first like Notion."""
+    def __init__(self, pages):
+        self.pages = pages
+        self.queries = 0
+
+    def query(self, database_id, start_cursor=None, filter=None, **query_args):
+        self.queries += 1
+        pages = list(reversed(self.pages))
+        if filter is not None:
+            since = filter['last_edited_time']['on_or_after']
+            pages = [p for p in pages if p['last_edited_time'][:19] >= since[:19]]
+        start = int(start_cursor or 0)
+        has_more = start + 100 < len(pages)
+        return {
+            'results': copy.deepcopy(pages[start:start + 100]),
+            'has_more': has_more, 'next_cursor': str(start + 100) if has_more else None,
+        }
+
+class FakeClient:
+    def __init__(self, pages):
+        self.databases = FakeDatabases(pages)
+
+def make_wrapper(tmp_path, pages):
+    wrapper = NotionClientWrapper(
+        'test', snapshot_store=NotionSnapshotStore(str(tmp_path)), write_executor=NotionWriteExecutor(max_workers=1)
+    )
+    wrapper.client = FakeClient(pages)
+    wrapper.writes = []
+    wrapper._write_page = lambda operation, database_id=None: wrapper.writes.append(operation) or {'id': operation.get('page_id')}
+    return wrapper
+
+def sync(wrapper, sheet_rows):
+    """One run of both directions: an incremental read, then an upsert of the sheet's rows."""
+    queries = wrapper.client.databases.queries
+    page_index = NotionPageIndex(DATABASE_ID)
+    data = wrapper.get_notion_data(DATABASE_ID, HEADERS, PROPERTIES, incremental=True, page_index=page_index)
+    wrapper.notion_upsert([HEADERS] + sheet_rows, DATABASE_ID, PROPERTIES, page_index=page_index)
+    return data, wrapper.client.databases.queries - queries
+
+def test_incremental_runs_do_not_rescan_the_database(tmp_path):
+    pages = [make_page(i) for i in range(1000)]
+    wrapper = make_wrapper(tmp_path, pages)
+    sheet_rows = [[f'Row {i}', str(i)] for i in range(1000)]
+
+    data, queries = sync(wrapper, sheet_rows)
+    assert queries == 10
+    assert data[2] == ['Row 1', 1]
+
+    data, queries = sync(wrapper, sheet_rows)
+    assert queries == 1
+    assert len(data) == 1001
+    assert wrapper.writes == []
+
+def test_incremental_page_index_has_the_edited_pages(tmp_path):
+    pages = [make_page(i) for i in range(250)]
+    wrapper = make_wrapper(tmp_path, pages)
+    sheet_rows = [[f'Row {i}', str(i)] for i in range(250)]
+    sync(wrapper, sheet_rows)
+
+    pages[7]['properties']['Qty']['number'] = 70
+    pages[7]['last_edited_time'] = '2099-01-01T00:00:00.000Z'
+    sheet_rows[7] = ['Row 7', '70']
+    sheet_rows[9] = ['Row 9', '90']
+    data, queries = sync(wrapper, sheet_rows)
+    assert queries == 1
+    assert data[8] == ['Row 7', 70]
+    # Row 7 already matches the edited page; only row 9 differs from Notion.
+    assert [(w['page_id'], w['properties']['Qty']) for w in wrapper.writes] == [('page-9', {'number': 90.0})]
@@ -0,0 +1,66 @@
+# test_job_schedule.py
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from job_schedule import JobSchedule
+
+def schedule(interval, setting):
+    key = {'hour': 'REPEAT_HOUR', 'day': 'REPEAT_DAY', 'week': 'REPEAT_WEEK', 'month': 'REPEAT_MONTH', 'year': 'REPEAT_YEAR'}[interval]
+    return JobSchedule.from_job({'REPEAT': True, 'INTERVAL': interval, key: setting})
+
+@pytest.mark.parametrize('interval, setting, after, expected', [
+    ('hour', '15', datetime(2026, 3, 1, 9, 10), datetime(2026, 3, 1, 9, 15)),
+    ('hour', '15', datetime(2026, 3, 1, 9, 15), datetime(2026, 3, 1, 10, 15)),
+    ('hour', '0', datetime(2026, 12, 31, 23, 30), datetime(2027, 1, 1, 0, 0)),
+    ('day', '18:01', datetime(2026, 3, 1, 18, 0, 59), datetime(2026, 3, 1, 18, 1)),
+    ('day', '18:01', datetime(2026, 3, 1, 18, 1), datetime(2026, 3, 2, 18, 1)),
+    # 2026-03-02 is a Monday.
+    ('week', '00:01-Monday', datetime(2026, 3, 1, 12, 0), datetime(2026, 3, 2, 0, 1)),
+    ('week', '00:01-Monday', datetime(2026, 3, 2, 0, 1), datetime(2026, 3, 9, 0, 1)),
+    ('week', '08:00-sunday', datetime(2026, 3, 2, 9, 0), datetime(2026, 3, 8, 8, 0)),
+    ('month', '11:59-31', datetime(2026, 2, 10, 0, 0), datetime(2026, 2, 28, 11, 59)),
+    ('month', '11:59-31', datetime(2026, 2, 28, 11, 59), datetime(2026, 3, 31, 11, 59)),
+    ('month', '00:00-15', datetime(2026, 12, 20, 0, 0), datetime(2027, 1, 15, 0, 0)),
+    ('year', '00:01-31-12', datetime(2026, 6, 1, 0, 0), datetime(2026, 12, 31, 0, 1)),
+    ('year', '09:00-29-02', datetime(2025, 3, 1, 0, 0), datetime(2028, 2, 29, 9, 0)),
+])
+def test_next_fire(interval, setting, after, expected):
+    assert schedule(interval, setting).next_fire(after) == expected
+
+def test_next_fire_is_strictly_later():
+    hourly = schedule('hour', '0')
+    fire = datetime(2026, 3, 1, 10, 0)
+    assert hourly.next_fire(fire) == datetime(2026, 3, 1, 11, 0)
+
+def test_missed_fires_counts_fire_times_up_to_now():
+    hourly = schedule('hour', '0')
+    fire = datetime(2026, 3, 1, 10, 0)
+    assert hourly.missed_fires(fire, datetime(2026, 3, 1, 9, 59)) == 0
+    assert hourly.missed_fires(fire, fire) == 1
+    assert hourly.missed_fires(fire, datetime(2026, 3, 1, 12, 30)) == 3
+    assert schedule('day', '18:01').missed_fires(datetime(2026, 3, 1, 18, 1), datetime(2026, 3, 8, 18, 1)) == 8
+
+def test_jobs_that_do_not_repeat_have_no_schedule():
+    assert JobSchedule.from_job({'INTERVAL': 'day', 'REPEAT_DAY': '18:01'}) is None
+    assert JobSchedule.from_job({'REPEAT': True}) is None
+
+@pytest.mark.parametrize('interval, setting', [
+    ('hour', '60'), ('day', '24:00'), ('day', '18'), ('week', '00:01-Someday'), ('week', '00:01'),
+    ('month', '00:01-32'), ('year', '00:01-30-02'), ('year', '00:01-31'),
+])
+def test_malformed_settings_raise_value_error(interval, setting):
+    with pytest.raises(ValueError):
+        schedule(interval, setting)
+
+def test_unknown_interval_raises_value_error():
+    with pytest.raises(ValueError):
+        JobSchedule.from_job({'REPEAT': True, 'INTERVAL': 'fortnight'})
+
+def test_missing_setting_raises_value_error():
+    with pytest.raises(ValueError):
+        JobSchedule.from_job({'REPEAT': True, 'INTERVAL': 'day'})
@@ -0,0 +1,99 @@
+# test_notion_upsert.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from notion_client_wrapper import NotionClientWrapper
+from notion_page_index import NotionPageIndex
+from notion_snapshot import NotionSnapshotStore
+from notion_write_executor import NotionWriteExecutor
+
+DATABASE_ID = 'db'
+PROPERTIES = {
+    'Name': {'id': 'title', 'type': 'title'},
+    'Qty': {'id': 'qty', 'type': 'number', 'number': {'format': 'number'}},
+    'Total': {'id': 'total', 'type': 'number', 'number': {'format': 'number'}},
+}
+
+def make_page(qty, total):
+    return {
+        'id': 'page-1',
+        'properties': {
+            'Name': {'id': 'title', 'type': 'title', 'title': [{'type': 'text', 'text': {'content': 'A'}, 'plain_text': 'A'}]},
+            'Qty': {'id': 'qty', 'type': 'number', 'number': qty},
+            'Total': {'id': 'total', 'type': 'number', 'number': total},
+        },
+    }
+
+class Notion:
+    """Runs notion_upsert against one in-memory page, recording the writes."""
+    def __init__(self, tmp_path, page):
+        self.page = page
+        self.writes = []
+        self.wrapper = NotionClientWrapper(
+            'test', snapshot_store=NotionSnapshotStore(str(tmp_path)), write_executor=NotionWriteExecutor(max_workers=1)
+        )
+        self.wrapper._write_page = self._write_page
+
+    def _write_page(self, operation, database_id=None):
+        self.writes.append(operation['properties'])
+        for name, value in operation['properties'].items():
+            self.page['properties'][name] = dict(self.page['properties'][name], **value)
+        return self.page
+
+    def upsert(self, values, formulas, row_state):
+        page_index = NotionPageIndex(DATABASE_ID)
+        page_index.set_pages([self.page], {'Name', 'Qty', 'Total'})
+        return self.wrapper.notion_upsert(
+            [['Name', 'Qty', 'Total'], values], DATABASE_ID, PROPERTIES, page_index=page_index,
+            row_state=row_state, notion_first=True, notion_wins=True, formulas=[['Name', 'Qty', 'Total'], formulas]
+        )
+
+def test_notion_wins_sends_values_recalculated_after_a_notion_edit(tmp_path):
+    notion = Notion(tmp_path, make_page(qty=1, total=2))
+    formulas = ['A', 1, '=B2*2']
+    result = notion.upsert(['A', '1', '2'], formulas, {})
+    assert notion.writes == []
+    state = result['row_state']
+
+    # Qty is edited in Notion and written to the sheet, where Total recalculates.
+    notion.page['properties']['Qty']['number'] = 5
+    result = notion.upsert(['A', '5', '10'], ['A', 5, '=B2*2'], state)
+    assert notion.writes == [{'Total': {'number': 10.0}}]
+    assert result['updated'] == 1
+    assert notion.page['properties']['Total']['number'] == 10
+
+    result = notion.upsert(['A', '5', '10'], ['A', 5, '=B2*2'], result['row_state'])
+    assert result['unchanged'] == 1
+    assert len(notion.writes) == 1
+
+def test_notion_wins_keeps_notion_values_of_plain_cells(tmp_path):
+    # The sheet shows Notion's 12.345678 rounded; it must not be written back.
+    notion = Notion(tmp_path, make_page(qty=12.345678, total=2))
+    result = notion.upsert(['A', '12.3457', '2'], ['A', 12.3457, 2], {})
+    assert notion.writes == []
+    assert result['row_state']
+
+def test_first_run_with_state_sends_recalculated_values(tmp_path):
+    notion = Notion(tmp_path, make_page(qty=5, total=2))
+    result = notion.upsert(['A', '5', '10'], ['A', 5, '=B2*2'], {})
+    assert notion.writes == [{'Total': {'number': 10.0}}]
+    assert result['updated'] == 1
+
+def test_notion_wins_sends_only_recalculated_values_when_notion_is_unchanged(tmp_path):
+    notion = Notion(tmp_path, make_page(qty=12.345678, total=2))
+    result = notion.upsert(['A', '12.3457', '2'], ['A', 12.3457, '=TODAY()-45000'], {})
+    assert notion.writes == []
+
+    # Only the sheet recalculated (e.g. TODAY()); Qty still shows Notion's value rounded.
+    result = notion.upsert(['A', '12.3457', '3'], ['A', 12.3457, '=TODAY()-45000'], result['row_state'])
+    assert result['changed'] == {'notion': 0, 'sheet': 1}
+    assert notion.writes == [{'Total': {'number': 3.0}}]
+    assert notion.page['properties']['Qty']['number'] == 12.345678
+
+def test_notion_wins_without_state_keeps_notion_values_of_plain_cells(tmp_path):
+    notion = Notion(tmp_path, make_page(qty=12.345678, total=2))
+    result = notion.upsert(['A', '12.3457', '3'], ['A', 12.3457, '=TODAY()-45000'], None)
+    assert notion.writes == [{'Total': {'number': 3.0}}]
+    assert result['row_state'] is None
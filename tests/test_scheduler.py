@@ -0,0 +1,52 @@
+# test_scheduler.py
+import os
+import sys
+import threading
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from scheduler import Scheduler
+
+JOB = {'NAME': 'hourly', 'RANGE': 'A!A1:B2', 'DATABASE_ID': 'db', 'REPEAT': True, 'INTERVAL': 'hour', 'REPEAT_HOUR': '0'}
+
+class BlockingSyncer:
+    """Holds every sync until `release` is set."""
+    max_workers = 2
+
+    def __init__(self, config):
+        self.config = config
+        self.runs = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def run_sync_for_pairs(self, pairs):
+        self.runs.append([pair['NAME'] for pair in pairs])
+        self.started.set()
+        self.release.wait(5)
+
+def test_job_still_running_is_not_submitted_again():
+    syncer = BlockingSyncer({'SYNC_PAIRS': [JOB]})
+    scheduler = Scheduler(syncer)
+    queue = scheduler._build_queue([JOB], datetime(2026, 1, 1, 9, 30))
+
+    assert scheduler._submit_due(queue, datetime(2026, 1, 1, 10, 0, 5)) == [[JOB]]
+    assert syncer.started.wait(5)
+    # The 11:00 run comes round while the 10:00 run is still going.
+    assert scheduler._submit_due(queue, datetime(2026, 1, 1, 11, 0, 5)) == []
+
+    syncer.release.set()
+    scheduler._pool.shutdown(wait=True)
+    assert syncer.runs == [['hourly']]
+    assert scheduler._in_flight == set()
+
+def test_missed_runs_of_one_job_are_submitted_together():
+    syncer = BlockingSyncer({'SYNC_PAIRS': [JOB], 'CATCH_UP_POLICY': 'all'})
+    syncer.release.set()
+    scheduler = Scheduler(syncer)
+    queue = scheduler._build_queue([JOB], datetime(2026, 1, 1, 9, 30))
+
+    assert scheduler._submit_due(queue, datetime(2026, 1, 1, 12, 30)) == [[JOB], [JOB], [JOB]]
+    scheduler._pool.shutdown(wait=True)
+    assert syncer.runs == [['hourly']] * 3
+    assert queue[0][0] == datetime(2026, 1, 1, 13, 0)
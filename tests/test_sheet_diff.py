@@ -0,0 +1,45 @@
+# test_sheet_diff.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from sheet_diff import cells_equal, diff_grid
+
+def test_cells_equal():
+    assert cells_equal(5, '5')
+    assert cells_equal(1234.5, '1,234.5')
+    assert cells_equal(2, 2.0)
+    assert cells_equal(True, 'TRUE')
+    assert cells_equal(None, '')
+    assert not cells_equal(5, 'five')
+    assert not cells_equal('a', 'b')
+
+def test_unchanged_grid_writes_nothing():
+    grid = [['Name', 'Qty'], ['A', 1], ['B', 2]]
+    assert diff_grid(grid, [['Name', 'Qty'], ['A', '1'], ['B', '2']]) == ([], 0, 6)
+
+def test_consecutive_changed_rows_form_one_block():
+    new = [['Name', 'Qty', 'Note'], ['A', 1, 'x'], ['B', 2, 'y'], ['C', 3, 'z'], ['D', 4, 'w']]
+    existing = [['Name', 'Qty', 'Note'], ['A', 9, 'x'], ['B', 2, 'q'], ['C', 3, 'z'], ['D', 8]]
+    blocks, written, skipped = diff_grid(new, existing)
+    # Rows 1 and 2 merge into one block over columns 1-2; unchanged cells inside it are None.
+    assert blocks == [(1, 1, [[1, None], [None, 'y']]), (4, 1, [[4, 'w']])]
+    assert (written, skipped) == (4, 11)
+
+def test_rows_beyond_the_existing_grid_are_written():
+    blocks, written, skipped = diff_grid([['A'], ['B']], [['A']])
+    assert blocks == [(1, 0, [['B']])]
+    assert (written, skipped) == (1, 1)
+
+def test_skipped_cells_and_columns_are_never_written():
+    new = [['x', 'y', 'z'], ['x', 'y', 'z']]
+    existing = [['', '', ''], ['', '', '']]
+    blocks, written, skipped = diff_grid(new, existing, skip_cells={(0, 0)}, skip_cols=[1])
+    assert blocks == [(0, 0, [[None, None, 'z'], ['x', None, 'z']])]
+    assert written == 3
+    assert skipped == 0
+
+def test_displayed_value_counts_as_unchanged():
+    blocks, written, skipped = diff_grid([['2024-01-31']], [[45322]], formatted_grid=[['2024-01-31']])
+    assert (blocks, written, skipped) == ([], 0, 1)
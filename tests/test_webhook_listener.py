@@ -0,0 +1,131 @@
+# test_webhook_listener.py
+import os
+import sys
+import hmac
+import json
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from webhook_listener import WebhookListener
+
+DATABASE_ID = '0123456789abcdef0123456789abcdef'
+PAIRS = [
+    {'NAME': 'tasks', 'RANGE': 'Tasks!A1:D100', 'DATABASE_ID': DATABASE_ID, 'PRIORITY': 'notion'},
+    {'NAME': 'other', 'RANGE': 'Other!A1:D100', 'DATABASE_ID': 'fedcba9876543210fedcba9876543210', 'PRIORITY': 'sheet'},
+]
+
+class StubSyncer:
+    """Records the syncs the listener asks for instead of running them."""
+    max_workers = 2
+
+    def __init__(self):
+        self.config = {'SAMPLE_SPREADSHEET_ID': 'spreadsheet', 'SYNC_PAIRS': PAIRS}
+        self.syncs = []
+        self.synced = threading.Event()
+
+    def run_sync_for_pairs(self, pairs):
+        self.syncs.append(('full', [pair['NAME'] for pair in pairs]))
+        self.synced.set()
+
+    def run_targeted_sync(self, pair, page_ids=(), row_numbers=()):
+        self.syncs.append(('targeted', pair['NAME'], list(page_ids), list(row_numbers)))
+        self.synced.set()
+
+@pytest.fixture
+def listen(tmp_path):
+    listeners = []
+
+    def start(**options):
+        syncer = StubSyncer()
+        options.setdefault('debounce', 0.05)
+        options.setdefault('verification_token_file', str(tmp_path / 'verification_token'))
+        listener = WebhookListener(syncer, 0, **options).start()
+        listeners.append(listener)
+        return listener, syncer
+
+    yield start
+    for listener in listeners:
+        if listener is not None:
+            listener.stop()
+
+def post(listener, path, payload, headers=None):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    request = urllib.request.Request(f"http://127.0.0.1:{listener.port}{path}", data=body, headers=headers or {}, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+def test_sheet_edit_queues_a_targeted_sync_of_the_overlapping_pair(listen):
+    listener, syncer = listen()
+    assert post(listener, '/sheet', {'sheet': 'Tasks', 'row': 5, 'num_rows': 2}) == (202, {'status': 'queued', 'pairs': 1})
+    assert syncer.synced.wait(5)
+    assert syncer.syncs == [('targeted', 'tasks', [], [5, 6])]
+
+def test_burst_of_edits_is_synced_once(listen):
+    listener, syncer = listen(debounce=0.3)
+    post(listener, '/sheet', {'sheet': 'Tasks', 'row': 5})
+    post(listener, '/sheet', {'sheet': 'Tasks', 'rows': [9, 5]})
+    post(listener, '/notion', {'type': 'page.properties_updated', 'entity': {'id': 'page-1'}, 'data': {'parent': {'id': DATABASE_ID}}})
+    assert syncer.synced.wait(5)
+    assert syncer.syncs == [('targeted', 'tasks', ['page-1'], [5, 9])]
+
+def test_notion_database_event_syncs_the_whole_pair(listen):
+    listener, syncer = listen()
+    status, body = post(listener, '/notion', {'type': 'database.schema_updated', 'entity': {'id': DATABASE_ID}})
+    assert (status, body) == (202, {'status': 'queued', 'pairs': 1})
+    assert syncer.synced.wait(5)
+    assert syncer.syncs == [('full', ['tasks'])]
+
+def test_invalid_payloads_are_rejected(listen):
+    listener, syncer = listen()
+    assert post(listener, '/sheet', b'not json')[0] == 400
+    assert post(listener, '/sheet', [1, 2])[0] == 400
+    assert post(listener, '/sheet', {'sheet': 'Tasks'})[0] == 400
+    assert post(listener, '/sheet', {'sheet': 'Tasks', 'row': 0})[0] == 400
+    assert post(listener, '/sheet', {'sheet': 'Tasks', 'row': 5, 'spreadsheet_id': 'other'}) == (202, {'status': 'ignored', 'pairs': 0})
+    assert post(listener, '/notion', {'type': 'comment.created'}) == (202, {'status': 'ignored', 'pairs': 0})
+    assert post(listener, '/elsewhere', {})[0] == 404
+    assert not syncer.synced.wait(0.2)
+
+def test_sheet_token_is_checked(listen):
+    listener, syncer = listen(token='secret')
+    payload = {'sheet': 'Tasks', 'row': 5}
+    assert post(listener, '/sheet', payload)[0] == 401
+    assert post(listener, '/sheet', payload, {'X-Webhook-Token': 'wrong'})[0] == 401
+    assert post(listener, '/sheet', payload, {'X-Webhook-Token': 'sécret'.encode('utf-8').decode('latin-1')})[0] == 401
+    assert post(listener, '/sheet', dict(payload, token='sécret'))[0] == 401
+    assert post(listener, '/sheet', payload, {'X-Webhook-Token': 'secret'})[0] == 202
+    assert post(listener, '/sheet', dict(payload, token='secret'))[0] == 202
+
+def test_notion_signature_is_checked(listen):
+    listener, syncer = listen(notion_verification_token='key')
+    body = json.dumps({'type': 'page.created', 'entity': {'id': 'page-1'}, 'data': {'parent': {'id': DATABASE_ID}}}).encode('utf-8')
+    signature = 'sha256=' + hmac.new(b'key', body, hashlib.sha256).hexdigest()
+    assert post(listener, '/notion', body)[0] == 401
+    assert post(listener, '/notion', body, {'X-Notion-Signature': 'sha256=é'})[0] == 401
+    assert post(listener, '/notion', body, {'X-Notion-Signature': signature}) == (202, {'status': 'queued', 'pairs': 1})
+
+def test_verification_token_is_saved_not_printed(listen, capsys):
+    listener, syncer = listen()
+    assert post(listener, '/notion', {'verification_token': 'secret_abc123'}) == (200, {'status': 'ok'})
+    with open(listener.verification_token_file) as f:
+        assert f.read().strip() == 'secret_abc123'
+    assert os.stat(listener.verification_token_file).st_mode & 0o077 == 0
+    assert 'secret_abc123' not in capsys.readouterr().out
+
+def test_refuses_a_public_address_without_a_token(listen):
+    listener, syncer = listen(host='0.0.0.0')
+    assert listener is None
+
+def test_public_listener_rejects_unsigned_notion_events(listen):
+    listener, syncer = listen(host='0.0.0.0', token='secret')
+    payload = {'type': 'page.created', 'entity': {'id': 'page-1'}, 'data': {'parent': {'id': DATABASE_ID}}}
+    assert post(listener, '/notion', payload)[0] == 401